@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import os
+import argparse
+import tempfile
+import torch
+from export import export_jit, export_onnx, load_jit_model, load_torch_model, parity_report, OnnxTokenClassifier
+
+# format: (file name, export kwargs)
+FORMATS = {'jit': ('model.pt', {'quantize': False}), 'int8': ('model.int8.pt', {'quantize': True}),
+           'onnx': ('model.onnx', {})}
+
+
+def file_size(path):
+    """ the size in MB, incl. the external data file of a large onnx model """
+    return sum(os.path.getsize(p) for p in (path, path + '.data') if os.path.exists(p)) / 2 ** 20
+
+
+def get_args():
+    parser = argparse.ArgumentParser('Parity, speed and size of the exported models (export.py) on val')
+    parser.add_argument('--model', type=str, default='./models/_BertZh0_best.pth', help='state dict of the model')
+    parser.add_argument('--bert_name', type=str, default='./models/bert-base-chinese')
+    parser.add_argument('--tokenizer', type=str, default='', help='tokenizer of the val data, default: Corpus')
+    parser.add_argument('--random_init', action='store_true',
+                        help='export a randomly initialised model instead of --model (no trained weights)')
+    parser.add_argument('--formats', type=str, default='jit,int8,onnx', help='formats, separated by ","')
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=0, help='torch cpu threads, 0 for default')
+    args_ = parser.parse_args()
+
+    return args_
+
+
+if __name__ == '__main__':
+    args = get_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    from dataset import Corpus, get_data_loader
+
+    if args.tokenizer:
+        Corpus.TOKENIZER_CONFIG = dict(Corpus.TOKENIZER_CONFIG, name=args.tokenizer)
+    _, val_data_loader, _ = get_data_loader('../data/xiaofang', args.batch_size, check_stratify=False)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = args.model
+        if args.random_init:
+            from model import BertZhTokenClassifier_
+
+            torch.manual_seed(0)
+            model_path = os.path.join(tmp_dir, 'random_init.pth')
+            torch.save(BertZhTokenClassifier_(15, p_drop=0.1, bert_name=args.bert_name).state_dict(), model_path)
+        model_ref = load_torch_model(model_path, bert_name=args.bert_name)
+
+        for fmt in args.formats.split(','):
+            file_name, kwargs = FORMATS[fmt]
+            out_path = os.path.join(tmp_dir, file_name)
+            if fmt == 'onnx':
+                export_onnx(model_path, out_path, bert_name=args.bert_name, **kwargs)
+                model_new = OnnxTokenClassifier(out_path, args.threads)
+            else:
+                export_jit(model_path, out_path, bert_name=args.bert_name, **kwargs)
+                model_new = load_jit_model(out_path)
+            agreement, f1_ref, f1_new, time_ref, time_new = parity_report(model_ref, model_new, val_data_loader,
+                                                                          comment=fmt)
+            results.append((fmt, agreement, f1_new - f1_ref, time_ref / max(time_new, 1e-9), file_size(out_path)))
+        ref_size = file_size(model_path)
+
+    print(f"\n{'format':<8}{'tag agreement':>15}{'f1w diff':>10}{'speedup':>9}{'size':>10}")
+    for fmt, agreement, f1_diff, speedup, size in results:
+        print(f'{fmt:<8}{agreement:>15.4f}{f1_diff:>+10.4f}{speedup:>8.2f}x{size:>8.0f}MB')
+    print(f"{'torch':<8}{1:>15.4f}{0:>+10.4f}{1:>8.2f}x{ref_size:>8.0f}MB")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import os
+import sys
+import filecmp
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from bench_startup import extract_src
+
+IFC_FILES = ['../data/ifc/Plant_Byhand.ifc', '../data/ifc/Plant_ByhandV3.ifc', '../data/ifc/plant1.ifc']
+
+
+def measure_gen_ttl(src_dir, ifc_file, ttl_file, n_repeat=3):
+    """
+    ifc2ttl.gen_ttl_file(ifc_file, ttl_file) of src_dir in a new python process (cwd: src_dir) n_repeat times,
+    and once more with tracemalloc
+    :return: (median wall time in seconds or None, median peak RSS in MB, tracemalloc peak in MB, error message)
+    """
+    code = ('import sys, time, resource, tracemalloc\n'
+            'import ifc2ttl\n'
+            'if sys.argv[3] == "1":\n'
+            '    tracemalloc.start()\n'
+            't = time.perf_counter()\n'
+            'ifc2ttl.gen_ttl_file(sys.argv[1], sys.argv[2])\n'
+            'print(time.perf_counter() - t, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,\n'
+            '      tracemalloc.get_traced_memory()[1] / 2 ** 20)\n')
+    times, rss, traced = [], [], None
+    for i in range(n_repeat + 1):
+        is_traced = i == n_repeat
+        p = subprocess.run([sys.executable, '-c', code, os.path.abspath(ifc_file), os.path.abspath(ttl_file),
+                            '1' if is_traced else '0'], cwd=src_dir, capture_output=True, text=True)
+        if p.returncode != 0:
+            return None, None, None, p.stderr.strip().split('\n')[-1]
+        t, max_rss, peak = (float(x) for x in p.stdout.strip().split('\n')[-1].split())
+        if is_traced:
+            traced = peak
+        else:
+            times.append(t)
+            rss.append(max_rss)
+    return float(np.median(times)), float(np.median(rss)), traced, ''
+
+
+def get_args():
+    parser = argparse.ArgumentParser('Wall time and memory of ifc2ttl.gen_ttl_file')
+    parser.add_argument('--rev', type=str, default='', help='git revisions to compare with, e.g., f215ca4~1,f215ca4')
+    parser.add_argument('--ifc', type=str, default=','.join(IFC_FILES), help='ifc files, separated by ","')
+    parser.add_argument('-n', '--repeat', type=int, default=3, help='num of runs, the median is reported')
+    args_ = parser.parse_args()
+
+    return args_
+
+
+if __name__ == '__main__':
+    args = get_args()
+    ifc_files = args.ifc.split(',')
+    src_dirs = [('current', os.path.dirname(os.path.abspath(__file__)))]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for i, rev in enumerate(r for r in args.rev.split(',') if r):
+            os.makedirs(os.path.join(tmp_dir, str(i)))
+            src_dirs.insert(i, (rev, extract_src(rev, os.path.join(tmp_dir, str(i)))))
+
+        results = {}
+        for k, (name, src_dir) in enumerate(src_dirs):
+            for ifc_file in ifc_files:
+                ttl_file = os.path.join(tmp_dir, f'{k}.{os.path.basename(ifc_file)}.ttl')
+                results[(name, ifc_file)] = measure_gen_ttl(src_dir, ifc_file, ttl_file, args.repeat) + (ttl_file,)
+
+        print(f"{'ifc file':<22}" + ''.join(f'{name:>24}' for name, _ in src_dirs) + '  same ttl')
+        for ifc_file in ifc_files:
+            cells, ttl_files = [], []
+            for name, _ in src_dirs:
+                t, rss, traced, error, ttl_file = results[(name, ifc_file)]
+                cells.append(f'{t:>6.2f}s {rss:>5.0f}MB {traced:>5.1f}MB' if t is not None else f"{'failed':>24}")
+                if t is not None:
+                    ttl_files.append(ttl_file)
+            same = all(filecmp.cmp(ttl_files[0], f, shallow=False) for f in ttl_files[1:])
+            print(f'{os.path.basename(ifc_file):<22}' + ''.join(cells) + f"  {'yes' if same else 'no':>8}")
+        print('(wall time, peak RSS, tracemalloc peak)')
+
+        for name, _ in src_dirs:
+            for ifc_file in ifc_files:
+                if results[(name, ifc_file)][3]:
+                    print(f'{name} {ifc_file}: {results[(name, ifc_file)][3]}')
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import os
+import re
+import sys
+import tarfile
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+# entry point: module imported at its startup
+ENTRY_POINTS = [('ruleparse.py -i', 'ruleparse'), ('inference.py', 'inference'), ('rulegen.py', 'rulegen')]
+
+
+def measure_import(src_dir, module, n_repeat=5):
+    """
+    import the module in a new python process (cwd: src_dir) n_repeat times
+    :return: (median import time in seconds or None, error message, [(cumulative us, package), ...] by -X importtime)
+    """
+    code = f'import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)'
+    times, error, heaviest = [], '', []
+    for _ in range(n_repeat):
+        p = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=src_dir, capture_output=True,
+                           text=True)
+        if p.returncode != 0:
+            error = p.stderr.strip().split('\n')[-1]
+            break
+        times.append(float(p.stdout.strip().split('\n')[-1]))
+
+        # import time:  self [us] | cumulative | imported package, nested imports are indented by 2 more spaces
+        # the packages imported by the module itself are listed just before it, one level deeper
+        imported = {}
+        for line in p.stderr.split('\n'):
+            m = re.match(r'import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)', line)
+            if m and len(m.group(2)) == 3:
+                pkg = m.group(3).split('.')[0]
+                imported[pkg] = imported.get(pkg, 0) + int(m.group(1))
+            elif m and len(m.group(2)) == 1 and m.group(3) == module:
+                heaviest = sorted(((us, pkg) for pkg, us in imported.items()), reverse=True)
+            elif m and len(m.group(2)) == 1:
+                imported = {}
+
+    return (float(np.median(times)) if times else None), error, heaviest
+
+
+def extract_src(rev, out_dir, repo_dir='..'):
+    """ extract src/ of the git revision (e.g., the commit before the lazy imports) into out_dir """
+    archive = subprocess.run(['git', 'archive', '--format=tar', rev, 'src'], cwd=repo_dir, capture_output=True,
+                             check=True).stdout
+    tar_path = os.path.join(out_dir, 'src.tar')
+    with open(tar_path, 'wb') as fp:
+        fp.write(archive)
+    with tarfile.open(tar_path) as tar:
+        tar.extractall(out_dir)
+    return os.path.join(out_dir, 'src')
+
+
+def get_args():
+    parser = argparse.ArgumentParser('Startup (import) time of the entry points')
+    parser.add_argument('--rev', type=str, default='', help='git revision to compare with, e.g., HEAD~1')
+    parser.add_argument('-n', '--repeat', type=int, default=5, help='num of runs, the median is reported')
+    parser.add_argument('--top', type=int, default=5, help='num of the heaviest packages imported by the entry point to show')
+    args_ = parser.parse_args()
+
+    return args_
+
+
+if __name__ == '__main__':
+    args = get_args()
+    src_dirs = [('current', os.path.dirname(os.path.abspath(__file__)))]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.rev:
+            src_dirs.insert(0, (args.rev, extract_src(args.rev, tmp_dir)))
+
+        results = {}
+        for name, src_dir in src_dirs:
+            for entry, module in ENTRY_POINTS:
+                results[(name, entry)] = measure_import(src_dir, module, args.repeat)
+
+    print(f"{'entry point':<18}" + ''.join(f'{name:>14}' for name, _ in src_dirs))
+    for entry, _ in ENTRY_POINTS:
+        cells = []
+        for name, _ in src_dirs:
+            t, error, _ = results[(name, entry)]
+            cells.append(f'{t:>13.3f}s' if t is not None else f"{'failed':>14}")
+        print(f'{entry:<18}' + ''.join(cells))
+
+    for name, _ in src_dirs:
+        print(f'\n--- {name}')
+        for entry, _ in ENTRY_POINTS:
+            t, error, heaviest = results[(name, entry)]
+            if error:
+                print(f'{entry}: {error}')
+            else:
+                print(f'{entry}: ' + ', '.join(f'{pkg} {us / 1e6:.2f}s' for us, pkg in heaviest[:args.top]))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+# batch_size x accum_steps, 'c': --grad_checkpoint
+CONFIGS = ['32x1', '8x4', '32x1c', '8x4c']
+
+
+def parse_config(config):
+    grad_checkpoint = config.endswith('c')
+    batch_size, accum_steps = (int(x) for x in config.rstrip('c').split('x'))
+    return batch_size, accum_steps, grad_checkpoint
+
+
+def run_config(config, args_):
+    """
+    train the model on the first n_sentences train sentences in this process, the same steps as train.train():
+    the loss averaged over the accumulation group, and an AdamW step at the end of every group
+    :return: dict {config, seq_per_s, peak_rss_mb, base_rss_mb, peak_cuda_mb}
+    """
+    import numpy as np
+    import torch
+    from torch.utils import data
+    from dataset import Corpus
+    from model import BertZhTokenClassifier_
+    from train import cross_entropy_loss_non_pad
+
+    batch_size, accum_steps, grad_checkpoint = parse_config(config)
+    if args_.tokenizer:
+        Corpus.TOKENIZER_CONFIG = dict(Corpus.TOKENIZER_CONFIG, name=args_.tokenizer)
+    corpus = Corpus('../data/xiaofang', 125)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    torch.manual_seed(2020)
+    model = BertZhTokenClassifier_(15, p_drop=0.1, bert_name=args_.bert_name)
+    if grad_checkpoint:
+        model.enable_grad_checkpoint()
+    model.to(device)
+    model.train()
+    optimizer = torch.optim.AdamW(model.parameters(), lr=1e-5)
+    dataset = data.Subset(corpus.train_dataset, np.arange(min(args_.n_sentences, len(corpus.train_dataset))))
+    data_loader = data.DataLoader(dataset, batch_size=batch_size, shuffle=False)
+
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    start_time = time.time()
+    optimizer.zero_grad()
+    for step, (inputs, att_mask, labels) in enumerate(data_loader, 1):
+        inputs, att_mask, labels = inputs.to(device), att_mask.to(device), labels.to(device).view(-1)
+        group_start = (step - 1) // accum_steps * accum_steps
+        group_size = min(accum_steps, len(data_loader) - group_start)
+        outputs = model(inputs, att_mask)
+        loss = cross_entropy_loss_non_pad(outputs.view(-1, outputs.shape[-1]), labels)
+        (loss / group_size).backward()
+        if step % accum_steps == 0 or step == len(data_loader):
+            optimizer.step()
+            optimizer.zero_grad()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    elapsed = time.time() - start_time
+
+    return {'config': config, 'seq_per_s': len(dataset) / elapsed,
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 'base_rss_mb': base_rss,
+            'peak_cuda_mb': torch.cuda.max_memory_allocated() / 2 ** 20 if device.type == 'cuda' else None}
+
+
+def get_args():
+    parser = argparse.ArgumentParser('Throughput and peak memory of training per batch size, accum_steps and '
+                                     'grad_checkpoint, each config in a new process')
+    parser.add_argument('--configs', type=str, default=','.join(CONFIGS),
+                        help='batch_size x accum_steps, "c" for --grad_checkpoint, separated by ","')
+    parser.add_argument('--bert_name', type=str, default='./models/bert-base-chinese')
+    parser.add_argument('--tokenizer', type=str, default='', help='tokenizer of the train data, default: Corpus')
+    parser.add_argument('--n_sentences', type=int, default=64, help='num of train sentences of each config')
+    parser.add_argument('--worker', type=str, default='', help='(internal) run this config and print the result')
+    args_ = parser.parse_args()
+
+    return args_
+
+
+if __name__ == '__main__':
+    args = get_args()
+    if args.worker:
+        print('RESULT ' + json.dumps(run_config(args.worker, args)))
+        sys.exit()
+
+    print(f"{'config':<18}{'seq/s':>8}{'peak RSS':>12}{'before':>10}{'peak cuda':>12}")
+    for config in args.configs.split(','):
+        batch_size, accum_steps, grad_checkpoint = parse_config(config)
+        name = f"{batch_size} x {accum_steps}{', ckpt' if grad_checkpoint else ''}"
+        p = subprocess.run([sys.executable] + sys.argv + ['--worker', config], capture_output=True, text=True)
+        lines = [line for line in p.stdout.split('\n') if line.startswith('RESULT ')]
+        if p.returncode != 0 or not lines:
+            # e.g., killed by the OOM killer (returncode -9)
+            print(f'{name:<18}failed (returncode {p.returncode}) {p.stderr.strip().split(chr(10))[-1]}')
+            continue
+        r = json.loads(lines[-1][len('RESULT '):])
+        cuda = f"{r['peak_cuda_mb']:>10.0f}MB" if r['peak_cuda_mb'] is not None else f"{'-':>12}"
+        print(f"{name:<18}{r['seq_per_s']:>8.2f}{r['peak_rss_mb']:>10.0f}MB{r['base_rss_mb']:>8.0f}MB{cuda}")
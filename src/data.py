@@ -6,308 +6,11 @@ import sys
 import json
 import re
 import pickle
-import torch
-import platform
 import numpy as np
-from torch.utils import data
-from sklearn.utils import shuffle
 # from sklearn.model_selection import StratifiedKFold
 from utils import *
 
 
-class Corpus:
-    def __init__(self, data_dir, max_sql=125, is_test=False):
-        from transformers import BertTokenizer
-
-        self.data_dir = data_dir
-        self.tokenizer = BertTokenizer.from_pretrained('bert-base-chinese', do_lower_case=False)
-        self.max_sql = max_sql
-
-        self.tags = self.get_tags()  # 若要对属性更名，记得删除pickle的dat文件，重新生成一次数据
-        self.tag2idx = {tag: idx for idx, tag in enumerate(self.tags)}
-        self.idx2tag = {idx: tag for idx, tag in enumerate(self.tags)}
-
-        if is_test:
-            self.test_dataset = TextDataSet(self.load_test_data())
-        else:
-            self.val_dataset = TextDataSet(self.load_data('val'))
-            self.train_dataset = TextDataSet(self.load_data('train'))
-
-    def ids_to_tags(self, ids):
-        if isinstance(ids, torch.Tensor):
-            ids = ids.detach().cpu().numpy()
-        tags = []
-        for id in ids:
-            tags.append(self.idx2tag[id])
-        return tags
-
-    def tags_to_ids(self, tags):
-        ids = []
-        for tag in tags:
-            ids.append(self.tag2idx[tag])
-        return ids
-
-    def get_tags(self):
-        tags = []
-        file_path = os.path.join(self.data_dir, 'tags.txt')
-        with open(file_path, 'r') as file:
-            for tag in file:
-                if tag.strip():
-                    tags.append(tag.strip())
-        return tags
-
-    def load_data(self, data_type='train'):
-        """
-        :param data_type: 'train'/'val'
-        :return:
-            sen_token_ids: list of sentences, represented by token id. [[101,102,...],[200,300,...],...]
-            sen_att_mask:
-            sen_tag_ids: list of sentences' tags, represented by tag id. [[2,1,5,...],[3,1,2,...],...]
-        """
-        with open(os.path.join(self.data_dir, data_type, 'sentences.txt'), 'r', encoding='utf8') as file:
-            lines = file.readlines()
-            # encode_plus = tokenize + to_ids + to_tensor
-            # bert-chinese中，中文之间的空格会被去掉
-            _sen_tokens = self.tokenizer.batch_encode_plus(lines, max_length=self.max_sql, pad_to_max_length=True)
-            # # ===== Stats
-            # import matplotlib.pyplot as plt
-            # att_masks = _sen_tokens['attention_mask']
-            # lens = np.array(list(map(lambda x: sum(x), att_masks)))
-            # plt.hist(lens, bins=50)
-            # plt.show()
-            # # sql: 80=0.959, 90=0.975, 100=0.975, 125=1.0
-            # for n in (80, 85, 90, 95, 100, 110, 125, 150):
-            #     print(f'{n}:', np.sum(lens < n) / len(lens))
-            # breakpoint()
-
-        sen_token_ids = torch.tensor(_sen_tokens['input_ids'], dtype=torch.long)
-        sen_att_mask = torch.tensor(_sen_tokens['attention_mask'], dtype=torch.float)
-        # self.tokenizer.convert_ids_to_tokens(sen_token_ids[0])
-        CLS_token_id = self.tokenizer.convert_tokens_to_ids(['[CLS]'])[0]  # 101
-
-        sen_tag_ids = -1 * torch.ones_like(sen_token_ids, dtype=torch.long)  # -1 for tag padding (non-labeled)
-        with open(os.path.join(self.data_dir, data_type, 'tags.txt'), 'r') as file:
-            for i, line in enumerate(file):
-                ### token_ids[0] == [CLS], shift toward right
-                assert sen_token_ids[i][0].item() == CLS_token_id
-                tag_ids = [self.tag2idx[tag] for tag in line.strip().split(' ')]
-                if len(tag_ids) > self.max_sql - 1:
-                    tag_ids = tag_ids[:self.max_sql - 1]
-                sen_tag_ids[i, 1:1 + len(tag_ids)] = torch.tensor(tag_ids, dtype=torch.long)
-
-        d = {'token_ids': sen_token_ids, 'att_mask': sen_att_mask, 'tag_ids': sen_tag_ids}
-        return d
-
-    def load_test_data(self):
-        """ test data: no label/tag
-        :return:
-            sen_token_ids: list of sentences, represented by token id. [[101,102,...],[200,300,...],...]
-            sen_att_mask:
-        """
-        test_data_dir = os.path.join(self.data_dir, 'test')
-
-        lines = []
-        fns = os.listdir(test_data_dir)
-        for fn in fns:
-            if not fn.endswith('.txt'):
-                continue
-            print(f'Read {fn}')
-            ffn = os.path.join(test_data_dir, fn)  # full file name
-            with open(ffn, 'r', encoding='utf8') as fp:
-                lines1 = fp.readlines()
-                lines1 = [l for l in lines1 if l.strip()]
-                lines.extend(lines1)
-
-        ### Clean
-        def clean_seq(seq_):
-            # 第一个空格之前，如果全是ASCII（如‘1.2.3 ’），则删掉
-            if ' ' in seq_:
-                i = seq_.index(' ')
-                if all(ord(c) < 128 for c in seq_[:i]):
-                    seq_ = seq_[i + 1:]
-
-            seq_ = seq_.replace(' ', '')
-            return seq_
-
-        for i in range(len(lines)):
-            lines[i] = clean_seq(lines[i])
-        ###
-
-        _sen_tokens = self.tokenizer.batch_encode_plus(lines, max_length=self.max_sql, pad_to_max_length=True)
-        sen_token_ids = torch.tensor(_sen_tokens['input_ids'], dtype=torch.long)
-        sen_att_mask = torch.tensor(_sen_tokens['attention_mask'], dtype=torch.float)
-        # CLS_token_id = self.tokenizer.convert_tokens_to_ids(['[CLS]'])[0]  # 101
-
-        d = {'token_ids': sen_token_ids, 'att_mask': sen_att_mask}
-        return d
-
-    def check_tags_stratify(self, print_result=False):
-        import pandas as pd
-
-        t = self.train_dataset.sen_tag_ids.numpy().reshape(-1)
-        v = self.val_dataset.sen_tag_ids.numpy().reshape(-1)
-        tv = np.concatenate((t, v))
-        tags = {'tag-id': [], 'tag': [], 'count-all': [], 'count-train': [], 'count-val': [], 'train-val-ratio': []}
-        for i in range(15):
-            tags['tag-id'].append(i)
-            tags['tag'].append(self.idx2tag[i])
-            tags['count-all'].append(np.sum(tv == i))
-            tags['count-train'].append(np.sum(t == i))
-            tags['count-val'].append(np.sum(v == i))
-            tags['train-val-ratio'].append(round(tags['count-train'][-1] / tags['count-val'][-1], 1))
-
-        tags_df = pd.DataFrame(tags)
-        if print_result:
-            print(tags_df)
-            print(f"Min, Max of train-val-ratio: {min(tags_df['train-val-ratio'])}, {max(tags_df['train-val-ratio'])}")
-
-        check_pass = True
-        if 0 in tags_df['count-val'].to_numpy() or 0 in tags_df['count-train'].to_numpy():
-            check_pass = False
-
-        return check_pass, tags_df
-
-    def get_token_ids_bool_mask(self, token_ids: torch.Tensor):
-        cls_id, pad_id, sep_id = self.tokenizer.convert_tokens_to_ids(['[CLS]', '[PAD]', '[SEP]'])  # 101,0,102
-        mask = ((token_ids != pad_id).float() * (token_ids != cls_id).float() * (token_ids != sep_id).float()).bool()
-        return mask
-
-    def render_seq_labels(self, seq, label, pred, mark_down=False):
-        # if (label is None) and (pred is None):
-        #     return ''.join(seq)
-
-        if isinstance(seq, torch.Tensor):
-            # seq = seq.view(-1)
-            mask = label >= 0 if label is not None else self.get_token_ids_bool_mask(seq)
-
-            seq = self.tokenizer.convert_ids_to_tokens(seq.masked_select(mask))
-            if label is not None:
-                label = self.ids_to_tags(label.masked_select(mask))
-            if pred is not None:
-                pred = self.ids_to_tags(pred.masked_select(mask))
-
-        if label is not None:
-            label_iit = label_bio_to_iit(label, seq)
-            # print(self._render_seq_label_lines(seq, label_iit))
-            label_str = self._render_seq_label(seq, label_iit, mark_down)
-            # print(label_str)
-        else:
-            label_str = None
-
-        if pred is not None:
-            pred_iit = label_bio_to_iit(pred, seq)
-            pred_str = self._render_seq_label(seq, pred_iit, mark_down)
-        else:
-            pred_str = None
-
-        seq_str = ''.join(seq).replace('[', '<').replace(']', '>')
-        return label_str, pred_str, seq_str
-
-    def _render_seq_label(self, seq, label, mark_down=False):
-        """
-        :param seq: list of char
-        :param label: label_iit
-        :return: e.g., [水带/obj]，在设计工作压力下其[轴向延伸率/prop]
-        """
-        seq = seq.copy()
-        for i in range(len(seq)):
-            seq[i] = seq[i].replace('[', '<').replace(']', '>')
-
-        for i, j, tag in label:
-            s = seq[i] if j <= i + 1 else ''.join(seq[i:j])
-            if mark_down:
-                seq[i] = f' `{s}/{tag}` '
-            else:
-                seq[i] = f'[{s}/{tag}]'
-
-            if j > i + 1:
-                for k in range(i + 1, j):
-                    seq[k] = ''
-
-        return (''.join(seq)).strip()
-
-    def _render_seq_label_lines(self, seq, label):
-        seq = seq.copy()
-        for i in range(len(seq)):
-            seq[i] = seq[i].replace('[', '<').replace(']', '>')
-
-        seq_lb = []
-        for i, j, tag in label:
-            seq_lb.append(''.join(seq[i:j]) + ' ' + tag)
-
-        return '\n'.join(seq_lb)
-
-
-class TextDataSet(data.Dataset):
-    def __init__(self, data: dict):
-        self.sen_token_ids = data['token_ids']
-        self.sen_att_mask = data['att_mask']
-        if 'tag_ids' in data:  # consider test data
-            self.sen_tag_ids = data['tag_ids']
-
-        self.len = len(self.sen_token_ids)
-
-    def __len__(self):
-        return self.len
-
-    def __getitem__(self, index):
-        if hasattr(self, 'sen_tag_ids'):
-            return self.sen_token_ids[index], self.sen_att_mask[index], self.sen_tag_ids[index]
-
-        return self.sen_token_ids[index], self.sen_att_mask[index]
-
-
-def get_data_loader(data_dir, batch_size, max_sql=125, enable_save=False, check_stratify=True, shuffle_train=True):
-    """
-    example:
-    for token_ids, att_mask, tag_ids in val_data_loader:
-        print(token_ids.shape, att_mask.shape, tag_ids.shape)
-        # torch.Size([32, 125]) torch.Size([32, 125]) torch.Size([32, 125])
-    """
-
-    if enable_save:
-        corpus_path = os.path.join(data_dir, 'corpus.dat')
-        if not os.path.exists(corpus_path):
-            print('Processing...')
-            corpus = Corpus(data_dir, max_sql)
-            with open(corpus_path, 'wb') as fp:
-                pickle.dump(corpus, fp)
-        else:
-            with open(corpus_path, 'rb') as fp:
-                corpus = pickle.load(fp)
-    else:
-        corpus = Corpus(data_dir, max_sql)
-
-    if check_stratify:
-        check, tags_df = corpus.check_tags_stratify()
-        assert check, f'Check tags stratify failed. try another random_sate in shuffle for data\n{tags_df}'
-        # print(tags_df)
-
-    num_workers = 0 if 'Windows' in platform.platform() else 4
-    train_data_loader = data.DataLoader(dataset=corpus.train_dataset, batch_size=batch_size,
-                                        shuffle=shuffle_train, num_workers=num_workers, drop_last=False)
-    val_data_loader = data.DataLoader(dataset=corpus.val_dataset, batch_size=batch_size,
-                                      shuffle=False, num_workers=num_workers, drop_last=False)
-
-    return train_data_loader, val_data_loader, corpus
-
-
-def get_test_data_loader(data_dir, batch_size, max_sql=125):
-    """ read txt files in the test dir.
-    example:
-    for token_ids, att_mask in test_data_loader:
-        print(token_ids.shape, att_mask.shape)
-        # torch.Size([32, 125]) torch.Size([32, 125]))
-    """
-    corpus = Corpus(data_dir, max_sql, is_test=True)
-
-    num_workers = 0 if 'Windows' in platform.platform() else 4
-    test_data_loader = data.DataLoader(dataset=corpus.test_dataset, batch_size=batch_size,
-                                       shuffle=False, num_workers=num_workers, drop_last=False)
-
-    return test_data_loader, corpus
-
-
 # ========================================================================================= Process
 def process_xiaofang_data(data_dir='/Users/ZhouYucheng/Documents/硕士/Researches/自动合规性审查-NSFC/Data/xiaofang'):
     def json_to_doc(doc_js):
@@ -506,6 +209,8 @@ def init_data_by_json(data_dir='../data/xiaofang/', early_return=False, random_s
         return seqs, labels, dicts
 
     # ============================================================  Train/val split
+    from sklearn.utils import shuffle
+
     seqs, labels = shuffle(seqs, labels, random_state=random_state)
     train_split = 0.8
     n = int(len(seqs) * train_split)
@@ -827,6 +532,8 @@ def _measure_sentence_distribution():
 
 
 def _test_random_state():
+    from dataset import Corpus
+
     msgs = ''
     for rs in range(10):
         init_data_by_json(random_state=rs)
@@ -855,6 +562,8 @@ if __name__ == '__main__':
     init_data_by_json()
     check_result = True
     if check_result:
+        from dataset import Corpus
+
         print('\nChecking result ...')
         corpus = Corpus('../data/xiaofang', 125)
         check, tags_df = corpus.check_tags_stratify(print_result=True)
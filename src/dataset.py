@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import os
+import json
+import pickle
+import hashlib
+import platform
+import torch
+import numpy as np
+from torch.utils import data
+from data import label_bio_to_iit
+
+
+class Corpus:
+    TOKENIZER_CONFIG = {'name': 'bert-base-chinese', 'do_lower_case': False}
+
+    def __init__(self, data_dir, max_sql=125, is_test=False, use_cache=True):
+        """
+        use_cache: save/load the tokenized data (token_ids, att_mask, tag_ids) as .npy in data_dir/cache,
+                   keyed by the hash of the txt files, max_sql, TOKENIZER_CONFIG (and its vocab.txt if it is a local
+                   dir) and the transformers version, and loaded by mmap
+        """
+        self.data_dir = data_dir
+        self._tokenizer = None  # loaded when used, see tokenizer
+        self.max_sql = max_sql
+        self.use_cache = use_cache
+
+        self.tags = self.get_tags()  # 若要对属性更名，记得删除pickle的dat文件，重新生成一次数据
+        self.tag2idx = {tag: idx for idx, tag in enumerate(self.tags)}
+        self.idx2tag = {idx: tag for idx, tag in enumerate(self.tags)}
+
+        if is_test:
+            self.test_dataset = TextDataSet(self.load_test_data())
+        else:
+            self.val_dataset = TextDataSet(self.load_data('val'))
+            self.train_dataset = TextDataSet(self.load_data('train'))
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import BertTokenizer
+
+            self._tokenizer = BertTokenizer.from_pretrained(self.TOKENIZER_CONFIG['name'],
+                                                            do_lower_case=self.TOKENIZER_CONFIG['do_lower_case'])
+        return self._tokenizer
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_tokenizer'] = None
+        return state
+
+    def _cache_key(self, file_paths):
+        # the tokenization also depends on the transformers version and the vocab (if the tokenizer is a local dir),
+        # the version is read from the package metadata, so a cache hit does not import transformers
+        from importlib.metadata import version, PackageNotFoundError
+
+        try:
+            transformers_version = version('transformers')
+        except PackageNotFoundError:
+            transformers_version = None
+        sha1 = hashlib.sha1(json.dumps([self.max_sql, self.TOKENIZER_CONFIG, self.tags,
+                                        transformers_version]).encode('utf8'))
+        vocab_path = os.path.join(self.TOKENIZER_CONFIG['name'], 'vocab.txt')
+        for file_path in ([vocab_path] if os.path.exists(vocab_path) else []) + list(file_paths):
+            with open(file_path, 'rb') as fp:
+                sha1.update(fp.read())
+        return sha1.hexdigest()[:16]
+
+    def _load_cached(self, name, file_paths, load_fn):
+        """
+        load the tokenized data of file_paths from data_dir/cache/{name}-{hash}.{key}.npy, or by load_fn() and save
+        :return: dict of tensors, e.g., {'token_ids': ..., 'att_mask': ..., 'tag_ids': ...}
+        """
+        if not self.use_cache:
+            return load_fn()
+
+        cache_dir = os.path.join(self.data_dir, 'cache')
+        prefix = os.path.join(cache_dir, f'{name}-{self._cache_key(file_paths)}')
+        index_path = prefix + '.json'
+        if os.path.exists(index_path):
+            with open(index_path, 'r') as fp:
+                keys = json.load(fp)
+            # copy-on-write mmap: pages are read when used, and the tensors are writable
+            return {k: torch.from_numpy(np.load(f'{prefix}.{k}.npy', mmap_mode='c')) for k in keys}
+
+        d = load_fn()
+        os.makedirs(cache_dir, exist_ok=True)
+        for k, v in d.items():
+            np.save(f'{prefix}.{k}.npy', v.numpy())
+        with open(index_path + '.tmp', 'w') as fp:  # written last, as the flag of a complete cache
+            json.dump(list(d.keys()), fp)
+        os.replace(index_path + '.tmp', index_path)
+        return d
+
+    def ids_to_tags(self, ids):
+        if isinstance(ids, torch.Tensor):
+            ids = ids.detach().cpu().numpy()
+        tags = []
+        for id in ids:
+            tags.append(self.idx2tag[id])
+        return tags
+
+    def tags_to_ids(self, tags):
+        ids = []
+        for tag in tags:
+            ids.append(self.tag2idx[tag])
+        return ids
+
+    def get_tags(self):
+        tags = []
+        file_path = os.path.join(self.data_dir, 'tags.txt')
+        with open(file_path, 'r') as file:
+            for tag in file:
+                if tag.strip():
+                    tags.append(tag.strip())
+        return tags
+
+    def load_data(self, data_type='train'):
+        file_paths = [os.path.join(self.data_dir, data_type, fn) for fn in ('sentences.txt', 'tags.txt')]
+        return self._load_cached(data_type, file_paths, lambda: self._load_data(data_type))
+
+    def _load_data(self, data_type='train'):
+        """
+        :param data_type: 'train'/'val'
+        :return:
+            sen_token_ids: list of sentences, represented by token id. [[101,102,...],[200,300,...],...]
+            sen_att_mask:
+            sen_tag_ids: list of sentences' tags, represented by tag id. [[2,1,5,...],[3,1,2,...],...]
+        """
+        with open(os.path.join(self.data_dir, data_type, 'sentences.txt'), 'r', encoding='utf8') as file:
+            lines = file.readlines()
+            # encode_plus = tokenize + to_ids + to_tensor
+            # bert-chinese中，中文之间的空格会被去掉
+            _sen_tokens = self.tokenizer.batch_encode_plus(lines, max_length=self.max_sql, pad_to_max_length=True)
+            # # ===== Stats
+            # import matplotlib.pyplot as plt
+            # att_masks = _sen_tokens['attention_mask']
+            # lens = np.array(list(map(lambda x: sum(x), att_masks)))
+            # plt.hist(lens, bins=50)
+            # plt.show()
+            # # sql: 80=0.959, 90=0.975, 100=0.975, 125=1.0
+            # for n in (80, 85, 90, 95, 100, 110, 125, 150):
+            #     print(f'{n}:', np.sum(lens < n) / len(lens))
+            # breakpoint()
+
+        sen_token_ids = torch.tensor(_sen_tokens['input_ids'], dtype=torch.long)
+        sen_att_mask = torch.tensor(_sen_tokens['attention_mask'], dtype=torch.float)
+        # self.tokenizer.convert_ids_to_tokens(sen_token_ids[0])
+        CLS_token_id = self.tokenizer.convert_tokens_to_ids(['[CLS]'])[0]  # 101
+
+        sen_tag_ids = -1 * torch.ones_like(sen_token_ids, dtype=torch.long)  # -1 for tag padding (non-labeled)
+        with open(os.path.join(self.data_dir, data_type, 'tags.txt'), 'r') as file:
+            for i, line in enumerate(file):
+                ### token_ids[0] == [CLS], shift toward right
+                assert sen_token_ids[i][0].item() == CLS_token_id
+                tag_ids = [self.tag2idx[tag] for tag in line.strip().split(' ')]
+                if len(tag_ids) > self.max_sql - 1:
+                    tag_ids = tag_ids[:self.max_sql - 1]
+                sen_tag_ids[i, 1:1 + len(tag_ids)] = torch.tensor(tag_ids, dtype=torch.long)
+
+        d = {'token_ids': sen_token_ids, 'att_mask': sen_att_mask, 'tag_ids': sen_tag_ids}
+        return d
+
+    def load_test_data(self):
+        test_data_dir = os.path.join(self.data_dir, 'test')
+        file_paths = [os.path.join(test_data_dir, fn) for fn in os.listdir(test_data_dir) if fn.endswith('.txt')]
+        return self._load_cached('test', file_paths, self._load_test_data)
+
+    def _load_test_data(self):
+        """ test data: no label/tag
+        :return:
+            sen_token_ids: list of sentences, represented by token id. [[101,102,...],[200,300,...],...]
+            sen_att_mask:
+        """
+        test_data_dir = os.path.join(self.data_dir, 'test')
+
+        lines = []
+        fns = os.listdir(test_data_dir)
+        for fn in fns:
+            if not fn.endswith('.txt'):
+                continue
+            print(f'Read {fn}')
+            ffn = os.path.join(test_data_dir, fn)  # full file name
+            with open(ffn, 'r', encoding='utf8') as fp:
+                lines1 = fp.readlines()
+                lines1 = [l for l in lines1 if l.strip()]
+                lines.extend(lines1)
+
+        ### Clean
+        def clean_seq(seq_):
+            # 第一个空格之前，如果全是ASCII（如‘1.2.3 ’），则删掉
+            if ' ' in seq_:
+                i = seq_.index(' ')
+                if all(ord(c) < 128 for c in seq_[:i]):
+                    seq_ = seq_[i + 1:]
+
+            seq_ = seq_.replace(' ', '')
+            return seq_
+
+        for i in range(len(lines)):
+            lines[i] = clean_seq(lines[i])
+        ###
+
+        _sen_tokens = self.tokenizer.batch_encode_plus(lines, max_length=self.max_sql, pad_to_max_length=True)
+        sen_token_ids = torch.tensor(_sen_tokens['input_ids'], dtype=torch.long)
+        sen_att_mask = torch.tensor(_sen_tokens['attention_mask'], dtype=torch.float)
+        # CLS_token_id = self.tokenizer.convert_tokens_to_ids(['[CLS]'])[0]  # 101
+
+        d = {'token_ids': sen_token_ids, 'att_mask': sen_att_mask}
+        return d
+
+    def check_tags_stratify(self, print_result=False):
+        import pandas as pd
+
+        t = self.train_dataset.sen_tag_ids.numpy().reshape(-1)
+        v = self.val_dataset.sen_tag_ids.numpy().reshape(-1)
+        tv = np.concatenate((t, v))
+        tags = {'tag-id': [], 'tag': [], 'count-all': [], 'count-train': [], 'count-val': [], 'train-val-ratio': []}
+        for i in range(15):
+            tags['tag-id'].append(i)
+            tags['tag'].append(self.idx2tag[i])
+            tags['count-all'].append(np.sum(tv == i))
+            tags['count-train'].append(np.sum(t == i))
+            tags['count-val'].append(np.sum(v == i))
+            tags['train-val-ratio'].append(round(tags['count-train'][-1] / tags['count-val'][-1], 1))
+
+        tags_df = pd.DataFrame(tags)
+        if print_result:
+            print(tags_df)
+            print(f"Min, Max of train-val-ratio: {min(tags_df['train-val-ratio'])}, {max(tags_df['train-val-ratio'])}")
+
+        check_pass = True
+        if 0 in tags_df['count-val'].to_numpy() or 0 in tags_df['count-train'].to_numpy():
+            check_pass = False
+
+        return check_pass, tags_df
+
+    def get_token_ids_bool_mask(self, token_ids: torch.Tensor):
+        cls_id, pad_id, sep_id = self.tokenizer.convert_tokens_to_ids(['[CLS]', '[PAD]', '[SEP]'])  # 101,0,102
+        mask = ((token_ids != pad_id).float() * (token_ids != cls_id).float() * (token_ids != sep_id).float()).bool()
+        return mask
+
+    def render_seq_labels(self, seq, label, pred, mark_down=False):
+        # if (label is None) and (pred is None):
+        #     return ''.join(seq)
+
+        if isinstance(seq, torch.Tensor):
+            # seq = seq.view(-1)
+            mask = label >= 0 if label is not None else self.get_token_ids_bool_mask(seq)
+
+            seq = self.tokenizer.convert_ids_to_tokens(seq.masked_select(mask))
+            if label is not None:
+                label = self.ids_to_tags(label.masked_select(mask))
+            if pred is not None:
+                pred = self.ids_to_tags(pred.masked_select(mask))
+
+        if label is not None:
+            label_iit = label_bio_to_iit(label, seq)
+            # print(self._render_seq_label_lines(seq, label_iit))
+            label_str = self._render_seq_label(seq, label_iit, mark_down)
+            # print(label_str)
+        else:
+            label_str = None
+
+        if pred is not None:
+            pred_iit = label_bio_to_iit(pred, seq)
+            pred_str = self._render_seq_label(seq, pred_iit, mark_down)
+        else:
+            pred_str = None
+
+        seq_str = ''.join(seq).replace('[', '<').replace(']', '>')
+        return label_str, pred_str, seq_str
+
+    def _render_seq_label(self, seq, label, mark_down=False):
+        """
+        :param seq: list of char
+        :param label: label_iit
+        :return: e.g., [水带/obj]，在设计工作压力下其[轴向延伸率/prop]
+        """
+        seq = seq.copy()
+        for i in range(len(seq)):
+            seq[i] = seq[i].replace('[', '<').replace(']', '>')
+
+        for i, j, tag in label:
+            s = seq[i] if j <= i + 1 else ''.join(seq[i:j])
+            if mark_down:
+                seq[i] = f' `{s}/{tag}` '
+            else:
+                seq[i] = f'[{s}/{tag}]'
+
+            if j > i + 1:
+                for k in range(i + 1, j):
+                    seq[k] = ''
+
+        return (''.join(seq)).strip()
+
+    def _render_seq_label_lines(self, seq, label):
+        seq = seq.copy()
+        for i in range(len(seq)):
+            seq[i] = seq[i].replace('[', '<').replace(']', '>')
+
+        seq_lb = []
+        for i, j, tag in label:
+            seq_lb.append(''.join(seq[i:j]) + ' ' + tag)
+
+        return '\n'.join(seq_lb)
+
+    def _tag_arrays(self):
+        """ is_B, is_I, tag type (e.g., 'obj') indexed by tag id """
+        if not hasattr(self, '_tag_is_b'):
+            self._tag_is_b = np.array([tag.startswith('B-') for tag in self.tags])
+            self._tag_is_i = np.array([tag.startswith('I-') for tag in self.tags])
+            self._tag_types = [tag[2:] for tag in self.tags]
+        return self._tag_is_b, self._tag_is_i, self._tag_types
+
+    def decode_batch_spans(self, tag_ids, row_starts):
+        """
+        Vectorised label_bio_to_iit of a batch. A span starts at B- and extends over the following I- of the same row.
+        :param tag_ids: np.array of tag ids of the valid tokens of all rows, flattened (row-major)
+        :param row_starts: np.array of the index of the first token of each row in tag_ids
+        :return: (starts, ends, tag ids) of the spans, indexed in tag_ids
+        """
+        is_b, is_i, _ = self._tag_arrays()
+        n = len(tag_ids)
+        breaker = ~is_i[tag_ids]
+        breaker[row_starts[row_starts < n]] = True
+        breakers = np.append(np.flatnonzero(breaker), n)
+        starts = np.flatnonzero(is_b[tag_ids])
+        ends = breakers[np.searchsorted(breakers, starts, side='right')]
+        return starts, ends, tag_ids[starts]
+
+    def _render_batch_spans(self, tokens, row_starts, tag_ids):
+        """ _render_seq_label of each row, with tokens of all rows flattened """
+        _, _, tag_types = self._tag_arrays()
+        starts, ends, span_tags = self.decode_batch_spans(tag_ids, row_starts)
+        pieces = list(tokens)
+        covered = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.add.at(covered, starts + 1, 1)
+        np.add.at(covered, ends, -1)
+        for k in np.flatnonzero(np.cumsum(covered[:-1])):
+            pieces[k] = ''
+        for i, j, t in zip(starts.tolist(), ends.tolist(), span_tags.tolist()):
+            pieces[i] = f"[{''.join(tokens[i:j])}/{tag_types[t]}]"
+        bounds = list(row_starts) + [len(tokens)]
+        return [''.join(pieces[bounds[r]:bounds[r + 1]]).strip() for r in range(len(row_starts))]
+
+    def render_batch_labels(self, inputs, labels=None, preds=None):
+        """
+        Batch version of render_seq_labels (same strings), e.g., for logging predictions
+        :param inputs: token ids, shape: [bs, sql]
+        :param labels: tag ids (-1 for non-labeled), shape: [bs, sql] or None
+        :param preds: tag ids, shape: [bs, sql] or None
+        :return: list of (label_str, pred_str, seq_str)
+        """
+        mask = labels >= 0 if labels is not None else self.get_token_ids_bool_mask(inputs)
+        mask = mask.detach().cpu().numpy()
+        row_starts = np.concatenate([[0], np.cumsum(mask.sum(axis=1))[:-1]]).astype(np.int64)
+
+        token_ids = inputs.detach().cpu().numpy()[mask]
+        tokens = [t.replace('[', '<').replace(']', '>') for t in self.tokenizer.convert_ids_to_tokens(token_ids.tolist())]
+        bounds = list(row_starts) + [len(tokens)]
+        seq_strs = [''.join(tokens[bounds[r]:bounds[r + 1]]) for r in range(len(row_starts))]
+
+        label_strs, pred_strs = [None] * len(seq_strs), [None] * len(seq_strs)
+        if labels is not None:
+            label_strs = self._render_batch_spans(tokens, row_starts, labels.detach().cpu().numpy()[mask])
+        if preds is not None:
+            pred_strs = self._render_batch_spans(tokens, row_starts, preds.detach().cpu().numpy()[mask])
+        return list(zip(label_strs, pred_strs, seq_strs))
+
+
+class TextDataSet(data.Dataset):
+    def __init__(self, data: dict):
+        self.sen_token_ids = data['token_ids']
+        self.sen_att_mask = data['att_mask']
+        if 'tag_ids' in data:  # consider test data
+            self.sen_tag_ids = data['tag_ids']
+
+        self.len = len(self.sen_token_ids)
+
+    def __len__(self):
+        return self.len
+
+    def lengths(self):
+        """num of tokens (incl. [CLS] & [SEP]) of each sentence"""
+        return self.sen_att_mask.sum(dim=1).long().numpy()
+
+    def __getitem__(self, index):
+        if hasattr(self, 'sen_tag_ids'):
+            return self.sen_token_ids[index], self.sen_att_mask[index], self.sen_tag_ids[index]
+
+        return self.sen_token_ids[index], self.sen_att_mask[index]
+
+
+class IndexedDataSet(data.Dataset):
+    """(index, *dataset[index]), to put the batches of BucketBatchSampler back in the order of the dataset"""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        return (index,) + tuple(self.dataset[index])
+
+
+class BucketBatchSampler(data.Sampler):
+    def __init__(self, lengths, batch_size, shuffle=True, bucket_size=None, drop_last=False, num_replicas=1, rank=0,
+                 seed=0):
+        """Group the sentences of similar lengths into batches, use with collate_trim_pad to pad each batch only to
+        its longest sentence.
+        (shuffled) sentences are sorted by length in every bucket of bucket_size sentences (default: 50 batches),
+        then cut into batches, and the order of batches is shuffled. shuffle=False: the whole data is sorted by length
+        num_replicas, rank: DDP shard, the batches[rank::num_replicas] of the same shuffle (by seed and set_epoch()),
+        padded by the first batches so that every rank has the same num of batches, like DistributedSampler
+        """
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.bucket_size = bucket_size if bucket_size else batch_size * 50
+        self.drop_last = drop_last
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    @property
+    def num_samples(self):
+        """ num of sentences of this rank (approx. with drop_last), like DistributedSampler.num_samples """
+        return int(np.ceil(len(self.lengths) / self.num_replicas))
+
+    def _bucket_size(self):
+        return self.bucket_size if self.shuffle else max(len(self.lengths), 1)
+
+    def get_batches(self):
+        # DDP: all ranks shuffle the same way
+        rng = np.random.RandomState(self.seed + self.epoch) if self.num_replicas > 1 else np.random
+        idxs = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        bucket_size = self._bucket_size()
+        batches = []
+        for k in range(0, len(idxs), bucket_size):
+            bucket = idxs[k:k + bucket_size]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind='stable')]
+            for b in range(0, len(bucket), self.batch_size):
+                batch = bucket[b:b + self.batch_size]
+                if self.drop_last and len(batch) < self.batch_size:
+                    continue
+                batches.append(batch.tolist())
+
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        if self.num_replicas > 1:
+            n_pad = -len(batches) % self.num_replicas
+            batches = (batches + batches[:n_pad])[self.rank::self.num_replicas]
+        return batches
+
+    def __iter__(self):
+        return iter(self.get_batches())
+
+    def __len__(self):
+        bucket_size = self._bucket_size()
+        n_bucket_batches = [len(self.lengths[k:k + bucket_size]) / self.batch_size
+                            for k in range(0, len(self.lengths), bucket_size)]
+        n_batches = sum(int(n) if self.drop_last else int(np.ceil(n)) for n in n_bucket_batches)
+        return int(np.ceil(n_batches / self.num_replicas))
+
+
+def collate_trim_pad(batch):
+    """default collate, then trim the [PAD] columns, i.e., pad to the longest sentence in the batch"""
+    tensors = data.dataloader.default_collate(batch)  # (token_ids, att_mask[, tag_ids])
+    sql = int(tensors[1].sum(dim=1).max().item())
+    return [t[:, :sql].contiguous() for t in tensors]  # contiguous for .view()
+
+
+def collate_trim_pad_with_index(batch):
+    """collate_trim_pad of the IndexedDataSet items: [indexes, token_ids, att_mask[, tag_ids]]"""
+    return [torch.tensor([item[0] for item in batch])] + collate_trim_pad([item[1:] for item in batch])
+
+
+def _get_bucket_data_loader(dataset, batch_size, shuffle, num_workers, with_index=False):
+    sampler = BucketBatchSampler(dataset.lengths(), batch_size, shuffle=shuffle)
+    if with_index:
+        return data.DataLoader(dataset=IndexedDataSet(dataset), batch_sampler=sampler,
+                               collate_fn=collate_trim_pad_with_index, num_workers=num_workers)
+    return data.DataLoader(dataset=dataset, batch_sampler=sampler, collate_fn=collate_trim_pad, num_workers=num_workers)
+
+
+def get_data_loader(data_dir, batch_size, max_sql=125, enable_save=False, check_stratify=True, shuffle_train=True,
+                    bucket=False):
+    """
+    example:
+    for token_ids, att_mask, tag_ids in val_data_loader:
+        print(token_ids.shape, att_mask.shape, tag_ids.shape)
+        # torch.Size([32, 125]) torch.Size([32, 125]) torch.Size([32, 125])
+
+    bucket: batches of similar lengths padded to their longest sentence, i.e., torch.Size([32, <=125]),
+            the val data is sorted by length (the order of sentences is changed)
+    """
+
+    if enable_save:
+        corpus_path = os.path.join(data_dir, 'corpus.dat')
+        if not os.path.exists(corpus_path):
+            print('Processing...')
+            corpus = Corpus(data_dir, max_sql)
+            with open(corpus_path, 'wb') as fp:
+                pickle.dump(corpus, fp)
+        else:
+            with open(corpus_path, 'rb') as fp:
+                corpus = pickle.load(fp)
+    else:
+        corpus = Corpus(data_dir, max_sql)
+
+    if check_stratify:
+        check, tags_df = corpus.check_tags_stratify()
+        assert check, f'Check tags stratify failed. try another random_sate in shuffle for data\n{tags_df}'
+        # print(tags_df)
+
+    num_workers = 0 if 'Windows' in platform.platform() else 4
+    if bucket:
+        train_data_loader = _get_bucket_data_loader(corpus.train_dataset, batch_size, shuffle_train, num_workers)
+        val_data_loader = _get_bucket_data_loader(corpus.val_dataset, batch_size, False, num_workers)
+        return train_data_loader, val_data_loader, corpus
+
+    train_data_loader = data.DataLoader(dataset=corpus.train_dataset, batch_size=batch_size,
+                                        shuffle=shuffle_train, num_workers=num_workers, drop_last=False)
+    val_data_loader = data.DataLoader(dataset=corpus.val_dataset, batch_size=batch_size,
+                                      shuffle=False, num_workers=num_workers, drop_last=False)
+
+    return train_data_loader, val_data_loader, corpus
+
+
+def get_test_data_loader(data_dir, batch_size, max_sql=125, bucket=False):
+    """ read txt files in the test dir.
+    example:
+    for token_ids, att_mask in test_data_loader:
+        print(token_ids.shape, att_mask.shape)
+        # torch.Size([32, 125]) torch.Size([32, 125]))
+
+    bucket: see get_data_loader, the sentences are sorted by length, so the batches are [indexes, token_ids, att_mask]
+            with the indexes of the sentences in the test data to restore the order
+    """
+    corpus = Corpus(data_dir, max_sql, is_test=True)
+
+    num_workers = 0 if 'Windows' in platform.platform() else 4
+    if bucket:
+        return _get_bucket_data_loader(corpus.test_dataset, batch_size, False, num_workers, with_index=True), corpus
+
+    test_data_loader = data.DataLoader(dataset=corpus.test_dataset, batch_size=batch_size,
+                                       shuffle=False, num_workers=num_workers, drop_last=False)
+
+    return test_data_loader, corpus
+
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import time
+import argparse
+import numpy as np
+import torch
+import torch.nn as nn
+from utils import *
+
+
+def load_torch_model(model_path='./models/_BertZh0_best.pth', n_label=15, bert_name='./models/bert-base-chinese',
+                     device='cpu'):
+    from model import BertZhTokenClassifier_
+
+    model = BertZhTokenClassifier_(n_label, p_drop=0.1, bert_name=bert_name)
+    model.load_state_dict(load_state_dict_file(model_path, device))  # .pth or .safetensors
+    model.to(device)
+    model.eval()
+    return model
+
+
+def _example_inputs(batch_size=2, sql=32):
+    inputs = torch.full((batch_size, sql), 100, dtype=torch.long)  # [UNK]
+    inputs[:, 0], inputs[:, -1] = 101, 102  # [CLS], [SEP]
+    att_mask = torch.ones((batch_size, sql), dtype=torch.float)
+    return inputs, att_mask
+
+
+def export_jit(model_path='./models/_BertZh0_best.pth', out_path=None, quantize=True, n_label=15,
+               bert_name='./models/bert-base-chinese'):
+    """
+    Export BertZhTokenClassifier_ to TorchScript (traced, CPU), with the same forward(inputs, att_mask) signature.
+    quantize: dynamic int8 quantization of all nn.Linear (weights in int8, activations quantized on the fly)
+    """
+    if out_path is None:
+        out_path = os.path.splitext(model_path)[0] + ('.int8.pt' if quantize else '.pt')
+
+    model = load_torch_model(model_path, n_label, bert_name)
+    if quantize:
+        model = torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+    with torch.no_grad():
+        traced = torch.jit.trace(model, _example_inputs(), check_trace=False)
+    torch.jit.save(traced, out_path)
+    print(f'Export TorchScript model to {out_path}')
+    return out_path
+
+
+def load_jit_model(path, device='cpu'):
+    model = torch.jit.load(path, map_location=device)
+    model.eval()
+    return model
+
+
+def export_onnx(model_path='./models/_BertZh0_best.pth', out_path=None, opset=11, n_label=15,
+                bert_name='./models/bert-base-chinese'):
+    """Export BertZhTokenClassifier_ to ONNX, inputs: inputs (int64), att_mask (float), output: outputs,
+    with dynamic batch and sequence axes"""
+    if out_path is None:
+        out_path = os.path.splitext(model_path)[0] + '.onnx'
+
+    model = load_torch_model(model_path, n_label, bert_name)
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in ('inputs', 'att_mask', 'outputs')}
+    with torch.no_grad():
+        torch.onnx.export(model, _example_inputs(), out_path, input_names=['inputs', 'att_mask'],
+                          output_names=['outputs'], dynamic_axes=dynamic_axes, opset_version=opset)
+    print(f'Export ONNX model to {out_path}')
+    return out_path
+
+
+class OnnxTokenClassifier:
+    def __init__(self, path, n_threads=0):
+        """onnxruntime (CPU execution provider) backend, called as model(inputs, att_mask) like the torch model.
+        torch tensors in -> torch tensor out, numpy arrays in -> numpy array out"""
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if n_threads:
+            options.intra_op_num_threads = n_threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def __call__(self, inputs, att_mask):
+        is_tensor = isinstance(inputs, torch.Tensor)
+        if is_tensor:
+            inputs, att_mask = inputs.cpu().numpy(), att_mask.cpu().numpy()
+        outputs = self.session.run(['outputs'], {'inputs': inputs.astype(np.int64),
+                                                 'att_mask': att_mask.astype(np.float32)})[0]
+        return torch.from_numpy(outputs) if is_tensor else outputs
+
+    def eval(self):
+        return self
+
+
+def parity_report(model_ref, model_new, data_loader, log_fn=print, comment='new'):
+    """
+    Compare the argmax tags and the f1 of model_new with model_ref on data_loader (e.g., the val split)
+    :return: (tag agreement, f1w of model_ref, f1w of model_new, seconds of model_ref, seconds of model_new)
+    """
+    history_ref, history_new = NNConfusionHistory(), NNConfusionHistory()
+    time_ref, time_new = 0., 0.
+    n_same, n_tokens = 0, 0
+    with torch.no_grad():
+        for inputs, att_mask, labels in data_loader:
+            labels = labels.view(-1)
+            start_time = time.time()
+            preds_ref = torch.argmax(model_ref(inputs, att_mask), dim=-1).view(-1)
+            time_ref += time.time() - start_time
+            start_time = time.time()
+            preds_new = torch.argmax(torch.as_tensor(model_new(inputs, att_mask)), dim=-1).view(-1)
+            time_new += time.time() - start_time
+
+            mask = labels >= 0
+            n_same += torch.sum((preds_ref == preds_new) & mask).item()
+            n_tokens += torch.sum(mask).item()
+            history_ref.append(0., preds_ref, labels, ignore_label=-1)
+            history_new.append(0., preds_new, labels, ignore_label=-1)
+
+    agreement = n_same / n_tokens
+    f1_ref, f1_new = history_ref.avg_prf1_weight()[-1], history_new.avg_prf1_weight()[-1]
+    log_fn(f'=== Parity ({comment} vs torch) ===')
+    log_fn(f'Tag agreement: {agreement:.4f} ({n_same}/{n_tokens})')
+    log_fn(f'F1w: torch={f1_ref:.4f}, {comment}={f1_new:.4f} ({f1_new - f1_ref:+.4f})')
+    log_fn(f'Time: torch={time_ref:.2f}s, {comment}={time_new:.2f}s ({time_ref / max(time_new, 1e-9):.2f}x)')
+    return agreement, f1_ref, f1_new, time_ref, time_new
+
+
+def get_args():
+    parser = argparse.ArgumentParser('Export Model')
+    parser.add_argument('--model', type=str, default='./models/_BertZh0_best.pth', help='state dict of the model')
+    parser.add_argument('--bert_name', type=str, default='./models/bert-base-chinese')
+    parser.add_argument('--format', type=str, default='jit', choices=['jit', 'onnx'], help='export format')
+    parser.add_argument('--out', type=str, default=None, help='output path, default: next to the model')
+    parser.add_argument('--no_quantize', action='store_true', help='do not quantize nn.Linear to int8 (jit)')
+    parser.add_argument('--opset', type=int, default=11, help='onnx opset version')
+    parser.add_argument('--parity', action='store_true', help='report the parity with the torch model on val')
+    parser.add_argument('--threads', type=int, default=0, help='torch cpu threads, 0 for default')
+    args_ = parser.parse_args()
+
+    return args_
+
+
+if __name__ == '__main__':
+    args = get_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    logger = Logger(file_name='export.log')
+
+    if args.format == 'onnx':
+        out_path = export_onnx(args.model, args.out, args.opset, bert_name=args.bert_name)
+    else:
+        out_path = export_jit(args.model, args.out, quantize=not args.no_quantize, bert_name=args.bert_name)
+
+    if args.parity:
+        from dataset import get_data_loader
+
+        _, val_data_loader, _ = get_data_loader('../data/xiaofang', 32, check_stratify=False)
+        model_new = OnnxTokenClassifier(out_path, args.threads) if args.format == 'onnx' else load_jit_model(out_path)
+        parity_report(load_torch_model(args.model, bert_name=args.bert_name), model_new, val_data_loader, logger.log,
+                      comment=os.path.basename(out_path))
@@ -1,3 +1,12 @@
+import os
+import re
+import gzip
+import json
+import time
+import hashlib
+import multiprocessing
+import tracemalloc
+import numpy as np
 import ifcopenshell
 from owlready2 import *
 
@@ -42,6 +51,24 @@ class Mappping_dict():
             }
         return self.ifc_map_fireonto_dict
 
+    # the dtype of the data property columns in Element_table, str dataproperty uses object
+    def fireonto_dataprop_dtype(self):
+        if not hasattr(self, 'fireonto_dataprop_dtype_dict'):
+            self.fireonto_dataprop_dtype_dict = {
+                'hasFireResistanceLimits_hour': np.float64,
+                'isLoadBearing_Boolean': np.bool_,
+                'IsSecurityExits_Boolean': np.bool_,
+                'isFireWall_Boolean': np.bool_,
+                'isFireProtectionSubdivision_Boolean': np.bool_,
+                'hasMaxNumberOfHuman': np.int64,
+                'hasGlobalId': object,
+                'hasBuildingArea_m2': np.float64,
+                'hasBuildingType': object,
+                'hasFireHazardCategory': np.int64,
+                'hasFireResistanceGrade': np.int64,
+            }
+        return self.fireonto_dataprop_dtype_dict
+
     # this is the inverse function of ifc_map_fireonto
     def fireonto_map_ifc(self):
         if not hasattr(self, 'fireonto_map_ifc_dict'):
@@ -71,47 +98,50 @@ class Building_element():
         self.obj_properties.append((property_name, range_element))
 
     def write_dataprop_ttl(self, mapping_dict, number_item: int, prefix='firecodes:'):
+        return ''.join(self.get_dataprop_ttl_lines(mapping_dict, number_item, prefix=prefix))
+
+    def get_dataprop_ttl_lines(self, mapping_dict, number_item: int, prefix='firecodes:'):
         # only test for 'hasFireResistanceLimits(hour)'
         # the prefix short for BuildingDesignFireCodesOntology is firecodes:
         # set class
         # self.instance_name is used for object property generation
         self.instance_name = self.element_type + str(number_item)
-        ttl_content = ''
+        ttl_lines = []
         if self.element_type in mapping_dict:
             # element_class is the class name in the ontology
             self.element_class = mapping_dict[self.element_type]
             # if 'Todo' in element_class the ontology do not have the class, and will raise error
             if 'Todo' not in self.element_class:
-                ttl_content = prefix + self.instance_name + ' rdf:type owl:NamedIndividual , ' + '<http://www.semanticweb.org/16424/ontologies/2020/10/untitled-ontology-8#' + self.element_class + '> .\n'
+                subject = prefix + self.instance_name + ' '
+                ttl_lines.append(subject + 'rdf:type owl:NamedIndividual , ' + '<http://www.semanticweb.org/16424/ontologies/2020/10/untitled-ontology-8#' + self.element_class + '> .\n')
                 # set global id
-                ttl_content += prefix + self.instance_name + ' ' + prefix + mapping_dict[
-                    'GlobalId'] + ' ' + '"' + self.element_id + '"^^xsd:string' + ' .\n'
+                ttl_lines.append(subject + prefix + mapping_dict['GlobalId'] + ' ' + '"' + self.element_id + '"^^xsd:string' + ' .\n')
                 # set data data_properties
                 for property in self.data_properties:
                     if property[0] in mapping_dict:
                         dataproperty_name = mapping_dict[property[0]]
                         if type(property[1]) is bool:
-                            ttl_content += prefix + self.instance_name + ' ' + prefix + dataproperty_name + ' ' + '"' + str(
-                                property[1]).lower() + '"^^xsd:boolean' + ' .\n'
+                            ttl_lines.append(subject + prefix + dataproperty_name + ' ' + '"' + str(
+                                property[1]).lower() + '"^^xsd:boolean' + ' .\n')
                         elif type(property[1]) is float:
-                            ttl_content += prefix + self.instance_name + ' ' + prefix + dataproperty_name + ' ' + '"' + str(
-                                property[1]) + '"^^xsd:float' + ' .\n'
+                            ttl_lines.append(subject + prefix + dataproperty_name + ' ' + '"' + str(
+                                property[1]) + '"^^xsd:float' + ' .\n')
                         elif type(property[1]) is int:
-                            ttl_content += prefix + self.instance_name + ' ' + prefix + dataproperty_name + ' ' + '"' + str(
-                                property[1]) + '"^^xsd:int' + ' .\n'
+                            ttl_lines.append(subject + prefix + dataproperty_name + ' ' + '"' + str(
+                                property[1]) + '"^^xsd:int' + ' .\n')
                         elif type(property[1]) is str:
-                            ttl_content += prefix + self.instance_name + ' ' + prefix + dataproperty_name + ' ' + '"' + \
-                                           property[1] + '"^^xsd:string' + ' .\n'
+                            ttl_lines.append(subject + prefix + dataproperty_name + ' ' + '"' + property[
+                                1] + '"^^xsd:string' + ' .\n')
                     else:
                         continue
-        return ttl_content
+        return ttl_lines
 
     def write_objprop_ttl(self):
-        ttl_content = ''
-        for obj_property in self.obj_properties:
-            ttl_content += ':' + self.instance_name + ' :' + obj_property[0] + ' :' + obj_property[
-                1].instance_name + ' .\n'
-        return ttl_content
+        return ''.join(self.get_objprop_ttl_lines())
+
+    def get_objprop_ttl_lines(self):
+        return [':' + self.instance_name + ' :' + obj_property[0] + ' :' + obj_property[1].instance_name + ' .\n'
+                for obj_property in self.obj_properties]
 
     '''
     State: Use
@@ -143,7 +173,11 @@ class Building_element():
     @staticmethod
     # get element '消防系统' sub data_properties for every element
     # TODO 全转换
-    def get_single_element_prop(ifc_obj, property_name='', property_set_names=['消防系统']):
+    def get_single_element_prop(ifc_obj, property_name='', property_set_names=['消防系统'], type_pset_cache=None):
+        """
+        :param type_pset_cache: dict {(RelatingType id, property_set_name): [(property_name, value), ...]}, the family
+                                properties are shared by the instances of the same type, so decode them only once
+        """
         Type = ifc_obj.is_a()
         GlobaId = ifc_obj.GlobalId
         Name = ifc_obj.Name
@@ -156,16 +190,9 @@ class Building_element():
             # family property
             for family in ifc_obj.IsTypedBy:
                 if family.is_a('IfcRelDefinesByType'):
-                    property_fsets = family.RelatingType.HasPropertySets
-                    if property_fsets is not None:
-                        for property_fset in property_fsets:
-                            if property_fset.Name == property_set_name:
-                                for property in property_fset.HasProperties:
-                                    element.add_dataprop(property.Name, property.NominalValue.wrappedValue)
-                            else:
-                                continue
-                    else:
-                        continue
+                    for property in Building_element.get_type_prop(family.RelatingType, property_set_name,
+                                                                   type_pset_cache):
+                        element.add_dataprop(*property)
             # instance property
             for definition in ifc_obj.IsDefinedBy:
                 if not definition.is_a('IfcRelDefinesByProperties'):
@@ -196,14 +223,40 @@ class Building_element():
                         continue  # there are more types
         return element
 
+    '''
+    State: Use
+    Function: get the family properties [(property_name, value), ...] of the property set in the RelatingType
+    '''
+
+    @staticmethod
+    def get_type_prop(relating_type, property_set_name, type_pset_cache=None):
+        key = (relating_type.id(), property_set_name)
+        if type_pset_cache is not None and key in type_pset_cache:
+            return type_pset_cache[key]
+
+        properties = []
+        property_fsets = relating_type.HasPropertySets
+        if property_fsets is not None:
+            for property_fset in property_fsets:
+                if property_fset.Name == property_set_name:
+                    for property in property_fset.HasProperties:
+                        properties.append((property.Name, property.NominalValue.wrappedValue))
+        if type_pset_cache is not None:
+            type_pset_cache[key] = properties
+        return properties
+
     @staticmethod
     def search_element_by_GlobalId(proceed_elements, GlobalId):
+        if isinstance(proceed_elements, Element_registry):
+            return proceed_elements.get_by_GlobalId(GlobalId)
         for element in proceed_elements:
             if element.element_id == GlobalId:
                 return element
 
     @staticmethod
     def search_elements_by_type(proceed_elements, element_type):
+        if isinstance(proceed_elements, Element_registry):
+            return proceed_elements.get_by_type(element_type)
         elements = []
         indexes = []
         for index, element in enumerate(proceed_elements):
@@ -214,63 +267,69 @@ class Building_element():
 
     '''
     State: Use
-    Function: get the obj_prop between two element from the elements and ifc file
+    Function: get the obj_prop of one single element from ifc file, the range element is given by its GlobalId
+    Output: list of tuple, each tuple is a (obj_property_name, range_GlobalId)
     Todo: now only consider two type of obj_prop
         1. IfcBuilding hasBuildingSpatialElement BuildingStorey
         2. IfcSpace hasBuildingElement xxx
     '''
 
+    @staticmethod
+    def get_single_element_objprop(ifc_obj):
+        relations = []
+        domain_type = ifc_obj.is_a()
+        if domain_type == 'IfcBuilding':
+            if len(ifc_obj.IsDecomposedBy) > 0:
+                range_objs = ifc_obj.IsDecomposedBy[0].RelatedObjects
+                '''IfcBuilding hasBuildingSpatialElement BuildingStorey'''
+                for range_obj in range_objs:
+                    range_name = range_obj.Name
+                    '''
+                    The ifcstorey is not the real storey in the world, judge whether it is a real floor through keyword matching method
+                    '''
+                    if '地面' in range_name or '楼面' in range_name:
+                        # obj_prop_tag = Building_element.get_objprop(domain_type, range_obj.is_a())
+                        # assert obj_prop_tag == 'hasBuildingSpatialElement', 'The obj_prop_tag is not True'
+                        relations.append(('hasBuildingSpatialElement', range_obj.GlobalId))
+
+        elif domain_type == 'IfcBuildingStorey':
+            if len(ifc_obj.IsDecomposedBy) > 0:
+                range_objs = ifc_obj.IsDecomposedBy[0].RelatedObjects
+                '''IfcBuilding hasBuildingSpatialElement BuildingStorey'''
+                for range_obj in range_objs:
+                    relations.append(('hasBuildingSpatialElement', range_obj.GlobalId))
+
+        elif domain_type == 'IfcSpace':
+            for bounding_obj in ifc_obj.BoundedBy:
+                # obj_prop_tag = Building_element.get_objprop(domain_type, bounding_obj.RelatedBuildingElement.is_a())
+                # assert obj_prop_tag == 'hasBuildingElement', 'The obj_prop_tag is not True'
+                relations.append(('hasBuildingElement', bounding_obj.RelatedBuildingElement.GlobalId))
+        return relations
+
+    '''
+    State: Use
+    Function: add the obj_prop (domain_GlobalId, obj_property_name, range_GlobalId) to the proceed elements
+    '''
+
+    @staticmethod
+    def add_elements_objprop(proceed_elements, relations):
+        for domain_GlobaId, obj_prop_tag, range_GlobaId in relations:
+            domain_element = Building_element.search_element_by_GlobalId(proceed_elements, domain_GlobaId)
+            range_element = Building_element.search_element_by_GlobalId(proceed_elements, range_GlobaId)
+            domain_element.add_objprop(obj_prop_tag, range_element)
+
+    '''
+    State: Use
+    Function: get the obj_prop between two element from the elements and ifc file
+    '''
+
     @staticmethod
     def get_elements_objprop(proceed_elements, ifc_products):
+        relations = []
         for ifc_obj in ifc_products:
-            domain_type = ifc_obj.is_a()
-            if domain_type == 'IfcBuilding':
-                domain_GlobaId = ifc_obj.GlobalId
-                domain_element = Building_element.search_element_by_GlobalId(proceed_elements, domain_GlobaId)
-                if len(ifc_obj.IsDecomposedBy) > 0:
-                    range_objs = ifc_obj.IsDecomposedBy[0].RelatedObjects
-                    '''IfcBuilding hasBuildingSpatialElement BuildingStorey'''
-                    for range_obj in range_objs:
-                        range_name = range_obj.Name
-                        '''
-                        The ifcstorey is not the real storey in the world, judge whether it is a real floor through keyword matching method
-                        '''
-                        if '地面' in range_name or '楼面' in range_name:
-                            range_type = range_obj.is_a()
-                            range_GlobaId = range_obj.GlobalId
-                            range_element = Building_element.search_element_by_GlobalId(proceed_elements, range_GlobaId)
-                            # obj_prop_tag = Building_element.get_objprop(domain_type, range_type)
-                            # assert obj_prop_tag == 'hasBuildingSpatialElement', 'The obj_prop_tag is not True'
-                            obj_prop_tag = 'hasBuildingSpatialElement'
-                            domain_element.add_objprop(obj_prop_tag, range_element)
-
-            elif domain_type == 'IfcBuildingStorey':
-                domain_GlobaId = ifc_obj.GlobalId
-                domain_element = Building_element.search_element_by_GlobalId(proceed_elements, domain_GlobaId)
-                if len(ifc_obj.IsDecomposedBy) > 0:
-                    range_objs = ifc_obj.IsDecomposedBy[0].RelatedObjects
-                    '''IfcBuilding hasBuildingSpatialElement BuildingStorey'''
-                    for range_obj in range_objs:
-                        range_name = range_obj.Name
-                        range_type = range_obj.is_a()
-                        range_GlobaId = range_obj.GlobalId
-                        range_element = Building_element.search_element_by_GlobalId(proceed_elements, range_GlobaId)
-                        # obj_prop_tag = Building_element.get_objprop(domain_type, range_type)
-                        # assert obj_prop_tag == 'hasBuildingSpatialElement', 'The obj_prop_tag is not True'
-                        obj_prop_tag = 'hasBuildingSpatialElement'
-                        domain_element.add_objprop(obj_prop_tag, range_element)
-
-            elif domain_type == 'IfcSpace':
-                domain_GlobaId = ifc_obj.GlobalId
-                domain_element = Building_element.search_element_by_GlobalId(proceed_elements, domain_GlobaId)
-                for bounding_obj in ifc_obj.BoundedBy:
-                    range_GlobaId = bounding_obj.RelatedBuildingElement.GlobalId
-                    range_element = Building_element.search_element_by_GlobalId(proceed_elements, range_GlobaId)
-                    range_type = bounding_obj.RelatedBuildingElement.is_a()
-                    # obj_prop_tag = Building_element.get_objprop(domain_type, range_type)
-                    # assert obj_prop_tag == 'hasBuildingElement', 'The obj_prop_tag is not True'
-                    obj_prop_tag = 'hasBuildingElement'
-                    domain_element.add_objprop(obj_prop_tag, range_element)
+            for obj_prop_tag, range_GlobaId in Building_element.get_single_element_objprop(ifc_obj):
+                relations.append((ifc_obj.GlobalId, obj_prop_tag, range_GlobaId))
+        Building_element.add_elements_objprop(proceed_elements, relations)
 
     '''
     State: use
@@ -303,18 +362,178 @@ class Building_element():
             return None
 
 
-def gen_ttl_file(ifc_file='../data/ifc/Plant_ByhandV2.ifc', ttl_file='../data/ontology/Plant_instance.ttl',
-                 userdef_info={'element_type': 'IfcBuilding', 'element_id': None, 'info': ('Plant', 3, 3)}):
-    def get_allprop_from_ifc(ifcfile='./data/ifc/Plant_ByhandV3.ifc'):
-        ifc_file = ifcopenshell.open(ifcfile)
-        products = ifc_file.by_type('IfcProduct')
-        elements = []
-        for product in products:
-            elements.append(Building_element.get_single_element_prop(product, property_set_names=['消防系统', '尺寸标注']))
-        return elements
+'''
+State: Use
+Function: the proceed elements, keep the order of the ifc products (used as the number of the instance name),
+    and index them by GlobalId and by ifc type, so the lookups are O(1) instead of scanning the list
+'''
+
+
+class Element_registry():
+    def __init__(self, elements=()):
+        self.elements = []  # list of Building_element
+        self.GlobalId_index = {}  # {GlobalId: index}
+        self.type_index = {}  # {element_type: [index, ...]}
+        for element in elements:
+            self.append(element)
+
+    def append(self, element):
+        index = len(self.elements)
+        self.elements.append(element)
+        # the first one is kept if the GlobalId is duplicated, the same as the linear search
+        self.GlobalId_index.setdefault(element.element_id, index)
+        self.type_index.setdefault(element.element_type, []).append(index)
+
+    def get_by_GlobalId(self, GlobalId):
+        index = self.GlobalId_index.get(GlobalId)
+        return self.elements[index] if index is not None else None
+
+    def get_by_type(self, element_type):
+        indexes = list(self.type_index.get(element_type, []))
+        return [self.elements[i] for i in indexes], indexes
+
+    def __getitem__(self, index):
+        return self.elements[index]
+
+    def __iter__(self):
+        return iter(self.elements)
+
+    def __len__(self):
+        return len(self.elements)
+
+
+'''
+State: Use
+Function: columnar store of the data_properties of the proceed elements, every mapped data_property value is kept in
+    the order of the elements and of their data_properties (the triples of the ttl). For each dataproperty the values
+    are also kept as one array of (element index, value), typed by the dtype of the ontology dataproperty, for
+    vectorised rule check without RDF, e.g.,
+        failed = table.compare('hasFireResistanceLimits_hour', '>=', 3, element_class='Wall', pass_=False)
+        table.GlobalIds[failed]
+    The semantics are the same as SPARQL on the ttl file written by get_dataprop_ttl_lines:
+        an element given a property more than once (e.g., by the family and by the instance) has all the values, and
+            it is selected if any of them meets the comparison
+        the value is typed by its python type (xsd:boolean/int/float/string, the same as Building_element), a value
+            whose type does not fit the dtype (e.g., '3' for hasFireResistanceLimits_hour) is never compared
+'''
+
+
+class Element_table():
+    CMP_FUNCS = {'>=': np.greater_equal, '<=': np.less_equal, '>': np.greater, '<': np.less, '=': np.equal,
+                 '!=': np.not_equal}
+    XSD_TYPES = {bool: 'boolean', float: 'float', int: 'int', str: 'string'}
+    # the python types (of the ttl literals) which are compared with the dtype of the dataproperty
+    DTYPE_VALUE_TYPES = {np.bool_: (bool,), np.int64: (int, float), np.float64: (int, float), object: (str,)}
+
+    def __init__(self, proceed_elements, mapping_dict=None, dtype_dict=None):
+        mapping = Mappping_dict()
+        self.mapping_dict = mapping_dict if mapping_dict is not None else mapping.ifc_map_fireonto()
+        self.dtype_dict = dtype_dict if dtype_dict is not None else mapping.fireonto_dataprop_dtype()
+
+        self.GlobalIds = np.array([e.element_id for e in proceed_elements], dtype=object)
+        self.element_types = np.array([e.element_type for e in proceed_elements], dtype=object)
+        self.element_classes = np.array([self.mapping_dict.get(e.element_type, '') for e in proceed_elements],
+                                        dtype=object)
+        # the dataproperty triples, the ones of the i-th element are [triple_offsets[i], triple_offsets[i + 1])
+        self.triple_offsets = np.zeros(len(self.GlobalIds) + 1, dtype=np.int64)
+        self.triple_dataproperties = []
+        self.triple_objects = []  # the ttl literals, e.g., '"3.0"^^xsd:float'
+        column_lists = {}  # {dataproperty_name: ([element index, ...], [value, ...])}
+        for i, element in enumerate(proceed_elements):
+            for property_name, property_value in element.data_properties:
+                if property_name not in self.mapping_dict:
+                    continue
+                dataproperty_name = self.mapping_dict[property_name]
+                value_type = type(property_value)
+                if value_type not in Element_table.XSD_TYPES:
+                    continue
+                lexical = str(property_value).lower() if value_type is bool else str(property_value)
+                self.triple_dataproperties.append(dataproperty_name)
+                self.triple_objects.append('"' + lexical + '"^^xsd:' + Element_table.XSD_TYPES[value_type])
+                dtype = self.dtype_dict.get(dataproperty_name, object)
+                if value_type in Element_table.DTYPE_VALUE_TYPES.get(dtype, ()):
+                    indexes, values = column_lists.setdefault(dataproperty_name, ([], []))
+                    indexes.append(i)
+                    values.append(property_value)
+            self.triple_offsets[i + 1] = len(self.triple_objects)
+
+        self.columns = {}  # {dataproperty_name: (np.ndarray of element indexes, np.ndarray of values)}
+        for dataproperty_name, (indexes, values) in column_lists.items():
+            dtype = self.dtype_dict.get(dataproperty_name, object)
+            self.columns[dataproperty_name] = (np.array(indexes, dtype=np.int64),
+                                               np.array(values, dtype=np.float64 if dtype is np.int64 else dtype))
+
+    @staticmethod
+    def from_ifc(ifc_file, userdef_info=None, workers=1):
+        proceed_elements, _ = get_allprop_from_ifc(ifc_file, workers=workers)
+        if userdef_info is not None:
+            Building_element.get_single_element_prop_userinput(proceed_elements, element_info=userdef_info)
+        return Element_table(proceed_elements)
 
-    proceed_elements = get_allprop_from_ifc(ifc_file)
-    content = """@prefix : <http://www.semanticweb.org/16424/ontologies/2020/10/BuildingDesignFireCodesOntology#> .
+    @staticmethod
+    def cast(value, dtype):
+        if dtype is np.bool_:
+            if isinstance(value, str):
+                if value.strip().lower() not in ('true', 'false', '1', '0', '是', '否'):
+                    raise ValueError(f'{value} is not a boolean')
+                return value.strip().lower() in ('true', '1', '是')
+            return bool(value)
+        elif dtype is object:
+            return str(value)
+        elif dtype is np.int64 and isinstance(value, float) and not value.is_integer():
+            raise ValueError(f'{value} is not an integer')
+        return dtype(value)
+
+    def __len__(self):
+        return len(self.GlobalIds)
+
+    def column(self, dataproperty_name):
+        """return (element_indexes, values) of all the comparable values of the dataproperty, empty if none"""
+        if dataproperty_name not in self.columns:
+            dtype = self.dtype_dict.get(dataproperty_name, object)
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64 if dtype is np.int64 else dtype)
+        return self.columns[dataproperty_name]
+
+    def class_mask(self, element_class):
+        return self.element_classes == element_class
+
+    def compare(self, dataproperty_name, cmp, value, element_class=None, pass_=True):
+        """
+        :param cmp:     '>=', '<=', '>', '<', '=', '!='
+        :param pass_:   True: the elements (of element_class) which have a value meeting the requirement
+                        False: the elements (of element_class) which have a value not meeting it
+        :return:        bool mask of the elements
+        """
+        if cmp not in Element_table.CMP_FUNCS:
+            raise NotImplementedError(f'Compare operator {cmp} is not support now')
+        element_indexes, values = self.column(dataproperty_name)
+        dtype = self.dtype_dict.get(dataproperty_name, object)
+        value = float(value) if dtype in (np.int64, np.float64) else Element_table.cast(value, dtype)
+        cmp_mask = Element_table.CMP_FUNCS[cmp](values, value).astype(np.bool_)
+        mask = np.zeros(len(self), dtype=np.bool_)
+        mask[element_indexes[cmp_mask if pass_ else ~cmp_mask]] = True
+        if element_class is not None:
+            mask &= self.class_mask(element_class)
+        return mask
+
+    def get_dataprop_ttl_lines(self, index, number_item: int, prefix=':'):
+        """the same lines as Building_element.get_dataprop_ttl_lines of the index-th element"""
+        element_class = self.element_classes[index]
+        if self.element_types[index] not in self.mapping_dict or 'Todo' in element_class:
+            return []
+        subject = prefix + self.element_types[index] + str(number_item) + ' '
+        class_iri = '<http://www.semanticweb.org/16424/ontologies/2020/10/untitled-ontology-8#' + element_class + '>'
+        ttl_lines = [subject + 'rdf:type owl:NamedIndividual , ' + class_iri + ' .\n',
+                     subject + prefix + self.mapping_dict['GlobalId'] + ' "' + self.GlobalIds[index] +
+                     '"^^xsd:string .\n']
+        start, end = self.triple_offsets[index], self.triple_offsets[index + 1]
+        ttl_lines.extend(subject + prefix + dataproperty_name + ' ' + ttl_object + ' .\n'
+                         for dataproperty_name, ttl_object in zip(self.triple_dataproperties[start:end],
+                                                                  self.triple_objects[start:end]))
+        return ttl_lines
+
+
+TTL_PREFIX = """@prefix : <http://www.semanticweb.org/16424/ontologies/2020/10/BuildingDesignFireCodesOntology#> .
 @prefix owl: <http://www.w3.org/2002/07/owl#> .
 @prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .
 @prefix xml: <http://www.w3.org/XML/1998/namespace> .
@@ -327,25 +546,287 @@ def gen_ttl_file(ifc_file='../data/ifc/Plant_ByhandV2.ifc', ttl_file='../data/on
 #################################################################
 ###  http://www.semanticweb.org/16424/ontologies/2020/10/BuildingDesignFireCodesOntology#column1_test\n\n"""
 
+
+'''
+State: Use
+Function: write the ttl file element by element to a buffered file handle (gzip stream if the file ends with .gz),
+    the prefix declarations are written once, so the whole turtle document is never kept in memory
+'''
+
+
+class Ttl_writer():
+    def __init__(self, ttl_file, ttl_prefix=TTL_PREFIX, buffer_size=2 ** 20):
+        if ttl_file.endswith('.gz'):
+            self.writer = gzip.open(ttl_file, 'wt', encoding='UTF-8')
+        else:
+            self.writer = open(ttl_file, 'w', encoding='UTF-8', buffering=buffer_size)
+        self.writer.write(ttl_prefix)
+
+    def write_lines(self, ttl_lines):
+        self.writer.writelines(ttl_lines)
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+'''
+State: Use
+Function: parse the ifc file once, get data_properties and obj_properties of the products in one iteration
+    only the i_chunk-th of the n_chunk parts of the products is proceeded, used by the worker processes
+Output: elements (list of Building_element), relations (list of (domain_GlobalId, obj_property_name, range_GlobalId))
+'''
+
+
+def get_allprop_from_ifc_chunk(ifc_file, property_set_names=['消防系统', '尺寸标注'], i_chunk=0, n_chunk=1):
+    ifc_model = ifcopenshell.open(ifc_file)
+    products = ifc_model.by_type('IfcProduct')
+    chunk_size = -(-len(products) // n_chunk)  # ceil
+    elements = []
+    relations = []
+    type_pset_cache = {}
+    for product in products[i_chunk * chunk_size:(i_chunk + 1) * chunk_size]:
+        elements.append(Building_element.get_single_element_prop(product, property_set_names=property_set_names,
+                                                                 type_pset_cache=type_pset_cache))
+        for obj_prop_tag, range_GlobaId in Building_element.get_single_element_objprop(product):
+            relations.append((product.GlobalId, obj_prop_tag, range_GlobaId))
+    return elements, relations
+
+
+def _get_allprop_from_ifc_chunk(args):
+    return get_allprop_from_ifc_chunk(*args)
+
+
+'''
+State: Use
+Function: get data_properties and obj_properties of all the products
+    workers > 1: the products are partitioned across worker processes (each one opens the ifc file read-only),
+    and the element records are merged in the order of the products, the same as workers = 1
+Output: elements (Element_registry of Building_element), relations (list of (domain_GlobalId, obj_property_name, range_GlobalId))
+'''
+
+
+def get_allprop_from_ifc(ifc_file='../data/ifc/Plant_ByhandV3.ifc', property_set_names=['消防系统', '尺寸标注'],
+                         workers=1):
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            chunks = pool.map(_get_allprop_from_ifc_chunk,
+                              [(ifc_file, property_set_names, i, workers) for i in range(workers)])
+    else:
+        chunks = [get_allprop_from_ifc_chunk(ifc_file, property_set_names)]
+
+    elements = Element_registry()
+    relations = []
+    for chunk_elements, chunk_relations in chunks:
+        for element in chunk_elements:
+            elements.append(element)
+        relations.extend(chunk_relations)
+    return elements, relations
+
+
+'''
+State: Use
+Function: read the lines of a (gzipped) ttl file by line number, the file is read forward from the last position and
+    only reopened if the lines are before it, so reading the elements in the order they were written is one pass
+'''
+
+
+class Ttl_line_reader():
+    def __init__(self, ttl_file):
+        self.ttl_file = ttl_file
+        self.reader = None
+        self.line_number = 0
+
+    def read_lines(self, start, n_lines):
+        if self.reader is None or start < self.line_number:
+            self.close()
+            self.reader = gzip.open(self.ttl_file, 'rt', encoding='UTF-8') if self.ttl_file.endswith('.gz') else \
+                open(self.ttl_file, 'r', encoding='UTF-8')
+            self.line_number = 0
+        for _ in range(start - self.line_number):
+            next(self.reader)
+        lines = [next(self.reader) for _ in range(n_lines)]
+        self.line_number = start + n_lines
+        return lines
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+'''
+State: Use
+Function: write the ttl file of all the elements (the data properties are rendered by Element_table), the instance
+    names are numbered by the order of proceed_elements.
+    The index of write_ttl_incremental is removed as it does not describe the new ttl file
+'''
+
+
+def write_ttl(proceed_elements, ttl_file, mapping_dict, prefix=':'):
+    table = Element_table(proceed_elements, mapping_dict=mapping_dict)
+    with Ttl_writer(ttl_file) as ttl:
+        for index, element in enumerate(proceed_elements):
+            # element.instance_name is used for object property generation
+            element.instance_name = element.element_type + str(index)
+            ttl.write_lines(table.get_dataprop_ttl_lines(index, index, prefix=prefix))
+
+        # get objpropery ttl file
+        for element in proceed_elements:
+            ttl.write_lines(element.get_objprop_ttl_lines())
+    if os.path.exists(ttl_file + '.index.json'):
+        os.remove(ttl_file + '.index.json')
+
+
+def _ttl_stamp(ttl_file):
+    stat = os.stat(ttl_file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+'''
+State: Use
+Function: incremental version of the ttl writing, the elements are compared with the sidecar index of the last run
+    (ttl_file + '.index.json', {'ttl': {size, mtime_ns}, 'elements': {GlobalId: {hash, number, lines: [start, n],
+    objprop_lines: [start, n]}}}, the line ranges of the element in the ttl file) by the hash of their type,
+    data_properties and obj_properties, only the changed or new elements are rendered, the lines of the others are
+    copied from the last ttl file. The index is only used if the size and mtime of the ttl file are the ones recorded
+    after the last incremental run, otherwise (e.g., the ttl is written by write_ttl) all the elements are rendered.
+    The instance name of an existing element is kept (the first run numbers the elements as write_ttl, new elements
+    get new numbers, the duplicates of a GlobalId are indexed as 'GlobalId#k'), and the changes are also written
+    to a SPARQL Update delta file (ttl_file + '.delta.ru') which can be applied to the triple store of the last version
+    Note: the properties of all the products are still extracted from the ifc file (get_allprop_from_ifc) for the hashes
+Output: (n_new, n_changed, n_deleted, n_unchanged)
+'''
+
+
+def write_ttl_incremental(proceed_elements, ttl_file, mapping_dict, prefix=':'):
+    index_file = ttl_file + '.index.json'
+    old_index = {}
+    if os.path.exists(index_file) and os.path.exists(ttl_file):
+        with open(index_file, 'r', encoding='UTF-8') as f:
+            index = json.load(f)
+        if index.get('ttl') == _ttl_stamp(ttl_file):
+            old_index = index['elements']
+
+    # stable instance names, the numbers are the indexes of the products (the same as write_ttl) if there is no
+    # index of the last run, the k-th duplicate of a GlobalId is indexed by 'GlobalId#k'
+    next_number = max([item['number'] for item in old_index.values()], default=-1) + 1
+    keys, numbers, old_items = [], [], []  # old_items: the index item of the last run, None for new elements
+    n_seen = {}
+    for index, element in enumerate(proceed_elements):
+        n_seen[element.element_id] = n_seen.get(element.element_id, -1) + 1
+        key = element.element_id + (f'#{n_seen[element.element_id]}' if n_seen[element.element_id] else '')
+        if key in old_index:
+            number = old_index[key]['number']
+        elif old_index:
+            number = next_number
+            next_number += 1
+        else:
+            number = index
+        keys.append(key)
+        numbers.append(number)
+        old_items.append(old_index.get(key))
+        element.instance_name = element.element_type + str(number)
+
+    hashes = [hashlib.sha1(repr((element.element_type, number, element.element_name, element.data_properties,
+                                 [(p, r.instance_name) for p, r in element.obj_properties])).encode('utf8')).hexdigest()
+              for element, number in zip(proceed_elements, numbers)]
+    is_unchanged = [old_item is not None and old_item['hash'] == element_hash
+                    for old_item, element_hash in zip(old_items, hashes)]
+
+    new_index = {}
+    insert_lines, delete_lines = [], []
+    # the new ttl file is written next to the old one, which is read for the unchanged lines and the delta
+    tmp_file = os.path.join(os.path.dirname(ttl_file), '.tmp.' + os.path.basename(ttl_file))
+    line_number = TTL_PREFIX.count('\n')
+    with Ttl_writer(tmp_file) as ttl, Ttl_line_reader(ttl_file) as old_ttl:
+        for lines_key, get_lines in (('lines', lambda e, n: e.get_dataprop_ttl_lines(mapping_dict, n, prefix=prefix)),
+                                     ('objprop_lines', lambda e, n: e.get_objprop_ttl_lines())):
+            for element, key, number, element_hash, old_item, unchanged in zip(proceed_elements, keys, numbers, hashes,
+                                                                                old_items, is_unchanged):
+                if unchanged:
+                    lines = old_ttl.read_lines(*old_item[lines_key])
+                else:
+                    lines = get_lines(element, number)
+                    old_lines = old_ttl.read_lines(*old_item[lines_key]) if old_item is not None else []
+                    delete_lines.extend(line for line in old_lines if line not in lines)
+                    insert_lines.extend(line for line in lines if line not in old_lines)
+                ttl.write_lines(lines)
+                new_index.setdefault(key, {'hash': element_hash, 'number': number})[lines_key] = [line_number,
+                                                                                                  len(lines)]
+                line_number += len(lines)
+
+        deleted_keys = [key for key in old_index if key not in new_index]
+        for lines_key in ('lines', 'objprop_lines'):
+            for start, n_lines in sorted(old_index[key][lines_key] for key in deleted_keys):
+                delete_lines.extend(old_ttl.read_lines(start, n_lines))
+    os.replace(tmp_file, ttl_file)
+    with open(index_file, 'w', encoding='UTF-8') as f:
+        json.dump({'ttl': _ttl_stamp(ttl_file), 'elements': new_index}, f)
+
+    if old_index:
+        sparql_prefix = ''.join(f'PREFIX {name} {iri}\n' for name, iri in re.findall(r'@prefix (\S*) (<[^>]*>) \.', TTL_PREFIX))
+        with open(ttl_file + '.delta.ru', 'w', encoding='UTF-8') as f:
+            f.write(sparql_prefix)
+            if delete_lines:
+                f.write('DELETE DATA {\n')
+                f.writelines(delete_lines)
+                f.write('} ;\n')
+            f.write('INSERT DATA {\n')
+            f.writelines(insert_lines)
+            f.write('}\n')
+
+    n_unchanged = sum(is_unchanged)
+    n_new = sum(old_item is None for old_item in old_items)
+    return n_new, len(proceed_elements) - n_new - n_unchanged, len(deleted_keys), n_unchanged
+
+
+def gen_ttl_file(ifc_file='../data/ifc/Plant_ByhandV2.ifc', ttl_file='../data/ontology/Plant_instance.ttl',
+                 userdef_info={'element_type': 'IfcBuilding', 'element_id': None, 'info': ('Plant', 3, 3)},
+                 report=False, workers=1, incremental=False):
+    """
+    :param report:      print wall time and peak (python) memory of the conversion
+    :param workers:     number of processes for the property extraction, see get_allprop_from_ifc
+    :param incremental: only render the elements changed since the last run, see write_ttl_incremental
+    """
+    if report:
+        start_time = time.time()
+        tracemalloc.start()
+
+    proceed_elements, relations = get_allprop_from_ifc(ifc_file, workers=workers)
     my_prefix_short = ':'
     # get user define dataproperty
     Building_element.get_single_element_prop_userinput(proceed_elements, element_info=userdef_info)
 
     ifc_map_fireonto_dict = Mappping_dict().ifc_map_fireonto()
-    for index, element in enumerate(proceed_elements):
-        element_ttl_content = element.write_dataprop_ttl(ifc_map_fireonto_dict, index, prefix=my_prefix_short)
-        content += element_ttl_content
+    Building_element.add_elements_objprop(proceed_elements, relations)
+    if incremental:
+        n_new, n_changed, n_deleted, n_unchanged = write_ttl_incremental(proceed_elements, ttl_file,
+                                                                         ifc_map_fireonto_dict, prefix=my_prefix_short)
+        print(f'{ttl_file}: {n_new} new, {n_changed} changed, {n_deleted} deleted, {n_unchanged} unchanged elements')
+    else:
+        write_ttl(proceed_elements, ttl_file, ifc_map_fireonto_dict, prefix=my_prefix_short)
 
-    # get objpropery ttl file
-    ifc_file = ifcopenshell.open(ifc_file)
-    ifc_products = ifc_file.by_type('IfcProduct')
-    Building_element.get_elements_objprop(proceed_elements, ifc_products)
-    for element in proceed_elements:
-        content += element.write_objprop_ttl()
-    with open(ttl_file, 'w', encoding='UTF-8') as ttl:
-        ttl.write(content)
+    if report:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{ifc_file}: {len(proceed_elements)} products, {len(relations)} relations, '
+              f'time: {time.time() - start_time:.2f} s, peak memory: {peak / 2 ** 20:.1f} MB')
 
 
 if __name__ == "__main__":
     gen_ttl_file(ifc_file='../data/ifc/Plant_ByhandV5.ifc', ttl_file='../data/ontology/Plant_instanceV2.ttl')
+    # for ifc in ['../data/ifc/Plant_Byhand.ifc', '../data/ifc/Plant_ByhandV3.ifc']:
+    #     gen_ttl_file(ifc_file=ifc, ttl_file='../data/ontology/Plant_instance_tmp.ttl', report=True)
     print('ok')
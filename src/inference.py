@@ -1,27 +1,175 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
-from train import *
+import os
+import sys
+import argparse
+import json
+import time
+import subprocess
+import platform
+import numpy as np
+import torch
+from datetime import datetime
+from torch.utils import data
+from dataset import get_test_data_loader, BucketBatchSampler, collate_trim_pad
+from model import BertZhTokenClassifier_
+from train import log, log_predictions, clear_prediction_logs, get_arg_parser, get_args
+from utils import load_state_dict_file, get_elapsed_time
 
 
 def test():
     model.eval()
+    sorted_batches = []  # --bucket: (indexes, inputs, predictions) of the batches sorted by length
     with torch.no_grad():
         # data_loader = tqdm(test_data_loader) if show_progressbar else test_data_loader
-        for inputs, att_mask in test_data_loader:
+        for batch in test_data_loader:
             # inputs: token_ids, labels: tag_ids
+            indexes, (inputs, att_mask) = (batch[0], batch[1:]) if args.bucket else (None, batch)
             inputs, att_mask = inputs.to(device), att_mask.to(device)
 
             outputs = model(inputs, att_mask)  # shape: [bs, sql, n_tags]
             outputs = outputs.view(-1, outputs.shape[-1])  # [bs*sql, n_tags]
             _, predictions = torch.max(outputs, 1)  # return (value, index)
 
-            log_predictions(inputs, None, predictions, 'test', is_test=True, corpus_=corpus)
+            if indexes is None:
+                log_predictions(inputs, None, predictions, 'test', is_test=True, corpus_=corpus)
+            else:
+                sorted_batches.append((indexes, inputs.cpu(), predictions.view(inputs.shape[0], -1).cpu()))
+
+    if sorted_batches:
+        # pad the trimmed batches with [PAD] (id 0) and log them in the order of the test data
+        sql_ = max(inputs.shape[1] for _, inputs, _ in sorted_batches)
+        order = torch.argsort(torch.cat([indexes for indexes, _, _ in sorted_batches]))
+        inputs = torch.cat([torch.nn.functional.pad(x, (0, sql_ - x.shape[1])) for _, x, _ in sorted_batches])[order]
+        predictions = torch.cat([torch.nn.functional.pad(p, (0, sql_ - p.shape[1])) for _, _, p in sorted_batches])
+        predictions = predictions[order]
+        for k in range(0, len(order), batch_size):
+            log_predictions(inputs[k:k + batch_size], None, predictions[k:k + batch_size].reshape(-1), 'test',
+                            is_test=True, corpus_=corpus)
+
+
+def load_model(backend='torch', backend_path=''):
+    """
+    torch: BertZhTokenClassifier_ with the state dict (default: ./models/_BertZh0_best.pth or .safetensors)
+    jit:   TorchScript model by export.py (default: ./models/_BertZh0_best.int8.pt), runs on CPU
+    onnx:  ONNX model by export.py (default: ./models/_BertZh0_best.onnx), runs by onnxruntime on CPU
+    """
+    if backend == 'jit':
+        from export import load_jit_model
+        return load_jit_model(backend_path if backend_path else './models/_BertZh0_best.int8.pt')
+    if backend == 'onnx':
+        from export import OnnxTokenClassifier
+        return OnnxTokenClassifier(backend_path if backend_path else './models/_BertZh0_best.onnx')
+
+    model_ = BertZhTokenClassifier_(n_label, p_drop=0.1)
+    model_.to(device)
+    # .pth or .safetensors (train.py --safetensors), the other one is tried if the file does not exist
+    model_.load_state_dict(load_state_dict_file(backend_path if backend_path else './models/_BertZh0_best.pth',
+                                                device))
+    return model_
+
+
+def benchmark(model_, device_, dataset, batch_sizes=(1, 8, 16, 32, 64), threads_list=(1, 2, 4),
+              bucket_sizes=(0, 1, 10, 50), seed=2020):
+    """
+    Sweep batch size, cpu (intra-op) threads and bucket size (num of batches sorted by length together, 0: padded to
+    max_sql, 1: padded to the longest one of each batch only) over the dataset with model_ on device_.
+    inter-op threads can only be set once in a process, see benchmark_interop()
+    :return: list of dict {batch_size, threads, interop_threads, bucket_size, seq_per_s, p50_ms, p99_ms},
+             sorted by seq_per_s
+    """
+    model_.eval()
+    results = []
+    for n_threads in threads_list:
+        torch.set_num_threads(n_threads)
+        for bs in batch_sizes:
+            for bucket_size in bucket_sizes:
+                np.random.seed(seed)
+                if bucket_size:
+                    sampler = BucketBatchSampler(dataset.lengths(), bs, shuffle=True, bucket_size=bs * bucket_size)
+                    loader = data.DataLoader(dataset=dataset, batch_sampler=sampler, collate_fn=collate_trim_pad)
+                else:
+                    loader = data.DataLoader(dataset=dataset, batch_size=bs, shuffle=False)
+
+                latencies = []
+                with torch.no_grad():
+                    model_(*[t.to(device_) for t in next(iter(loader))[:2]])  # warm up
+                    for batch in loader:
+                        inputs, att_mask = batch[0].to(device_), batch[1].to(device_)
+                        batch_start_time = time.time()
+                        torch.argmax(model_(inputs, att_mask), dim=-1).cpu()
+                        latencies.append(time.time() - batch_start_time)
+
+                result = {'batch_size': bs, 'threads': n_threads, 'interop_threads': torch.get_num_interop_threads(),
+                          'bucket_size': bucket_size,
+                          'seq_per_s': len(dataset) / sum(latencies),
+                          'p50_ms': float(np.percentile(latencies, 50)) * 1000,
+                          'p99_ms': float(np.percentile(latencies, 99)) * 1000}
+                log('bs={batch_size:3d}, threads={threads:2d}, interop={interop_threads:2d}, bucket={bucket_size:3d}: '
+                    '{seq_per_s:8.1f} seq/s, p50={p50_ms:8.1f} ms, p99={p99_ms:8.1f} ms'.format(**result))
+                results.append(result)
+
+    results.sort(key=lambda r: -r['seq_per_s'])
+    return results
+
+
+def benchmark_interop(interop_threads_list, results_path='./models/inference_bench.tmp.json'):
+    """
+    Run the benchmark (the args of this process) in a subprocess for each inter-op threads
+    (torch.set_num_interop_threads can only be called once, before any inter-op parallel work)
+    :return: all the results, sorted by seq_per_s
+    """
+    results = []
+    for n_interop in interop_threads_list:
+        cmd = [sys.executable, os.path.abspath(__file__)] + sys.argv[1:] + \
+              ['--bench_interop_worker', str(n_interop), '--bench_results', results_path]
+        subprocess.run(cmd, check=True)
+        with open(results_path, 'r') as fp:
+            results.extend(json.load(fp))
+        os.remove(results_path)
+
+    results.sort(key=lambda r: -r['seq_per_s'])
+    return results
+
+
+def save_inference_config(result, device_, path='./models/inference_config.json', backend='torch', backend_path=''):
+    """ the best configuration of benchmark, read by labelservice.py """
+    config = {**result, 'backend': backend, 'backend_path': backend_path, 'device': str(device_),
+              'platform': platform.platform(), 'time': datetime.now().isoformat()}
+    with open(path, 'w') as fp:
+        json.dump(config, fp, indent=4)
+    log(f'Save the best inference config to {path}: {config}')
+
+
+def get_inference_args():
+    parser = get_arg_parser()
+    parser.add_argument('--backend', type=str, default='torch', choices=['torch', 'jit', 'onnx'],
+                        help='inference backend')
+    parser.add_argument('--backend_path', type=str, default='', help='model file of the backend')
+    parser.add_argument('--benchmark', action='store_true', help='sweep batch size, threads and bucket size, and exit')
+    parser.add_argument('--bench_batch_sizes', type=str, default='1,8,16,32,64')
+    parser.add_argument('--bench_threads', type=str, default='', help='default: 1,2,4,... up to cpu count')
+    parser.add_argument('--bench_buckets', type=str, default='0,1,10,50', help='bucket size in batches')
+    parser.add_argument('--bench_interop', type=str, default='',
+                        help='inter-op threads, e.g., 1,2,4 (a subprocess each), default: torch default only')
+    parser.add_argument('--bench_out', type=str, default='./models/inference_config.json')
+    parser.add_argument('--bench_interop_worker', type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument('--bench_results', type=str, default='', help=argparse.SUPPRESS)
+    return get_args(parser)
 
 
 if __name__ == '__main__':
-    args = get_args()
+    args = get_inference_args()
+    if args.bench_interop_worker:  # before any parallel work
+        torch.set_num_interop_threads(args.bench_interop_worker)
     device = torch.device('cpu' if ('Windows' in platform.platform() or 'macOS' in platform.platform()) else 'cuda')
+    if args.backend != 'torch':
+        device = torch.device('cpu')
+    if args.benchmark and args.bench_interop and not args.bench_interop_worker:
+        bench_results = benchmark_interop([int(x) for x in args.bench_interop.split(',')])
+        save_inference_config(bench_results[0], device, args.bench_out, args.backend, args.backend_path)
+        exit()
     batch_size = args.batch_size
     sql = args.sql
     n_label = 15
@@ -29,14 +177,25 @@ if __name__ == '__main__':
     show_progressbar = False
     log(f'\n-[{datetime.now().isoformat()}]==================== \n-Args {str(args)[9:]}')
 
-    test_data_loader, corpus = get_test_data_loader(r'../data/xiaofang', batch_size, sql)
+    test_data_loader, corpus = get_test_data_loader(r'../data/xiaofang', batch_size, sql, bucket=args.bucket)
+
+    model = load_model(args.backend, args.backend_path)
 
-    model: nn.Module
-    model = BertZhTokenClassifier_(n_label, p_drop=0.1)
-    model.to(device)
-    model.load_state_dict(torch.load('./models/_BertZh0_best.pth'))
+    if args.benchmark:
+        log(f'===== Benchmark ({args.backend}, {len(corpus.test_dataset)} sentences) =====')
+        _threads = [2 ** k for k in range(int(np.log2(os.cpu_count() or 1)) + 1)]
+        bench_results = benchmark(model, device, corpus.test_dataset,
+                                  [int(x) for x in args.bench_batch_sizes.split(',')],
+                                  [int(x) for x in args.bench_threads.split(',')] if args.bench_threads else _threads,
+                                  [int(x) for x in args.bench_buckets.split(',')])
+        if args.bench_interop_worker:  # results to benchmark_interop()
+            with open(args.bench_results, 'w') as fp:
+                json.dump(bench_results, fp)
+        else:
+            save_inference_config(bench_results[0], device, args.bench_out, args.backend, args.backend_path)
+        exit()
 
-    log(f'===== Inference =====')
+    log(f'===== Inference ({args.backend}) =====')
     start_time = time.time()
     clear_prediction_logs(is_test=True)
 
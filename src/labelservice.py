@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import torch
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from data import label_bio_to_iit, get_full_label_iit, label_wt_to_slabel
+from model import BertZhTokenClassifier_
+from utils import load_state_dict_file
+
+
+class MicroBatcher(threading.Thread):
+    def __init__(self, predict_fn, batch_size=32, max_latency=0.01, bucket_size=1, sort_key=len):
+        """Collect the submitted items into batches for predict_fn(list) -> list.
+        A batch is run when it is full, or max_latency (seconds) after its first item arrived.
+        bucket_size > 1: collect up to bucket_size batches, sort the items by sort_key (length) and cut them into
+        batches, like BucketBatchSampler"""
+        super().__init__(daemon=True)
+        self.predict_fn = predict_fn
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.bucket_size = max(bucket_size, 1)
+        self.sort_key = sort_key
+        self.queue = queue.Queue()
+
+    def submit(self, item):
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def stop(self):
+        self.queue.put(None)
+
+    def run(self):
+        while True:
+            first = self.queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.time() + self.max_latency
+            while len(batch) < self.batch_size * self.bucket_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    x = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if x is None:
+                    self.queue.put(None)  # stop after this batch
+                    break
+                batch.append(x)
+
+            if self.bucket_size > 1:
+                batch.sort(key=lambda x: self.sort_key(x[0]))
+            for k in range(0, len(batch), self.batch_size):
+                self.run_batch(batch[k:k + self.batch_size])
+
+    def run_batch(self, batch):
+        items, futures = zip(*batch)
+        try:
+            results = self.predict_fn(list(items))
+            for future, result in zip(futures, results):
+                future.set_result(result)
+        except Exception as ex:
+            for future in futures:
+                future.set_exception(ex)
+
+
+class LabelService:
+    def __init__(self, model_path='./models/_BertZh0_best.pth', data_dir='../data/xiaofang', max_sql=125,
+                 device=None, batch_size=32, max_latency=0.01, bert_name='./models/bert-base-chinese', backend='torch',
+                 backend_path='', bucket_size=1):
+        """Load the tokenizer and the model once, and label the sentences by dynamic micro-batches
+        bert_name: the bert model (torch backend) and its tokenizer (vocab.txt)
+        backend, backend_path: see inference.load_model (jit/onnx run on CPU)
+        bucket_size: 0: pad to max_sql, 1: pad to the longest one of each batch, >1: see MicroBatcher"""
+        from transformers import BertTokenizer
+
+        self.max_sql = max_sql
+        self.pad_to_max = bucket_size == 0
+        self.device = torch.device(device if device else ('cuda' if torch.cuda.is_available() else 'cpu'))
+        if backend != 'torch':
+            self.device = torch.device('cpu')
+        self.tokenizer = BertTokenizer.from_pretrained(bert_name, do_lower_case=False)
+        self.cls_id, self.sep_id, self.pad_id = self.tokenizer.convert_tokens_to_ids(['[CLS]', '[SEP]', '[PAD]'])
+
+        with open(os.path.join(data_dir, 'tags.txt'), 'r') as file:
+            self.tags = [tag.strip() for tag in file if tag.strip()]
+
+        if backend == 'jit':
+            from export import load_jit_model
+            self.model = load_jit_model(backend_path if backend_path else './models/_BertZh0_best.int8.pt')
+        elif backend == 'onnx':
+            from export import OnnxTokenClassifier
+            self.model = OnnxTokenClassifier(backend_path if backend_path else './models/_BertZh0_best.onnx')
+        else:
+            self.model = BertZhTokenClassifier_(len(self.tags), p_drop=0.1, bert_name=bert_name)
+            self.model.load_state_dict(load_state_dict_file(model_path, self.device))  # .pth or .safetensors
+            self.model.to(self.device)
+        self.model.eval()
+
+        self.batcher = MicroBatcher(self.predict_batch, batch_size, max_latency, bucket_size)
+        self.batcher.start()
+
+    def align_tokens(self, text, tokens):
+        """ get the words of the text for each token, e.g., '[UNK]' -> the raw (basic tokenized) word, '##mm' -> 'mm'
+        tokens: self.tokenizer.tokenize(text) (may be truncated), i.e., wordpieces of the basic tokenized words """
+        tokenizer = self.tokenizer
+        words, k = [], 0
+        for word in tokenizer.basic_tokenizer.tokenize(text, never_split=tokenizer.all_special_tokens):
+            i = text.find(word, k)
+            k = i if i >= 0 else k  # not found: normalized by the tokenizer, e.g., control chars are removed
+            for piece in tokenizer.wordpiece_tokenizer.tokenize(word):
+                if len(words) == len(tokens):
+                    return words
+                n = len(word) if piece == '[UNK]' else len(piece[2:] if piece.startswith('##') else piece)
+                words.append(text[k:k + n])
+                k += n
+        return words
+
+    def predict_batch(self, texts):
+        """
+        :param texts: list of str
+        :return: list of dict {text, tokens, tags (BIO), label (iit), slabel}
+        """
+        texts = [t.replace(' ', '').strip() for t in texts]
+        tokenss = [self.tokenizer.tokenize(t)[:self.max_sql - 2] for t in texts]
+        sql = self.max_sql if self.pad_to_max else max(len(tokens) for tokens in tokenss) + 2  # the longest one
+        token_ids = torch.full((len(texts), sql), self.pad_id, dtype=torch.long)
+        att_mask = torch.zeros((len(texts), sql), dtype=torch.float)
+        for i, tokens in enumerate(tokenss):
+            ids = [self.cls_id] + self.tokenizer.convert_tokens_to_ids(tokens) + [self.sep_id]
+            token_ids[i, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            att_mask[i, :len(ids)] = 1
+
+        with torch.no_grad():
+            outputs = self.model(token_ids.to(self.device), att_mask.to(self.device))  # [bs, sql, n_tags]
+            preds = torch.argmax(outputs, dim=-1).cpu().numpy()
+
+        results = []
+        for text, tokens, pred in zip(texts, tokenss, preds):
+            tags = [self.tags[p] for p in pred[1:1 + len(tokens)]]
+            label_iit = label_bio_to_iit(tags, tokens)
+            words = self.align_tokens(text, tokens)
+            if label_iit:
+                slabel = label_wt_to_slabel([(''.join(words[i:j]), t) for i, j, t in get_full_label_iit(label_iit, words)])
+            else:
+                slabel = ''.join(words)
+            results.append({'text': text, 'tokens': tokens, 'tags': tags, 'label': label_iit, 'slabel': slabel})
+        return results
+
+    def label_async(self, text):
+        return self.batcher.submit(text)
+
+    def label(self, text, timeout=None):
+        return self.label_async(text).result(timeout)
+
+    def close(self):
+        self.batcher.stop()
+
+
+def check_text(text):
+    """ check a text to label before it is batched (an invalid one would fail the whole batch) """
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError(f'"text" should be a non-empty str, got: {json.dumps(text, ensure_ascii=False)}')
+    return text
+
+
+def serve_stdin(service: LabelService, fin=sys.stdin, fout=sys.stdout):
+    """ jsonl: {"text": "..."} (other keys are returned as they are) or a plain sentence per line
+    an invalid line gets {"error": "..."} (with its keys if it is a json object) """
+    futures = queue.Queue()
+
+    def write_results():
+        while True:
+            x = futures.get()
+            if x is None:
+                break
+            request, future = x
+            try:
+                result = {**request, **future.result()}
+            except Exception as ex:
+                result = {**request, 'error': str(ex)}
+            fout.write(json.dumps(result, ensure_ascii=False) + '\n')
+            fout.flush()
+
+    writer = threading.Thread(target=write_results, daemon=True)
+    writer.start()
+    for line in fin:
+        if not line.strip():
+            continue
+        request = {}
+        try:
+            request = json.loads(line) if line.lstrip().startswith('{') else {'text': line.strip()}
+            if not isinstance(request, dict):
+                request = {}
+                raise ValueError('a json object {"text": "..."} is required')
+            future = service.label_async(check_text(request.get('text')))
+        except ValueError as ex:  # incl. json.JSONDecodeError
+            future = Future()
+            future.set_exception(ex)
+        futures.put((request, future))
+    futures.put(None)
+    writer.join()
+
+
+def serve_http(service: LabelService, host='127.0.0.1', port=8080):
+    """ POST / with json {"text": "..."} or {"texts": ["...", ...]} """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if 'texts' in request:
+                    futures = [service.label_async(check_text(t)) for t in request['texts']]
+                    response = {'results': [f.result() for f in futures]}
+                else:
+                    response = service.label(check_text(request['text']))
+                code = 200
+            except Exception as ex:
+                response, code = {'error': str(ex)}, 400
+
+            body = json.dumps(response, ensure_ascii=False).encode('utf8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f'Label service on http://{host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+def get_args():
+    parser = argparse.ArgumentParser('Label Service')
+    parser.add_argument('--model', type=str, default='./models/_BertZh0_best.pth', help='state dict of the model')
+    parser.add_argument('--data_dir', type=str, default='../data/xiaofang', help='dir of tags.txt')
+    parser.add_argument('--device', type=str, default=None, help='cpu/cuda/cuda:0, default: cuda if available')
+    parser.add_argument('--config', type=str, default='./models/inference_config.json',
+                        help='best config by inference.py --benchmark, used for the args not given')
+    parser.add_argument('--backend', type=str, default=None, choices=['torch', 'jit', 'onnx'],
+                        help='default: torch')
+    parser.add_argument('--backend_path', type=str, default=None, help='model file of jit/onnx backend')
+    parser.add_argument('--batch_size', type=int, default=None, help='max batch size, default: 32')
+    parser.add_argument('--bucket_size', type=int, default=None,
+                        help='0: pad to sql, 1: pad to the longest one of each batch (default), n: sort n batches')
+    parser.add_argument('--threads', type=int, default=None, help='torch cpu (intra-op) threads')
+    parser.add_argument('--interop_threads', type=int, default=None, help='torch inter-op threads')
+    parser.add_argument('--max_latency', type=float, default=10, help='max waiting time (ms) to fill a batch')
+    parser.add_argument('--sql', type=int, default=125, help='max sequence length')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0, help='http port, 0 to use stdin/stdout jsonl')
+    args_ = parser.parse_args()
+
+    config = {}
+    if args_.config and os.path.exists(args_.config):
+        with open(args_.config, 'r') as fp:
+            config = json.load(fp)
+    defaults = {'backend': 'torch', 'backend_path': '', 'batch_size': 32, 'bucket_size': 1, 'threads': None,
+                'interop_threads': None}
+    for k, default in defaults.items():
+        if getattr(args_, k) is None:
+            setattr(args_, k, config.get(k, default))
+    return args_
+
+
+if __name__ == '__main__':
+    args = get_args()
+    if args.interop_threads:
+        torch.set_num_interop_threads(args.interop_threads)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    label_service = LabelService(args.model, args.data_dir, args.sql, args.device, args.batch_size,
+                                 args.max_latency / 1000, backend=args.backend, backend_path=args.backend_path,
+                                 bucket_size=args.bucket_size)
+    if args.port:
+        serve_http(label_service, args.host, args.port)
+    else:
+        serve_stdin(label_service)
+    label_service.close()
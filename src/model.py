@@ -1,14 +1,16 @@
 #!/usr/bin/env python3
 #coding=utf-8
 
+import functools
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from transformers import BertModel
 
 
 class BertZhTokenClassifier_(nn.Module):
     def __init__(self, n_labels, p_drop=0.1, bert_name='./models/bert-base-chinese'):
+        from transformers import BertModel
+
         super().__init__()
         self.n_labels = n_labels
 
@@ -17,6 +19,25 @@ class BertZhTokenClassifier_(nn.Module):
         in_features = 1024 if 'large' in bert_name else 768
         self.classifier = nn.Linear(in_features, self.n_labels)  # bert-base's hidden size=768/1024
 
+    def enable_grad_checkpoint(self):
+        """recompute the activations of each bert encoder layer in backward, instead of keeping them (less memory,
+        ~30% more compute). the state dict is not changed"""
+        if hasattr(self.bert, 'gradient_checkpointing_enable'):  # transformers>=4.11
+            self.bert.gradient_checkpointing_enable()
+            return
+
+        from torch.utils.checkpoint import checkpoint
+
+        def checkpoint_forward(layer_forward):
+            def forward(*args, **kwargs):
+                if self.training and torch.is_grad_enabled():
+                    return checkpoint(functools.partial(layer_forward, **kwargs), *args)
+                return layer_forward(*args, **kwargs)
+            return forward
+
+        for layer in self.bert.encoder.layer:
+            layer.forward = checkpoint_forward(layer.forward)
+
     def forward(self, inputs, att_mask):
         x, _ = self.bert(inputs, attention_mask=att_mask)
         x = self.dropout(x)
@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import re
+import time
+import argparse
+from collections import OrderedDict
+from utils import *
+
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+OWL_NAMED_INDIVIDUAL = 'http://www.w3.org/2002/07/owl#NamedIndividual'
+DEFAULT_PREFIXES = {'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+                    'rdfs': 'http://www.w3.org/2000/01/rdf-schema#',
+                    'owl': 'http://www.w3.org/2002/07/owl#',
+                    'xsd': 'http://www.w3.org/2001/XMLSchema#'}
+CMP_OPS = ('>=', '<=', '!=', '=', '>', '<')
+
+# <iri> | "literal"^^type | 'literal'^^type | # comment | , ; | other term
+_TOKEN_PATTERN = re.compile(r'<[^>]*>|"(?:[^"\\]|\\.)*"(?:\^\^[^\s,;]+|@[A-Za-z-]+)?|'
+                            r"'(?:[^'\\]|\\.)*'(?:\^\^[^\s,;]+|@[A-Za-z-]+)?|#[^\n]*|[,;]|[^\s,;]+")
+_LITERAL_PATTERN = re.compile(r'''(["'])((?:(?!\1)[^\\]|\\.)*)\1(?:\^\^(\S+)|@\S+)?''', re.S)
+
+
+class Iri(str):
+    """IRI term, keep it apart from string literals"""
+
+    def __repr__(self):
+        return f'<{self}>'
+
+
+def tokenize(txt):
+    tokens = []
+    for t in _TOKEN_PATTERN.findall(txt):
+        if t[0] == '#':
+            continue
+        if len(t) > 1 and t[-1] == '.' and t[0] not in '<"\'':  # ':IfcWall1.' -> ':IfcWall1', '.'
+            tokens.extend([t[:-1], '.'])
+        else:
+            tokens.append(t)
+    return tokens
+
+
+def to_literal_value(lexical, datatype=None):
+    dt = datatype.rsplit('#', 1)[-1] if datatype else 'string'
+    if dt in ('int', 'integer', 'long', 'short', 'byte', 'nonNegativeInteger', 'positiveInteger'):
+        return int(lexical)
+    if dt in ('float', 'double', 'decimal'):
+        return float(lexical)
+    if dt == 'boolean':
+        return lexical.strip().lower() in ('true', '1')
+    return lexical
+
+
+def to_term(token, prefixes):
+    """ turtle/sparql token -> Iri, python value (literal) or str starting with '?' (sparql variable) """
+    if token[0] == '<':
+        return Iri(token[1:-1])
+    if token[0] in '"\'':
+        m = _LITERAL_PATTERN.fullmatch(token)
+        datatype = to_term(m.group(3), prefixes) if m.group(3) else None
+        return to_literal_value(m.group(2), datatype)
+    if token[0] in '?$':
+        return '?' + token[1:]
+    if token == 'a':
+        return Iri(RDF_TYPE)
+    if token in ('true', 'false'):
+        return token == 'true'
+    if re.fullmatch(r'[+-]?\d+', token):
+        return int(token)
+    if re.fullmatch(r'[+-]?\d*\.\d+([eE][+-]?\d+)?', token):
+        return float(token)
+
+    prefix, sep, local = token.partition(':')
+    assert sep and prefix in prefixes, f'Unknown prefix in term: {token}'
+    return Iri(prefixes[prefix] + local)
+
+
+def is_var(term):
+    return isinstance(term, str) and not isinstance(term, Iri) and term.startswith('?')
+
+
+def _term_kind(x):
+    if x is None:
+        return None
+    if isinstance(x, Iri):
+        return 'iri'
+    if isinstance(x, bool):
+        return 'bool'
+    if isinstance(x, (int, float)):
+        return 'num'
+    return 'str'
+
+
+def compare(a, op, b):
+    """ SPARQL-like comparison, return None (error, i.e., unbound) for mismatched types """
+    ka, kb = _term_kind(a), _term_kind(b)
+    if ka is None or ka != kb:
+        return None
+    if ka == 'iri' and op not in ('=', '!='):
+        return None
+
+    if op == '=':
+        return a == b
+    elif op == '!=':
+        return a != b
+    elif op == '>=':
+        return a >= b
+    elif op == '<=':
+        return a <= b
+    elif op == '>':
+        return a > b
+    elif op == '<':
+        return a < b
+    raise NotImplementedError(f'Compare operator {op} is not support now')
+
+
+def local_name(term):
+    if isinstance(term, Iri):
+        return term[max(term.rfind('#'), term.rfind('/')) + 1:]
+    return term
+
+
+class TripleIndex:
+    """Instance graph (e.g., Plant_instance.ttl by ifc2ttl.gen_ttl_file) indexed by type and by predicate.
+    Only the turtle subset used in this repo is supported: @prefix, (s p o [, o]* [; p o]*) ."""
+
+    def __init__(self, ttl_file=None):
+        self.prefixes = dict(DEFAULT_PREFIXES)
+        self.type_index = OrderedDict()  # {class_iri: {subject: None, ...}}, dict as an ordered set
+        self.pred_index = {}  # {pred_iri: {subject: {object: None, ...}}}
+        self.n_triples = 0
+
+        if ttl_file:
+            self.load(ttl_file)
+
+    def load(self, ttl_file):
+        with open(ttl_file, 'r', encoding='utf8') as f:
+            self.parse(f.read())
+
+    def parse(self, txt):
+        tokens = tokenize(txt)
+        i = 0
+        while i < len(tokens):
+            t = tokens[i]
+            if t.lower() in ('@prefix', 'prefix'):
+                self.prefixes[tokens[i + 1][:-1]] = tokens[i + 2][1:-1]
+                i += 4 if t[0] == '@' else 3
+                continue
+            if t.lower() in ('@base', 'base'):
+                i += 3 if t[0] == '@' else 2
+                continue
+
+            s = to_term(t, self.prefixes)
+            i += 1
+            while True:  # predicate-object list
+                p = to_term(tokens[i], self.prefixes)
+                i += 1
+                while True:  # object list
+                    self.add(s, p, to_term(tokens[i], self.prefixes))
+                    i += 1
+                    if tokens[i] != ',':
+                        break
+                    i += 1
+                if tokens[i] == ';' and tokens[i + 1] != '.':
+                    i += 1
+                    continue
+                if tokens[i] == ';':
+                    i += 1
+                break
+            assert tokens[i] == '.', f'Unsupported turtle syntax near: {" ".join(tokens[i - 3:i + 3])}'
+            i += 1
+
+    def add(self, s, p, o):
+        objs = self.pred_index.setdefault(p, {}).setdefault(s, {})
+        if o in objs:
+            return
+        objs[o] = None
+        self.n_triples += 1
+        if p == RDF_TYPE:
+            self.type_index.setdefault(o, {})[s] = None
+
+    def objects(self, s, p):
+        return self.pred_index.get(p, {}).get(s, {})
+
+    def subjects_of_type(self, class_iri):
+        return self.type_index.get(class_iri, {})
+
+    def __len__(self):
+        return self.n_triples
+
+
+class SparqlRule:
+    """A SPARQL rule generated by rulegen.sparql_generator, parsed into triple patterns, BIND, FILTER and
+    an optional COUNT/GROUP BY/HAVING/ORDER BY tail.
+
+    The leading rdf:type & hasGlobalId patterns are the class-definition prefix of the rule, each class
+    variable in it is a ClassDef of (var, class_iris, gid_pred, gid_var)"""
+
+    def __init__(self, sparql):
+        if isinstance(sparql, (list, tuple)):  # logFile.msg2Rctree keeps sparql as lines
+            sparql = '\n'.join(sparql)
+        self.text = sparql
+        self.prefixes = dict(DEFAULT_PREFIXES)
+        for name, iri in re.findall(r'PREFIX\s+([\w-]*):\s*<([^>]*)>', sparql, re.IGNORECASE):
+            self.prefixes[name] = iri
+
+        m = re.search(r'SELECT\s+(.*?)\s*WHERE\s*\{(.*)\}(.*)$', sparql, re.S | re.IGNORECASE)
+        if not m:
+            raise NotImplementedError('Only SELECT ... WHERE {...} is support now')
+        select, body, tail = m.groups()
+
+        # ========== Select
+        self.distinct = bool(re.match(r'DISTINCT\b', select, re.IGNORECASE))
+        self.counts = []  # [(var, distinct, as_var), ...]
+        for dist, var, as_var in re.findall(r'\(\s*COUNT\s*\(\s*(DISTINCT\s+)?(\?\w+|\*)\s*\)\s+AS\s+(\?\w+)\s*\)',
+                                            select, re.IGNORECASE):
+            self.counts.append((var, bool(dist), as_var))
+        select = re.sub(r'\(\s*COUNT.*?\)\s+AS\s+\?\w+\s*\)', ' ', select, flags=re.IGNORECASE)
+        self.select_vars = re.findall(r'\?\w+', select)  # empty means '*'
+
+        # ========== Tail
+        g = re.search(r'GROUP\s+BY\s+(.*?)(?=HAVING|ORDER|$)', tail, re.S | re.IGNORECASE)
+        self.group_vars = re.findall(r'\?\w+', g.group(1)) if g else []
+        h = re.search(r'HAVING\s*\((.*?)\)\s*(?=ORDER|$)', tail, re.S | re.IGNORECASE)
+        self.having = self.parse_expr(h.group(1)) if h else None
+        o = re.search(r'ORDER\s+BY\s+(ASC|DESC)?\s*\(?\s*(\?\w+)', tail, re.IGNORECASE)
+        self.order_by = (o.group(2), (o.group(1) or '').upper() == 'DESC') if o else None
+
+        # ========== Where
+        self.triples, self.binds, self.filters = [], [], []
+        for st in re.split(r'\s\.(?=\s|$)', body):
+            st = st.strip()
+            if not st:
+                continue
+            b = re.fullmatch(r'BIND\s*\(\s*\((.+)\)\s+AS\s+(\?\w+)\s*\)', st, re.S | re.IGNORECASE)
+            f = re.fullmatch(r'FILTER\s*\((.+)\)', st, re.S | re.IGNORECASE)
+            if b:
+                self.binds.append((self.parse_expr(b.group(1)), b.group(2)))
+            elif f:
+                self.filters.append(self.parse_expr(f.group(1)))
+            else:
+                self.triples.extend(self.parse_triples(st))
+
+        self.class_defs = self.get_class_defs()
+
+    def parse_expr(self, expr):
+        """ '?a >= '3'^^xsd:float' -> (var, op, var_or_value) """
+        expr = expr.strip().strip('()').strip()
+        m = re.fullmatch(r'(\?\w+)\s*(>=|<=|!=|=|>|<)\s*(.+)', expr, re.S)
+        if not m:
+            raise NotImplementedError(f'Expression is not support now: {expr}')
+        return m.group(1), m.group(2), to_term(m.group(3).strip(), self.prefixes)
+
+    def parse_triples(self, st):
+        tokens = tokenize(st)
+        s, p = to_term(tokens[0], self.prefixes), to_term(tokens[1], self.prefixes)
+        if is_var(p):
+            raise NotImplementedError(f'Variable predicate is not support now: {st}')
+        return [(s, p, to_term(o, self.prefixes)) for o in tokens[2:] if o != ',']
+
+    def get_class_defs(self):
+        class_defs = OrderedDict()  # {var: [class_iris, gid_pred, gid_var]}
+        for s, p, o in self.triples:
+            if not is_var(s):
+                break
+            if p == RDF_TYPE and not is_var(o):
+                class_defs.setdefault(s, [set(), None, None])[0].add(o)
+            elif p.endswith('hasGlobalId') and is_var(o) and s in class_defs and class_defs[s][1] is None:
+                class_defs[s][1], class_defs[s][2] = p, o
+            else:
+                break  # end of prefix
+        return [(v, frozenset(cs), gp, gv) for v, (cs, gp, gv) in class_defs.items()]
+
+
+class RuleChecker:
+    """Check SPARQL rules against an indexed instance graph.
+    Class binding sets ({subject: [GlobalId, ...]}) are cached by class-definition, so when a batch of rules
+    is checked by check_all(), they are computed once for all rules sharing them (e.g., every rule on Wall)"""
+
+    def __init__(self, ttl_file='../data/ontology/Plant_instance.ttl', index=None):
+        self.index = index if index is not None else TripleIndex(ttl_file)
+        self.class_bindings = {}  # {(class_iris, gid_pred): {subject: [gid, ...]}}
+        self.n_binding_hits = 0
+
+    def get_class_bindings(self, class_iris, gid_pred):
+        key = (class_iris, gid_pred)
+        if key in self.class_bindings:
+            self.n_binding_hits += 1
+            return self.class_bindings[key]
+
+        # NamedIndividual is the widest one, start from the narrowest class
+        iris = sorted(class_iris, key=lambda c: len(self.index.subjects_of_type(c)))
+        bindings = OrderedDict()
+        if iris:
+            for s in self.index.subjects_of_type(iris[0]):
+                if all(s in self.index.subjects_of_type(c) for c in iris[1:]):
+                    bindings[s] = list(self.index.objects(s, gid_pred)) if gid_pred else [None]
+        self.class_bindings[key] = bindings
+        return bindings
+
+    def plan(self, rule: SparqlRule):
+        """ order the patterns so that each one is joined on an already bound variable when possible """
+        cd_vars = {v for v, *_ in rule.class_defs}
+        gid_patterns = {(v, gp, gv) for v, cs, gp, gv in rule.class_defs if gp}
+        units = [('class', cd) for cd in rule.class_defs]
+        units += [('triple', t) for t in rule.triples
+                  if not (t[1] == RDF_TYPE and t[0] in cd_vars) and t not in gid_patterns]
+        units += [('bind', b) for b in rule.binds]
+        units += [('filter', f) for f in rule.filters]
+
+        def _vars(unit):
+            kind, x = unit
+            if kind == 'class':
+                return {x[0]}
+            if kind == 'triple':
+                return {t for t in (x[0], x[2]) if is_var(t)}
+            expr = x[0] if kind == 'bind' else x
+            return {t for t in (expr[0], expr[2]) if is_var(t)}
+
+        def _ready(unit, bound):
+            kind, x = unit
+            if kind == 'class':
+                return x[0] in bound
+            if kind == 'triple':
+                return bool(_vars(unit) & bound) or not _vars(unit)
+            return _vars(unit) <= bound
+
+        plan, bound = [], set()
+        while units:
+            unit = next((u for u in units if _ready(u, bound)), None)
+            if unit is None:
+                unit = next((u for u in units if u[0] == 'class'), units[0])
+            units.remove(unit)
+            plan.append(unit)
+            bound |= _vars(unit)
+            if unit[0] == 'class' and unit[1][3]:
+                bound.add(unit[1][3])
+            elif unit[0] == 'bind':
+                bound.add(unit[1][1])
+        return plan
+
+    def _eval_class(self, rows, class_def):
+        var, class_iris, gid_pred, gid_var = class_def
+        bindings = self.get_class_bindings(class_iris, gid_pred)
+        rows1 = []
+        for row in rows:
+            if var in row:
+                gids = bindings.get(row[var])
+                if gids is None:
+                    continue
+                for gid in gids:
+                    if gid_var is None or gid_var not in row:
+                        rows1.append({**row, gid_var: gid} if gid_var else row)
+                    elif row[gid_var] == gid:
+                        rows1.append(row)
+            else:
+                for s, gids in bindings.items():
+                    for gid in gids:
+                        row1 = {**row, var: s}
+                        if gid_var:
+                            row1[gid_var] = gid
+                        rows1.append(row1)
+        return rows1
+
+    def _eval_triple(self, rows, triple):
+        s_, p, o_ = triple
+        rows1 = []
+        for row in rows:
+            s = row.get(s_) if is_var(s_) else s_
+            o = row.get(o_) if is_var(o_) else o_
+            if s is not None:
+                s_objs = [(s, self.index.objects(s, p))]
+            else:
+                s_objs = self.index.pred_index.get(p, {}).items()
+
+            for s1, objs in s_objs:
+                row1 = {**row, s_: s1} if s is None else row
+                if o is not None:
+                    if o in objs:
+                        rows1.append(row1)
+                else:
+                    for o1 in objs:
+                        rows1.append({**row1, o_: o1})
+        return rows1
+
+    @staticmethod
+    def _eval_expr(row, expr):
+        a, op, b = expr
+        a = row.get(a)
+        b = row.get(b) if is_var(b) else b
+        return compare(a, op, b)
+
+    def check(self, rule):
+        """
+        :param rule: SparqlRule or sparql str
+        :return: list of result rows, [{var_name: value, ...}, ...], var_name has no '?'
+        """
+        if not isinstance(rule, SparqlRule):
+            rule = SparqlRule(rule)
+
+        rows = [{}]
+        for kind, x in self.plan(rule):
+            if kind == 'class':
+                rows = self._eval_class(rows, x)
+            elif kind == 'triple':
+                rows = self._eval_triple(rows, x)
+            elif kind == 'bind':
+                expr, var = x
+                for row in rows:
+                    v = self._eval_expr(row, expr)
+                    if v is not None:
+                        row[var] = v
+            else:
+                rows = [row for row in rows if self._eval_expr(row, x)]
+            if not rows:
+                break
+
+        # ========== Aggregate
+        if rule.counts or rule.group_vars:
+            groups = OrderedDict()
+            for row in rows:
+                groups.setdefault(tuple(row.get(v) for v in rule.group_vars), []).append(row)
+            rows = []
+            for key, g_rows in groups.items():
+                row = dict(zip(rule.group_vars, key))
+                for var, distinct, as_var in rule.counts:
+                    values = [r.get(var) for r in g_rows] if var != '*' else g_rows
+                    values = [v for v in values if v is not None]
+                    row[as_var] = len(set(values)) if distinct and var != '*' else len(values)
+                rows.append(row)
+            if rule.having:
+                rows = [row for row in rows if self._eval_expr(row, rule.having)]
+
+        if rule.order_by:
+            var, desc = rule.order_by
+            rows.sort(key=lambda r: (r.get(var) is None, r.get(var)), reverse=desc)
+
+        # ========== Project
+        select_vars = rule.select_vars + [as_var for *_, as_var in rule.counts]
+        if not rule.select_vars and not rule.counts:  # SELECT *
+            select_vars = list(OrderedDict.fromkeys(v for row in rows for v in row))
+        results, seen = [], set()
+        for row in rows:
+            r = tuple(row.get(v) for v in select_vars)
+            if rule.distinct:
+                if r in seen:
+                    continue
+                seen.add(r)
+            results.append(OrderedDict((v[1:], x) for v, x in zip(select_vars, r)))
+        return results
+
+    def check_all(self, rules):
+        """
+        :param rules: list of SparqlRule or sparql str
+        :return: list of results (aligned with rules), None if the rule is not supported
+        """
+        results = []
+        for rule in rules:
+            try:
+                results.append(self.check(rule))
+            except NotImplementedError:
+                results.append(None)
+        return results
+
+
+def compile_rct(rct):
+    """
+    Compile a linked RCTree of direct attribute constraint (rule category 1) into conditions, the same semantics
+    as rulegen.sparql_generator: the element fails if the 'ARprop' conditions pass and the 'Rprop' conditions fail
+
+    :return: (class_name, [(dataproperty_name, cmp, value, value_type, must_pass), ...])
+    """
+    from rulegen import get_cmp_str_onto, get_req_value, TERM_CHANGE_DICT, EQUIVALENT_TERM_DICT
+
+    if rct.rule_category != 1:
+        raise NotImplementedError(f'Rule category {rct.rule_category} is not support now')
+
+    nodes, que = [], [rct.root]
+    while que:
+        node = que.pop(0)
+        nodes.append(node)
+        que.extend(node.child_nodes)
+    class_nodes = [n for n in nodes if n.onto_type == 'class']
+    if len(class_nodes) != 1:
+        raise NotImplementedError('Only the rule of one single class is support now')
+    if class_nodes[0].onto_name in EQUIVALENT_TERM_DICT or \
+            any(n.onto_type == 'dataproperty' and n.onto_name in TERM_CHANGE_DICT and
+                (n.req is None or not isinstance(n.req[1].word, bool)) for n in nodes):
+        raise NotImplementedError('Term replacement is not support now, call sparql_generator(rct) first')
+
+    class_node = class_nodes[0]
+    conditions = []
+    for node in class_node.child_nodes:
+        if node.onto_type != 'dataproperty':
+            continue
+        if node.has_child() or node.req is None:
+            raise NotImplementedError(f'Dataproperty {node.onto_name} without a simple req is not support now')
+        cmp = get_cmp_str_onto(node.req[0].word)
+        value, value_type = get_req_value(node.req[1].word)
+        conditions.append((node.onto_name, cmp, value, value_type, 'A' in node.req[1].tag))
+    return class_node.onto_name, conditions
+
+
+def check_rct_on_table(rct, table):
+    """
+    Check a linked RCTree (rule category 1) directly by the vectorised masks over an ifc2ttl.Element_table, the
+    result is the same as the SPARQL of rulegen.sparql_generator on the ttl of the elements: the condition of a
+    property given more than once is met if any of the values meets it
+
+    :return: np.ndarray of the GlobalIds of the failed elements
+    """
+    import numpy as np
+
+    class_name, conditions = compile_rct(rct)
+    value_dtypes = {bool: (np.bool_,), int: (np.int64, np.float64), float: (np.int64, np.float64), str: (object,)}
+    mask = table.class_mask(class_name)
+    for dataproperty_name, cmp, value, value_type, must_pass in conditions:
+        if table.dtype_dict.get(dataproperty_name, object) not in value_dtypes[value_type]:
+            return table.GlobalIds[:0]  # type error in sparql, no result
+        mask &= table.compare(dataproperty_name, cmp, value, pass_=must_pass)
+    return table.GlobalIds[mask]
+
+
+def failed_global_ids(results):
+    """ GlobalIds in the result rows (the '*_id' columns of generated rules) """
+    # dict keeps the first-seen order, and the membership test is O(1)
+    return list(dict.fromkeys(v for row in results for k, v in row.items() if k.endswith('_id') and v is not None))
+
+
+def read_rulegen_sparqls(log_file='./logs/rulegen.log'):
+    """ yield (idx, seq_id, seq, sparql) from the log (or jsonl) file written by rulegen.log_rcts """
+    if log_file.endswith('.jsonl'):
+        for record in read_jsonl(log_file):
+            if record['sparql']:
+                yield record['idx'], f"#{record['seq_id']}", record['seq'], record['sparql']
+        return
+
+    SEP = '\n' + '-' * 90 + '\n'
+    with open(log_file, 'r', encoding='utf8') as f:
+        msgs = f.read().split(SEP)
+
+    for msg in msgs:
+        lines = msg.split('\n')
+        i_sparql = next((i for i, l in enumerate(lines) if l.startswith('Sparql:')), None)
+        i_head = next((i for i, l in enumerate(lines) if re.match(r'\[\d+\]#', l)), None)
+        if i_sparql is None or i_head is None:
+            continue
+        head = lines[i_head]
+        idx, seq_id = int(head[1:head.index(']')]), head[head.index('#'):]
+        seq = next((l[l.index(':') + 2:] for l in lines if l.startswith('Seq:\t')), '')
+        yield idx, seq_id, seq, '\n'.join(lines[i_sparql + 1:])
+
+
+def check_rules(sparqls, ttl_file='../data/ontology/Plant_instance.ttl', log_fn=print):
+    """
+    :param sparqls: list of (idx, seq_id, seq, sparql), e.g., from read_rulegen_sparqls()
+    :return: list of results, None for the unsupported rule
+    """
+    start_time = time.time()
+    checker = RuleChecker(ttl_file)
+    log_fn(f'Load {ttl_file}: {len(checker.index)} triples, {len(checker.index.type_index)} types '
+           f'({get_elapsed_time(start_time)})')
+
+    start_time = time.time()
+    results = checker.check_all([s[-1] for s in sparqls])
+    n_pass, n_fail, n_skip = 0, 0, 0
+    for (idx, seq_id, seq, _), result in zip(sparqls, results):
+        log_fn('-' * 90)
+        log_fn(f'[{idx}]{seq_id}')
+        log_fn(f'Seq:\t{seq}')
+        if result is None:
+            n_skip += 1
+            log_fn('Check skipped (not supported)')
+            continue
+        ids = failed_global_ids(result)
+        if result:
+            n_fail += 1
+            log_fn(f'Check failed: {len(result)} result(s)' + (f', GlobalId: {", ".join(ids)}' if ids else ''))
+        else:
+            n_pass += 1
+            log_fn('Check passed')
+    log_fn('-' * 90)
+    log_fn(f'\nPass/Fail/Skip: {n_pass}/{n_fail}/{n_skip}, class binding sets: {len(checker.class_bindings)} '
+           f'(reused {checker.n_binding_hits} times)')
+    log_fn(f'Time cost: {get_elapsed_time(start_time)}')
+    return results
+
+
+def get_args():
+    parser = argparse.ArgumentParser('Rule Checker')
+    parser.add_argument('-r', '--rule_log', type=str, default='./logs/rulegen.log',
+                        help='log (or jsonl) file of rulegen.py')
+    parser.add_argument('-t', '--ttl', type=str, default='../data/ontology/Plant_instance.ttl',
+                        help='instance graph (ttl) of the building model')
+    args_ = parser.parse_args()
+
+    return args_
+
+
+if __name__ == '__main__':
+    args = get_args()
+    logger = Logger(file_name='rulecheck.log', init_mode='w+')
+    check_rules(list(read_rulegen_sparqls(args.rule_log)), args.ttl, logger.log)
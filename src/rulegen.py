@@ -2,18 +2,11 @@ from ruleparse import *
 import ruleparse
 from data import *
 from ruleparse import RCTree
-from owlready2 import *
 import json
-import jieba_fast as jieba
-from gensim.models import Word2Vec
-from scipy import spatial
-from gensim.models.tfidfmodel import TfidfModel
-from gensim import corpora
 from collections import Counter
 import math
-from sklearn.decomposition import TruncatedSVD
 import warnings
-import ifc2ttl
+# heavy dependencies (owlready2, jieba_fast, gensim, scipy, sklearn, ifc2ttl/ifcopenshell) are imported where used
 
 warnings.filterwarnings("ignore", category=Warning)
 
@@ -109,6 +102,8 @@ Function: This class reads the predefined class in the excel table by key words
 
 class Keywords_dict():
     def __init__(self, path='./data/OntoKeywords.xlsx'):
+        import pandas as pd
+
         df = pd.read_excel(path, sheet_name=['Class', 'DataProperty', 'ObjectProperty', 'CommonExpression'],
                            header=None)
         # get class dict
@@ -153,6 +148,8 @@ Function: get the split sentence with no stopwords
 
 class Sentence:
     def __init__(self, sentence, stopwords):
+        import jieba_fast as jieba
+
         self.raw = sentence
         self.tokens = [t for t in jieba.cut(sentence)]
         self.tokens_without_stop = [t for t in self.tokens if t not in stopwords]
@@ -186,6 +183,8 @@ DataStructure: dict
 
 def onto_info_extract(src=r"..\data\ontology\BuildingDesignFireCodesOntology.owl",
                       tag=r'..\data\ontology\BuildingDesignFireCodesOntology.pkl'):
+    from owlready2 import get_ontology
+
     onto = get_ontology(src).load()
     ontology_pkl = []
     ontology_class = []
@@ -215,6 +214,9 @@ Function: get TF-IDF from rules, and save the dict
 
 
 def rules_TFIDF(corpus_path=r'..\data\rules\allRules.text'):
+    from gensim import corpora
+    from gensim.models.tfidfmodel import TfidfModel
+
     stoplist = stopwordslist(r'.\models\word2vec\Stopwords.txt')
     dictionary_path = r'.\models\tfidf\rules_doc2bow.dict'
     tfidf_model_path = r'.\models\tfidf\rules_tfidf.model'
@@ -341,6 +343,9 @@ Reference:
 
 
 def word2vec_similarity(onto_description, word, word2vec_model, stopwords, dictionary, method=1):
+    from scipy import spatial
+    from sklearn.decomposition import TruncatedSVD
+
     if len(onto_description) == 0 and method != 4 and method != 5:
         return 0
     elif len(onto_description) == 0 and method == 4:
@@ -572,6 +577,10 @@ output:
 
 
 def most_similar_onto_term(words: list, method=1, onto_file=r'..\data\ontology\BuildingDesignFireCodesOntology.pkl'):
+    import jieba_fast as jieba
+    from gensim import corpora
+    from gensim.models import Word2Vec
+
     jieba.load_userdict(r'.\models\word2vec\wordsList500.txt')
     stopwords = stopwordslist(r'.\models\word2vec\Stopwords.txt')
     model = Word2Vec.load(r'.\models\word2vec\Merge.model')
@@ -1029,6 +1038,8 @@ def rule_classification(sentences: str, model, method=1):
 
 def avg_prf1_all(all_preds, all_labels, output_dict=True, label_tags=None):
     """ref: https://scikit-learn.org/stable/modules/generated/sklearn.metrics.classification_report.html"""
+    from sklearn.metrics import classification_report
+
     return classification_report(all_labels, all_preds, target_names=label_tags, output_dict=output_dict, digits=3)
 
 
@@ -1108,12 +1119,14 @@ Function: log the augmentation rctree and the sparql
 def log_rcts(rcts):
     logger = Logger(file_name='rulegen.log', init_mode='w+')
     log = logger.log
+    records = JsonlLogWriter(file_name='rulegen.jsonl', init_mode='w')
     n_parse = 0
 
     def log_rct(rct, n_parse):
         print('*' * 90)
         print('The rct after equivalent class define and dataproperty replacement is:')
         rct.change_log_fn(log)
+        rct.change_record_fn(records.write)
         rct.log_msg(n_parse)
         log('-' * 90)
         log('Code(Sparql) gen complete.')
@@ -1282,6 +1295,24 @@ class logFile:
         return None
 
 
+'''
+State: use
+Function: get the value (str) and its type of the req value word, used by sparql_generator and rulecheck
+'''
+
+
+def get_req_value(req_value_rawdata):
+    if req_value_rawdata == True:
+        return ('true', bool)
+    for key, values in VALUE_DICT_WORDS.items():
+        if req_value_rawdata in values:
+            return (key, int)
+    if bool(re.search(r'\d', req_value_rawdata)):
+        return (re.findall(r"\d+\.?\d*", req_value_rawdata)[0], float)
+    else:
+        return (req_value_rawdata, str)
+
+
 '''
 State: use
 Funtion: give a RCtree without entity link, generate a sparql rule.
@@ -1289,17 +1320,6 @@ Funtion: give a RCtree without entity link, generate a sparql rule.
 
 
 def sparql_generator(rct):
-    def get_req_value(req_value_rawdata):
-        if req_value_rawdata == True:
-            return ('true', bool)
-        for key, values in VALUE_DICT_WORDS.items():
-            if req_value_rawdata in values:
-                return (key, int)
-        if bool(re.search(r'\d', req_value_rawdata)):
-            return (re.findall(r"\d+\.?\d*", req_value_rawdata)[0], float)
-        else:
-            return (req_value_rawdata, str)
-
     # Determine if a dataproperty node needs a term replacement
     def ischange_dataproperty_node(node):
         if node.has_child():
@@ -1445,7 +1465,8 @@ def sparql_generator(rct):
                                 elif one_childnode.onto_type == 'class':
                                     domain_class = curr_node.onto_name
                                     range_class = one_childnode.onto_name
-                                    object_property = ifc2ttl.Building_element.get_objprop(domain_class, range_class)
+                                    from ifc2ttl import Building_element
+                                    object_property = Building_element.get_objprop(domain_class, range_class)
                                     sparql_con += curr_node.sparql_pronoun + ' :' + object_property + ' ' + one_childnode.sparql_pronoun + ' .\n\t'
                 for child in curr_node.child_nodes:
                     que.append(child)
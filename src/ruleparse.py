@@ -3,12 +3,11 @@
 
 import sys
 import argparse
-import nltk
 import re
 import hashlib
 import shutil
-import pandas as pd
 import xml.etree.ElementTree as ET
+from itertools import chain
 from collections import OrderedDict
 from typing import List, Tuple
 from antlr4parser import *
@@ -63,6 +62,8 @@ class LabelWordTags:
     """Label_wt, e.g., [(word, tag),(word,tag),...], nltk-friendly"""
 
     def __init__(self, word_tags):
+        import nltk
+
         if isinstance(word_tags, nltk.Tree):
             word_tags = list(word_tags)
 
@@ -351,10 +352,11 @@ class RCTreeVisitor(RuleCheckTreeVisitor):
 
 
 class RCTree:
-    def __init__(self, seq, label_iit, log_fn=print):
+    def __init__(self, seq, label_iit, log_fn=print, record_fn=None):
         """
         :param seq:     sentence, list of char: ['a','b','c',...] -> str: 'abc..'
         :param label_iit:   label_tuple, [(i,j,tag),(i,j,tag),...]
+        :param record_fn:   also write the record (dict) by log_msg, e.g., JsonlLogWriter.write
         """
         self.root = RCNode('#', None)
         self.curr_node = self.root  # the node who just add_child
@@ -372,10 +374,14 @@ class RCTree:
         self.error_msg = ''
         self.sparql = ''
         self.log_fn = log_fn
+        self.record_fn = record_fn
 
     def change_log_fn(self, log_fn):
         self.log_fn = log_fn
 
+    def change_record_fn(self, record_fn):
+        self.record_fn = record_fn
+
     def set_sparql(self, sparql):
         self.sparql = sparql
 
@@ -855,6 +861,8 @@ class RCTree:
         :param return_idx: set True to return [(idx, lwts),...]
         :return: list of LabelWordTags, return an empty list when no result
         """
+        import nltk
+
         if not full_label:
             full_label = self.full_label
 
@@ -937,20 +945,36 @@ class RCTree:
         self.parse_complete = self.full_label.contains_tags(('O', 'obj'), only=True)
 
     def log_msg(self, idx=0):
+        record = self.to_record(idx)
         self.log_fn('-' * 90)
-        self.log_fn(f'[{idx}]#{self.seq_id}')
-        self.log_fn(f'Seq:\t{self.seq}')
-        self.log_fn(f'Label:\t{self.slabel}')
-        if self.rule_category:
-            self.log_fn(f"Category:  {str(self.rule_category)}  | Categoty Name:  {self.rule_category_name}")
-
-        if self.error_msg:
-            self.log_fn(self.error_msg)
-
-        self.log_fn(f"RCTree:\t#{self.hashtag()}\n{self}")
-        self.log_fn('Parsing complete' if self.parse_complete else 'Parsing failed')
-        if self.sparql:
-            self.log_fn(f"Sparql:\n{self.sparql}")
+        for line in self.record_lines(record):
+            self.log_fn(line)
+        if self.record_fn is not None:
+            self.record_fn(record)
+
+    def to_record(self, idx=0):
+        """ the info in log_msg as a dict (a line of the jsonl log) """
+        tree = str(self)
+        return {'idx': idx, 'seq_id': self.seq_id, 'seq': self.seq, 'slabel': self.slabel, 'tree': tree,
+                'hashtag': str_hash(tree), 'parse_complete': self.parse_complete, 'error': self.error_msg,
+                'category': self.rule_category, 'category_name': getattr(self, 'rule_category_name', ''),
+                'sparql': self.sparql}
+
+    @staticmethod
+    def record_lines(record):
+        """ the msg lines of the record in the log file (without the separator line) """
+        lines = [f"[{record['idx']}]#{record['seq_id']}", f"Seq:\t{record['seq']}", f"Label:\t{record['slabel']}"]
+        if record['category']:
+            lines.append(f"Category:  {str(record['category'])}  | Categoty Name:  {record['category_name']}")
+
+        if record['error']:
+            lines.append(record['error'])
+
+        lines.append(f"RCTree:\t#{record['hashtag']}\n{record['tree']}")
+        lines.append('Parsing complete' if record['parse_complete'] else 'Parsing failed')
+        if record['sparql']:
+            lines.append(f"Sparql:\n{record['sparql']}")
+        return lines
 
     def count_node_pronoun(self):
         if not hasattr(self, 'count_pronoun'):
@@ -1261,6 +1285,8 @@ class RevitRuleGenerator:
 
 
 def model_data_loader():
+    from dataset import get_data_loader
+
     seqs_raw, labels_raw, _ = init_data_by_json()
     train_data_loader, val_data_loader, corpus = get_data_loader('../data/xiaofang', batch_size=1,
                                                                  check_stratify=False, shuffle_train=False)
@@ -1333,15 +1359,44 @@ class EvalLogFile:
     SEP = '\n' + '-' * 90 + '\n'
     EVALs = ('##correct', '##wrong', '##relabel', '##del', '##ignore')
 
-    def __init__(self, file_txt):
-        self.txt = file_txt
-        self.msgs = self.txt.split(self.SEP)
-        self.ddict = self.get_ddict()  # {hashtag: msg-dict, ...}, use msgs[1:-1]
+    def __init__(self, msgs):
+        """
+        :param msgs: file text, or iterable of msgs (parsed lazily), e.g., EvalLogFile.iter_msgs(f)
+        """
+        msgs = iter(msgs.split(self.SEP) if isinstance(msgs, str) else msgs)
+        self.head = next(msgs, '')  # msgs[0]
+        self.ddict = self.get_ddict(msgs)  # {hashtag: msg-dict, ...}, use msgs[1:-1]
+        self.msgs = None  # by update_eval()
+
+    @classmethod
+    def from_records(cls, records):
+        """ records: RCTree.to_record() dicts, e.g., read_jsonl('./logs/ruleparse.jsonl') """
+        msgs = ('\n'.join(RCTree.record_lines(r)) for r in records)
+        return cls(chain([''], msgs, ['']))
+
+    @classmethod
+    def iter_msgs(cls, file, sha1=None):
+        """ yield the msgs of the file line by line, same as file.read().split(SEP), sha1: also update it by the text """
+        sep_line = cls.SEP[1:]
+        lines = []
+        for line in file:
+            if sha1 is not None:
+                sha1.update(line.encode('utf8'))
+            if lines and line == sep_line and lines[-1].endswith('\n'):
+                lines[-1] = lines[-1][:-1]
+                yield ''.join(lines)
+                lines = []
+            else:
+                lines.append(line)
+        yield ''.join(lines)
 
-    def get_ddict(self):
+    def get_ddict(self, msgs):
         ddict = OrderedDict()
-        for msg in self.msgs[1:-1]:
-            ddict.update(self.msg2dict(msg))  # like append
+        msg_ = None
+        for msg in msgs:  # except the last one
+            if msg_ is not None:
+                ddict.update(self.msg2dict(msg_))  # like append
+            msg_ = msg
 
         return ddict
 
@@ -1398,9 +1453,8 @@ class EvalLogFile:
 
         msgs_idxs = sorted(msgs_idxs, key=lambda mi: mi[1])
 
-        msgs = [m for m, i in msgs_idxs]
-        self.msgs = msgs
-        self.txt = self.SEP.join(msgs)
+        self.msgs = [m for m, i in msgs_idxs]
+        return self.msgs
 
 
 def get_current_eval_log(log_dir='./logs'):
@@ -1421,40 +1475,48 @@ def get_current_eval_log(log_dir='./logs'):
         f0_v = int(fn[fn.index('-v') + 2:fn.index('.')])
 
     print(f'Read file: {fn}\n')
-    with open(f'{log_dir}/{fn}', 'r', encoding='utf8') as f:
-        f0_txt = f.read()
+    return f0_v, f'{log_dir}/{fn}'
 
-    return f0_v, f0_txt
 
+def update_eval_log(log_dir='./logs', ignore_rct_hash=False, rct_file='./logs/ruleparse.log'):
+    """
+    ignore_rct_hash: just copy eval by matched seq_id
+    rct_file: log (text) or jsonl file of the current parsing
+    """
+    import pandas as pd
 
-def update_eval_log(log_dir='./logs', ignore_rct_hash=False):
-    """ignore_rct_hash: just copy eval by matched seq_id """
     print('\n=== Process eval log file ===')
     if ignore_rct_hash:
         print('*NOTE: ignore rct hash changes')
 
-    with open(f'./logs/ruleparse.log', 'r') as f:
-        f1_txt = f.read()
-
-    f0_v, f0_txt = get_current_eval_log(log_dir)
-    ef0 = EvalLogFile(f0_txt)  # last log file
-    ef1 = EvalLogFile(f1_txt)  # current log file
+    f0_v, f0_path = get_current_eval_log(log_dir)
+    sha1_f0 = hashlib.sha1()
+    with open(f0_path, 'r', encoding='utf8') as f:
+        ef0 = EvalLogFile(EvalLogFile.iter_msgs(f, sha1_f0))  # last log file
+    if rct_file.endswith('.jsonl'):
+        ef1 = EvalLogFile.from_records(read_jsonl(rct_file))  # current log file
+    else:
+        BufferedLogWriter.close_file(rct_file)  # write the buffered msgs first
+        with open(rct_file, 'r') as f:
+            ef1 = EvalLogFile(EvalLogFile.iter_msgs(f))
 
     # ==================== Update
     rct_change = False
 
-    idx0s = [d0['idx'] for _, d0 in ef0.ddict.items()]
+    idx0_pos = {}  # {idx: compact index}
+    for d0 in ef0.ddict.values():
+        idx0_pos.setdefault(d0['idx'], len(idx0_pos) + 1)
+    max_idx0 = max(idx0_pos, default=0)
     # assert len(ef0.ddict) == len(ef1.ddict)  # test
     for seq_id1, d1 in ef1.ddict.items():
         # get d0, d1 with same seq
         if seq_id1 not in ef0.ddict:
-            if d1['idx'] <= max(idx0s):
+            if d1['idx'] <= max_idx0:
                 d1['idx'] = 99999
             continue
         d0 = ef0.ddict[seq_id1]
 
-        d1['idx'] = d0['idx']
-        d1['idx'] = idx0s.index(d0['idx']) + 1  # compact index
+        d1['idx'] = idx0_pos[d0['idx']]  # compact index
 
         eval0, eval1 = d0['eval'], ''
         if ignore_rct_hash:
@@ -1495,45 +1557,48 @@ def update_eval_log(log_dir='./logs', ignore_rct_hash=False):
     print(f'Added seqs (n={len(h_add)})', h_add if h_add else '')
 
     # ==================== Write
+    sha1_f1 = hashlib.sha1()
     with open(f'{log_dir}/ruleparse-eval-v{f0_v + 1}.log', 'w', encoding='utf8') as f:
+        def write(s):
+            f.write(s)
+            sha1_f1.update(s.encode('utf8'))
+
         SEP = ef0.SEP
-        f.write(ef0.msgs[0])
-        f.write(SEP)
+        write(ef0.head)
+        write(SEP)
 
-        ef1.update_eval()
-        f.write(ef1.txt)
-        f.write(SEP)
+        for i, msg in enumerate(ef1.update_eval()):
+            if i:
+                write(SEP)
+            write(msg)
+        write(SEP)
 
         if h_del:
-            f.write(f'\n\n##del or not matched')
-            f.write(SEP)
+            write(f'\n\n##del or not matched')
+            write(SEP)
             for h in h_del:
                 d = ef0.ddict[h]
-                f.write(f"[{d['idx']}]{d['msg']}")
-                f.write(SEP)
-
-    # ==================== Hash check
-    with open(f'{log_dir}/ruleparse-eval-v{f0_v}.log', 'r', encoding='utf8') as f:
-        sha1_f0 = hashlib.sha1(f.read().encode('utf8')).hexdigest()
-    with open(f'{log_dir}/ruleparse-eval-v{f0_v + 1}.log', 'r', encoding='utf8') as f:
-        sha1_f1 = hashlib.sha1(f.read().encode('utf8')).hexdigest()
+                write(f"[{d['idx']}]{d['msg']}")
+                write(SEP)
+
+    # ==================== Hash check (computed while reading/writing)
+    sha1_f0, sha1_f1 = sha1_f0.hexdigest(), sha1_f1.hexdigest()
     print(f'[SHA1 sum of EvalLog-v{f0_v}/{f0_v+1} is', f'same (duplicate deleted)]' if sha1_f1 == sha1_f0 else 'different]*')
     if sha1_f1 == sha1_f0:
         os.remove(f'{log_dir}/ruleparse-eval-v{f0_v + 1}.log')
 
     # ==================== Measure & Print
     print('\n-Stat')
-    df = {'has_app': [], 'rec_pr': [], 'n_props': [], '2_props': [], 'correct': []}
-    ids = []
-    for h, d in ef1.ddict.items():
-        rct = d['msg'].split('\n')[4:-2]
-        ids.append(h)
-        df['has_app'].append(int(any('-?' in t for t in rct)))
-        df['rec_pr'].append(int(any('|--' in t for t in rct)))
-        df['n_props'].append(len(rct) - 1)
-        df['2_props'].append(int(len(rct) - 1 >= 2))
-        df['correct'].append(int(bool(re.match('###?correct', d['eval']))))
-    df = pd.DataFrame(df, index=ids)
+    df_msg = pd.DataFrame.from_dict(ef1.ddict, orient='index', columns=['msg', 'label', 'eval'])
+    rcts = df_msg['msg'].str.split('\n').str[4:-2]
+    rct_lines = rcts.explode().dropna()  # long format: a line of rctree per row
+    df = pd.DataFrame(index=df_msg.index)
+    for col, s in (('has_app', '-?'), ('rec_pr', '|--')):
+        has_s = rct_lines.str.contains(s, regex=False).groupby(level=0).any()
+        df[col] = has_s.reindex(df.index, fill_value=False).astype(int)
+    df['n_props'] = rcts.str.len() - 1
+    df['2_props'] = (df['n_props'] >= 2).astype(int)
+    df['correct'] = df_msg['eval'].str.match('###?correct').astype(int)
     # df.to_csv(f'{log_dir}/log-v{f0_v + 1}.csv')
 
     n = len(df['correct'])
@@ -1562,19 +1627,15 @@ def update_eval_log(log_dir='./logs', ignore_rct_hash=False):
     print(f"Simple={n - sum(df['2_props'])}")
 
     if sha1_f0 != sha1_f1:  # show_df_tag
-        d_tags = OrderedDict.fromkeys(sorted(TAGS, key=lambda t: 'sobj prop cmp Rprop ARprop Robj'.index(t)), 0)
-        df_tag = pd.DataFrame(d_tags, index=['Simple', 'Complex', 'All'])
-        for h, d in ef1.ddict.items():
-            for t in TAGS:
-                nt = d['label'].count(f'/{t}]')
-                df_tag[t]['All'] += nt
-                if df.loc[h, '2_props']:
-                    df_tag[t]['Complex'] += nt
-                else:
-                    df_tag[t]['Simple'] += nt
-        df_tag['TOTAL'] = 0
-        for ind in df_tag.index:
-            df_tag['TOTAL'][ind] = df_tag.loc[ind].sum()
+        tags = sorted(TAGS, key=lambda t: 'sobj prop cmp Rprop ARprop Robj'.index(t))
+        label_tags = df_msg['label'].str.extractall(f"/({'|'.join(tags)})]")[0]  # long format: a tag per row
+        label_tags = label_tags.droplevel('match')
+        complexity = df['2_props'].map({0: 'Simple', 1: 'Complex'}).reindex(label_tags.index)
+        df_tag = pd.crosstab(complexity, label_tags)
+        df_tag = df_tag.reindex(index=['Simple', 'Complex'], columns=tags, fill_value=0)
+        df_tag.loc['All'] = df_tag.sum()
+        df_tag['TOTAL'] = df_tag.sum(axis=1)
+        df_tag = df_tag.rename_axis(index=None, columns=None)
         print('')
         print(df_tag)
 
@@ -1630,6 +1691,7 @@ if __name__ == '__main__':
     args = get_args()
     logger = Logger(file_name='ruleparse.log', init_mode='w+')
     log = logger.log
+    records = JsonlLogWriter(file_name='ruleparse.jsonl', init_mode='w')
 
     if args.interactive:
         log('=== Interactive RCTree Parsing (Ctrl-C to exit) ===')
@@ -1639,7 +1701,7 @@ if __name__ == '__main__':
     n_parse, n_complete = 0, 0
     log('=== RCTree Parsing Start ===')
     for seq, label in seq_data_loader(args.dataset_name):
-        rct = RCTree(seq, label, log)
+        rct = RCTree(seq, label, log, records.write)
         rct.parse()
         rct.log_msg(n_parse + 1)
         n_parse += 1
@@ -1652,6 +1714,6 @@ if __name__ == '__main__':
     log(f'Time cost: {get_elapsed_time(start_time)}')
 
     if not args.no_update_eval:
-        update_eval_log()
+        update_eval_log(rct_file='./logs/ruleparse.jsonl')
     if args.gen_rule:
         ET.ElementTree(RevitRuleGenerator.Root).write('./logs/checkset.xml', encoding='utf-8', xml_declaration=True)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules in src/ import each other by name, as when run from src/
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(SRC_DIR), 'data')
+sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+from dataset import BucketBatchSampler, TextDataSet, _get_bucket_data_loader, collate_trim_pad
+
+
+def _lengths(n=203, seed=0):
+    return np.random.RandomState(seed).randint(3, 125, size=n)
+
+
+@pytest.mark.parametrize('shuffle', [True, False])
+@pytest.mark.parametrize('batch_size,bucket_size', [(8, None), (32, 64), (7, 7), (300, None)])
+def test_every_index_once(shuffle, batch_size, bucket_size):
+    lengths = _lengths()
+    sampler = BucketBatchSampler(lengths, batch_size, shuffle=shuffle, bucket_size=bucket_size)
+    batches = list(sampler)
+
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    assert len(batches) == len(sampler)
+    assert all(len(batch) <= batch_size for batch in batches)
+    if not shuffle:  # sorted by length
+        assert [lengths[i] for batch in batches for i in batch] == sorted(lengths)
+
+
+def test_buckets_group_lengths():
+    lengths = _lengths(1000)
+    np.random.seed(0)
+    batches = list(BucketBatchSampler(lengths, 8, bucket_size=8 * 10))
+    spread = np.mean([np.ptp(lengths[batch]) for batch in batches])
+    assert spread < np.ptp(lengths) / 4  # random batches of 8 would spread over most of the range
+
+
+def test_drop_last():
+    lengths = _lengths(100)
+    sampler = BucketBatchSampler(lengths, 8, bucket_size=40, drop_last=True)
+    batches = list(sampler)
+    assert len(batches) == len(sampler) == 12  # buckets of 40, 40, 20 sentences: 5 + 5 + 2 full batches
+    assert all(len(batch) == 8 for batch in batches)
+
+
+@pytest.mark.parametrize('num_replicas', [2, 3, 4])
+def test_shards(num_replicas):
+    lengths = _lengths()
+    samplers = [BucketBatchSampler(lengths, 8, num_replicas=num_replicas, rank=rank, seed=1)
+                for rank in range(num_replicas)]
+    for epoch in (0, 1):
+        shards = []
+        for sampler in samplers:
+            sampler.set_epoch(epoch)
+            shards.append(list(sampler))
+
+        # every rank has the same num of batches, and together they cover every index
+        assert len({len(shard) for shard in shards}) == 1
+        assert all(len(shard) == len(sampler) for shard, sampler in zip(shards, samplers))
+        indexes = [i for shard in shards for batch in shard for i in batch]
+        assert set(indexes) == set(range(len(lengths)))
+        # only the padding batches (the first ones) are repeated
+        assert len(indexes) - len(lengths) <= 8 * (num_replicas - 1)
+
+
+def test_shards_differ_by_epoch():
+    sampler = BucketBatchSampler(_lengths(), 8, num_replicas=2, rank=0, seed=1)
+    epoch0 = list(sampler)
+    assert list(sampler) == epoch0  # the same epoch, the same shuffle on every call
+    sampler.set_epoch(1)
+    assert list(sampler) != epoch0
+
+
+def test_collate_trim_pad():
+    sql = 20
+    items = []
+    for n in (5, 9, 7):
+        token_ids = torch.zeros(sql, dtype=torch.long)
+        token_ids[:n] = torch.arange(1, n + 1)
+        att_mask = (token_ids > 0).float()
+        tag_ids = torch.where(att_mask.bool(), token_ids % 3, torch.full_like(token_ids, -1))
+        items.append((token_ids, att_mask, tag_ids))
+
+    token_ids, att_mask, tag_ids = collate_trim_pad(items)
+    assert token_ids.shape == att_mask.shape == tag_ids.shape == (3, 9)
+    assert all(t.is_contiguous() for t in (token_ids, att_mask, tag_ids))
+    assert tag_ids.view(-1).tolist() == torch.stack([item[2][:9] for item in items]).view(-1).tolist()
+
+
+def test_test_loader_indexes():
+    """the sorted batches of the test data (without tag_ids) carry the indexes of their sentences"""
+    lengths = _lengths(50)
+    token_ids = torch.zeros(len(lengths), 125, dtype=torch.long)
+    for i, n in enumerate(lengths):
+        token_ids[i, :n] = torch.arange(1, n + 1) + i
+    dataset = TextDataSet({'token_ids': token_ids, 'att_mask': (token_ids > 0).float()})
+    loader = _get_bucket_data_loader(dataset, 8, False, 0, with_index=True)
+
+    for indexes, batch_token_ids, batch_att_mask in loader:
+        assert batch_token_ids.shape == batch_att_mask.shape == (len(indexes), lengths[indexes].max())
+        assert batch_token_ids.tolist() == token_ids[indexes, :batch_token_ids.shape[1]].tolist()
+    assert sorted(i for indexes, _, _ in loader for i in indexes.tolist()) == list(range(len(lengths)))
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('sklearn')
+from utils import NNFullHistory, NNConfusionHistory, NNDeviceConfusionHistory
+
+
+def _batches(n_batches=20, bs=8, sql=30, n_labels=15, seed=0):
+    """(loss, preds, labels) of token classification batches, with -1 padding and some wrong predictions"""
+    rng = np.random.RandomState(seed)
+    for _ in range(n_batches):
+        labels = rng.choice(n_labels, size=(bs, sql), p=[0.5] + [0.5 / (n_labels - 1)] * (n_labels - 1))
+        preds = np.where(rng.rand(bs, sql) < 0.7, labels, rng.randint(n_labels, size=(bs, sql)))
+        for row, length in zip(labels, rng.randint(2, sql, size=bs)):
+            row[length:] = -1
+        yield torch.tensor(rng.rand()), torch.tensor(preds), torch.tensor(labels)
+
+
+def _histories(**kwargs):
+    histories = [NNFullHistory(), NNConfusionHistory(), NNDeviceConfusionHistory()]
+    for loss, preds, labels in _batches(**kwargs):
+        for history in histories:
+            history.append(loss, preds, labels, ignore_label=-1)
+    return histories
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'n_labels': 9}, {'bs': 1, 'n_batches': 3}])
+def test_same_as_classification_report(kwargs):
+    full, confusion, device = _histories(**kwargs)
+    expected = full.avg_prf1_all(output_dict=True)
+    for history in (confusion, device):
+        d = history.avg_prf1_all(output_dict=True)
+        assert d.keys() == expected.keys()
+        assert d['accuracy'] == pytest.approx(expected['accuracy'])
+        for key in set(d) - {'accuracy'}:
+            for metric in ('precision', 'recall', 'f1-score', 'support'):
+                assert d[key][metric] == pytest.approx(expected[key][metric]), (key, metric)
+        assert history.avg_prf1_all(output_dict=False) == full.avg_prf1_all(output_dict=False)
+        assert history.avg_prf1_weight() == pytest.approx(full.avg_prf1_weight())
+        assert history.avg_prf1_binary(0) == pytest.approx(full.avg_prf1_binary(0))
+        assert history.avg_accuracy() == pytest.approx(full.avg_accuracy())
+        assert history.avg_loss() == pytest.approx(full.avg_loss())
+
+
+def test_remove_first():
+    full, confusion, device = _histories()
+    assert confusion.avg_prf1_weight(remove_first=True) == pytest.approx(full.avg_prf1_weight(remove_first=True))
+    assert device.avg_prf1_weight(remove_first=True) == pytest.approx(full.avg_prf1_weight(remove_first=True))
+
+
+def test_remove_first_more_labels():
+    """every label but the first, not only 1..14"""
+    confusion = NNConfusionHistory(n_labels=20)
+    for loss, preds, labels in _batches(n_labels=20):
+        confusion.append(loss, preds, labels, ignore_label=-1)
+    p, r, f1, s = confusion.prf1_support()
+    n = s[1:].sum()
+    assert confusion.avg_prf1_weight(remove_first=True) == pytest.approx(
+        ((p[1:] * s[1:]).sum() / n, (r[1:] * s[1:]).sum() / n, (f1[1:] * s[1:]).sum() / n))
+
+
+@pytest.mark.parametrize('cls', [NNConfusionHistory, NNDeviceConfusionHistory])
+def test_remove_first_no_support(cls):
+    history = cls()
+    assert history.avg_prf1_weight(remove_first=True) == (0, 0, 0)
+    history.append(torch.tensor(0.5), torch.tensor([[0, 3, 0]]), torch.tensor([[0, 0, -1]]), ignore_label=-1)
+    assert history.avg_prf1_weight(remove_first=True) == (0, 0, 0)
@@ -0,0 +1,156 @@
+import os
+import numpy as np
+import pytest
+from conftest import DATA_DIR
+
+pytest.importorskip('ifcopenshell')
+pytest.importorskip('owlready2')
+from ifc2ttl import Building_element, Element_table, Mappping_dict
+
+
+def _element(element_type, GlobalId, *data_properties):
+    element = Building_element(element_type, GlobalId, '')
+    for property_name, property_value in data_properties:
+        element.add_dataprop(property_name, property_value)
+    return element
+
+
+@pytest.fixture
+def table():
+    return Element_table([_element('IfcWall', 'w0', ('耐火极限', 3.0), ('是否承重', True)),
+                          _element('IfcWall', 'w1', ('耐火极限', 2.5)),
+                          _element('IfcWall', 'w2'),  # no fire resistance
+                          _element('IfcSpace', 's0', ('耐火极限', 1.0), ('hasBuildingType', 'Plant')),
+                          _element('IfcSpace', 's1', ('hasBuildingType', 'Office'))])
+
+
+def test_compare_numeric(table):
+    assert list(table.GlobalIds[table.compare('hasFireResistanceLimits_hour', '>=', '3')]) == ['w0']
+    # pass_=False: has the property but does not meet it, w2 is not a failure
+    assert list(table.GlobalIds[table.compare('hasFireResistanceLimits_hour', '>=', 3, element_class='Wall',
+                                              pass_=False)]) == ['w1']
+
+
+def test_compare_bool(table):
+    assert list(table.GlobalIds[table.compare('isLoadBearing_Boolean', '=', 'true')]) == ['w0']
+    assert not table.compare('isLoadBearing_Boolean', '=', 'true', pass_=False).any()
+
+
+def test_compare_str_skips_invalid_slots(table):
+    assert list(table.GlobalIds[table.compare('hasBuildingType', '=', 'Plant')]) == ['s0']
+    assert list(table.GlobalIds[table.compare('hasBuildingType', '!=', 'Plant')]) == ['s1']
+    assert list(table.GlobalIds[table.compare('hasBuildingType', '>', 'A')]) == ['s0', 's1']
+
+
+def test_compare_any_value():
+    # the family gives 2.0 and the instance gives 4.0, '4' is a xsd:string which is not compared
+    table = Element_table([_element('IfcWall', 'w0', ('耐火极限', 2.0), ('耐火极限', 4.0)),
+                           _element('IfcWall', 'w1', ('耐火极限', '4'), ('耐火极限', np.float64(1.0))),
+                           _element('IfcWall', 'w2', ('耐火极限', 4))])
+    assert list(table.GlobalIds[table.compare('hasFireResistanceLimits_hour', '>=', 3)]) == ['w0', 'w2']
+    assert list(table.GlobalIds[table.compare('hasFireResistanceLimits_hour', '>=', 3, pass_=False)]) == ['w0']
+
+
+def test_compare_missing_column(table):
+    assert not table.compare('hasMaxNumberOfHuman', '>=', 1).any()
+    with pytest.raises(NotImplementedError):
+        table.compare('hasFireResistanceLimits_hour', '~', 1)
+
+
+@pytest.mark.parametrize('cmp', list(Element_table.CMP_FUNCS))
+def test_from_ifc_same_as_elements(cmp):
+    """the masks over Plant_ByhandV3.ifc are the same as comparing the data_properties element by element"""
+    ifc_file = os.path.join(DATA_DIR, 'ifc', 'Plant_ByhandV3.ifc')
+    if not os.path.exists(ifc_file):
+        pytest.skip(f'{ifc_file} not found')
+    from ifc2ttl import get_allprop_from_ifc
+
+    elements, _ = get_allprop_from_ifc(ifc_file)
+    table = Element_table(elements)
+    mapping = Mappping_dict().ifc_map_fireonto()
+    ops = {'>=': np.greater_equal, '<=': np.less_equal, '>': np.greater, '<': np.less, '=': np.equal,
+           '!=': np.not_equal}
+    expected = []
+    for element in elements:
+        values = [value for name, value in element.data_properties if mapping.get(name) == 'hasFireResistanceLimits_hour']
+        expected.append(any(type(value) in (int, float) and not ops[cmp](float(value), 1.5) for value in values))
+
+    assert any(expected)
+    assert list(table.compare('hasFireResistanceLimits_hour', cmp, 1.5, pass_=False)) == expected
+
+
+def _ttl_elements():
+    return [_element('IfcWall', 'w0', ('耐火极限', 2.0), ('是否承重', True), ('耐火极限', 4), ('未映射', 1.0)),
+            _element('IfcWallStandardCase', 'w1', ('耐火极限', '4'), ('是否承重', np.bool_(False)),
+                     ('容纳人数', np.float64(3.0))),
+            _element('IfcBuilding', 'b0', ('hasBuildingType', 'Plant'), ('hasFireHazardCategory', 1)),
+            _element('IfcWall', 'w0', ('耐火极限', 1.5)),  # duplicated GlobalId
+            _element('IfcMember', 'm0', ('耐火极限', 1.0)),  # class Todo
+            _element('IfcFurniture', 'f0', ('耐火极限', 1.0))]  # not mapped
+
+
+def test_ttl_lines_same_as_building_element():
+    elements = _ttl_elements()
+    mapping = Mappping_dict().ifc_map_fireonto()
+    table = Element_table(elements)
+    for index, element in enumerate(elements):
+        assert table.get_dataprop_ttl_lines(index, index + 7) == \
+            element.get_dataprop_ttl_lines(mapping, index + 7, prefix=':')
+
+
+def test_ifc_ttl_lines_same_as_building_element():
+    ifc_file = os.path.join(DATA_DIR, 'ifc', 'Plant_ByhandV3.ifc')
+    if not os.path.exists(ifc_file):
+        pytest.skip(f'{ifc_file} not found')
+    from ifc2ttl import get_allprop_from_ifc
+
+    elements, _ = get_allprop_from_ifc(ifc_file)
+    Building_element.get_single_element_prop_userinput(
+        elements, {'element_type': 'IfcBuilding', 'element_id': None, 'info': ('Plant', 3, 3)})
+    mapping = Mappping_dict().ifc_map_fireonto()
+    table = Element_table(elements)
+    lines = [table.get_dataprop_ttl_lines(index, index) for index in range(len(elements))]
+    assert lines == [element.get_dataprop_ttl_lines(mapping, index, prefix=':')
+                     for index, element in enumerate(elements)]
+    assert any(len(element_lines) > 2 for element_lines in lines)  # has data properties
+
+
+def _rct(class_name, *conditions):
+    """a linked RCTree of rule category 1, conditions: (dataproperty_name, cmp word, req word, req tag)"""
+    from ruleparse import RCNode, RCTree
+
+    rct = RCTree('#', [(0, 1, 'obj')])
+    class_node = RCNode(class_name, 'obj')
+    class_node.set_onto_info(class_name, 'class')
+    rct.root.add_child(class_node)
+    rct.obj_node = class_node
+    for dataproperty_name, cmp_word, req_word, req_tag in conditions:
+        node = RCNode(dataproperty_name, 'prop')
+        node.set_onto_info(dataproperty_name, 'dataproperty')
+        node.set_req((RCNode(cmp_word, 'cmp'), RCNode(req_word, req_tag), None))
+        class_node.add_child(node)
+    rct.set_rule_category(1, 'direct')
+    return rct
+
+
+@pytest.mark.parametrize('conditions', [
+    [('hasFireResistanceLimits_hour', '不应低于', '3.00h', 'Rprop')],
+    [('hasFireResistanceLimits_hour', '不应低于', '2.50h', 'Rprop'), ('isLoadBearing_Boolean', '', True, 'ARprop')],
+    [('hasFireResistanceLimits_hour', '大于', '1.0h', 'ARprop')],
+])
+def test_check_rct_same_as_sparql(tmp_path, conditions):
+    """check_rct_on_table and the SPARQL of rulegen.sparql_generator on the ttl of the same elements"""
+    pytest.importorskip('ruleparse')
+    from rulegen import sparql_generator
+    from rulecheck import RuleChecker, check_rct_on_table, failed_global_ids
+    from ifc2ttl import write_ttl
+
+    elements = _ttl_elements()
+    ttl_file = str(tmp_path / 'instance.ttl')
+    write_ttl(elements, ttl_file, Mappping_dict().ifc_map_fireonto())
+    rct = _rct('Wall', *conditions)
+    sparql = sparql_generator(rct)
+
+    expected = failed_global_ids(RuleChecker(ttl_file).check(sparql))
+    assert expected
+    assert sorted(set(check_rct_on_table(rct, Element_table(elements)))) == sorted(expected)
@@ -0,0 +1,77 @@
+import os
+from collections import Counter
+import numpy as np
+import pytest
+from conftest import DATA_DIR
+
+torch = pytest.importorskip('torch')
+transformers = pytest.importorskip('transformers')
+from dataset import Corpus
+
+CORPUS_DIR = os.path.join(DATA_DIR, 'xiaofang')
+
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    """the corpus tokenized by a character vocabulary of its sentences (bert-base-chinese is not downloaded here)"""
+    if not hasattr(transformers.BertTokenizer, 'batch_encode_plus'):
+        pytest.skip('Corpus needs BertTokenizer.batch_encode_plus (transformers < 5)')
+    chars = Counter()
+    for data_type in ('train', 'val'):
+        with open(os.path.join(CORPUS_DIR, data_type, 'sentences.txt'), 'r', encoding='utf8') as fp:
+            chars.update(fp.read())
+    vocab_dir = tmp_path_factory.mktemp('vocab')
+    with open(vocab_dir / 'vocab.txt', 'w', encoding='utf8') as fp:
+        fp.write('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] +
+                           [c for c in sorted(chars) if not c.isspace()]) + '\n')
+
+    config = Corpus.TOKENIZER_CONFIG
+    Corpus.TOKENIZER_CONFIG = {'name': str(vocab_dir), 'do_lower_case': False}
+    try:
+        yield Corpus(CORPUS_DIR, use_cache=False)
+    finally:
+        Corpus.TOKENIZER_CONFIG = config
+
+
+def test_same_as_render_seq_labels(corpus):
+    dataset = corpus.val_dataset
+    inputs, att_mask, labels = dataset[:]
+    # wrong predictions, incl. I- without B-, and spans across the padding / the next row
+    rng = np.random.RandomState(0)
+    preds = torch.where(torch.tensor(rng.rand(*labels.shape) < 0.2), torch.tensor(rng.randint(15, size=labels.shape)),
+                        labels.clamp(min=0))
+
+    batch = corpus.render_batch_labels(inputs, labels, preds)
+    for i in range(len(dataset)):
+        assert batch[i] == corpus.render_seq_labels(inputs[i], labels[i], preds[i]), i
+    # without labels (test data): the tokens other than [CLS]/[SEP]/[PAD]
+    batch = corpus.render_batch_labels(inputs, None, preds)
+    for i in range(len(dataset)):
+        assert batch[i] == corpus.render_seq_labels(inputs[i], None, preds[i]), i
+
+
+def test_decode_batch_spans(corpus):
+    tag_ids = np.array([corpus.tag2idx[t] for t in
+                        'B-obj I-obj O I-prop B-cmp I-cmp I-cmp B-sobj B-prop I-prop I-prop'.split()])
+    row_starts = np.array([0, 5])  # the second row starts with I-cmp, which does not extend B-cmp of the first
+    starts, ends, span_tags = corpus.decode_batch_spans(tag_ids, row_starts)
+    assert starts.tolist() == [0, 4, 7, 8]
+    assert ends.tolist() == [2, 5, 8, 11]
+    assert [corpus.tags[t] for t in span_tags] == ['B-obj', 'B-cmp', 'B-sobj', 'B-prop']
+
+
+def test_cache_key_vocab(corpus):
+    """the .npy cache of the tokenized data is not reused after the vocab changes"""
+    file_paths = [os.path.join(CORPUS_DIR, 'val', 'sentences.txt')]
+    vocab_path = os.path.join(corpus.TOKENIZER_CONFIG['name'], 'vocab.txt')
+    key = corpus._cache_key(file_paths)
+    assert corpus._cache_key(file_paths) == key
+    with open(vocab_path, 'r', encoding='utf8') as fp:
+        vocab = fp.read()
+    try:
+        with open(vocab_path, 'a', encoding='utf8') as fp:
+            fp.write('[unused1]\n')
+        assert corpus._cache_key(file_paths) != key
+    finally:
+        with open(vocab_path, 'w', encoding='utf8') as fp:
+            fp.write(vocab)
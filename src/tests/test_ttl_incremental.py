@@ -0,0 +1,78 @@
+import os
+import pytest
+from conftest import DATA_DIR
+
+pytest.importorskip('ifcopenshell')
+pytest.importorskip('owlready2')
+from ifc2ttl import Building_element, Mappping_dict, get_allprop_from_ifc, write_ttl, write_ttl_incremental
+
+
+def _elements(fire_resistance=3.0, duplicate=False):
+    wall = Building_element('IfcWall', 'w0', '')
+    wall.add_dataprop('耐火极限', fire_resistance)
+    wall.add_dataprop('是否承重', True)
+    space = Building_element('IfcSpace', 's0', '')
+    space.add_dataprop('容纳人数', 20)
+    space.add_objprop('hasBuildingElement', wall)
+    if not duplicate:
+        return [wall, space]
+    wall_copy = Building_element('IfcWall', 'w0', '')
+    wall_copy.add_dataprop('耐火极限', 1.0)
+    return [wall, wall_copy, space, Building_element('IfcColumn', 'c0', '')]
+
+
+def _read(ttl_file):
+    with open(ttl_file, 'r', encoding='UTF-8') as f:
+        return f.read()
+
+
+def test_full_render_if_ttl_is_not_indexed(tmp_path):
+    mapping_dict = Mappping_dict().ifc_map_fireonto()
+    ttl_file = str(tmp_path / 'instance.ttl')
+    write_ttl_incremental(_elements(), ttl_file, mapping_dict)
+    assert os.path.exists(ttl_file + '.index.json')
+    assert write_ttl_incremental(_elements(), ttl_file, mapping_dict) == (0, 0, 0, 2)
+
+    # write_ttl does not keep the index of the incremental run
+    write_ttl(_elements(2.0), ttl_file, mapping_dict)
+    assert not os.path.exists(ttl_file + '.index.json')
+
+    # the ttl file is changed by others after the incremental run, the index is stale
+    write_ttl_incremental(_elements(), ttl_file, mapping_dict)
+    with open(ttl_file, 'a', encoding='UTF-8') as f:
+        f.write(':IfcWall9 :hasGlobalId "w9"^^xsd:string .\n')
+    assert write_ttl_incremental(_elements(), ttl_file, mapping_dict) == (2, 0, 0, 0)
+    full_file = str(tmp_path / 'full.ttl')
+    write_ttl(_elements(), full_file, mapping_dict)
+    assert _read(ttl_file) == _read(full_file)
+
+
+def test_first_run_same_as_full(tmp_path):
+    mapping_dict = Mappping_dict().ifc_map_fireonto()
+    ttl_file, full_file = str(tmp_path / 'instance.ttl'), str(tmp_path / 'full.ttl')
+    assert write_ttl_incremental(_elements(duplicate=True), ttl_file, mapping_dict) == (4, 0, 0, 0)
+    write_ttl(_elements(duplicate=True), full_file, mapping_dict)
+    assert _read(ttl_file) == _read(full_file)
+
+    # the duplicates are indexed too, so nothing changes if the elements do not change
+    assert write_ttl_incremental(_elements(duplicate=True), ttl_file, mapping_dict) == (0, 0, 0, 4)
+    assert _read(ttl_file) == _read(full_file)
+
+
+def test_ifc_same_as_full(tmp_path):
+    ifc_file = os.path.join(DATA_DIR, 'ifc', 'Plant_ByhandV3.ifc')
+    if not os.path.exists(ifc_file):
+        pytest.skip(f'{ifc_file} not found')
+    mapping_dict = Mappping_dict().ifc_map_fireonto()
+    ttl_file, full_file = str(tmp_path / 'instance.ttl'), str(tmp_path / 'full.ttl')
+
+    def elements():
+        proceed_elements, relations = get_allprop_from_ifc(ifc_file)
+        Building_element.add_elements_objprop(proceed_elements, relations)
+        return proceed_elements
+
+    n_new, _, _, _ = write_ttl_incremental(elements(), ttl_file, mapping_dict)
+    write_ttl(elements(), full_file, mapping_dict)
+    assert _read(ttl_file) == _read(full_file)
+    assert write_ttl_incremental(elements(), ttl_file, mapping_dict) == (0, 0, 0, n_new)
+    assert _read(ttl_file) == _read(full_file)
@@ -0,0 +1,46 @@
+import os
+import shutil
+import pytest
+from conftest import SRC_DIR
+
+pytest.importorskip('antlr4')
+pytest.importorskip('pandas')
+import ruleparse
+
+FIXTURE_DIR = os.path.join(SRC_DIR, 'tests', 'data', 'eval_log')
+SEP = '\n' + '-' * 90 + '\n'
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    """ruleparse-eval-v1.log: the first 30 seqs of logs/ruleparse-eval.log, one of them not evaluated
+    ruleparse.log: the current parsing of them, shuffled, with 1 seq deleted, 2 added, 4 RCTs and 1 label changed"""
+    for fn in ('ruleparse-eval-v1.log', 'ruleparse.log'):
+        shutil.copy(os.path.join(FIXTURE_DIR, fn), tmp_path)
+    return str(tmp_path)
+
+
+def _read(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+def test_same_as_baseline(log_dir):
+    """expected-ruleparse-eval-v2.log is written by update_eval_log before the streaming merge"""
+    ruleparse.update_eval_log(log_dir, rct_file=os.path.join(log_dir, 'ruleparse.log'))
+
+    assert _read(os.path.join(log_dir, 'ruleparse-eval-v2.log')) == \
+        _read(os.path.join(FIXTURE_DIR, 'expected-ruleparse-eval-v2.log'))
+
+
+def test_no_change_removes_new_version(log_dir):
+    """the current parsing is the same as the last eval log: v2 has the same SHA1 as v1 and is removed"""
+    with open(os.path.join(log_dir, 'ruleparse-eval-v1.log'), 'r', encoding='utf8') as fp:
+        head, *msgs = fp.read().split(SEP)
+    msgs = [msg[:msg.index('Parsing complete') + len('Parsing complete')] for msg in msgs if msg.startswith('[')]
+    with open(os.path.join(log_dir, 'ruleparse.log'), 'w', encoding='utf8') as fp:
+        fp.write('=== RCTree Parsing Start ===' + SEP + SEP.join(msgs) + SEP)
+
+    ruleparse.update_eval_log(log_dir, rct_file=os.path.join(log_dir, 'ruleparse.log'))
+
+    assert sorted(os.listdir(log_dir)) == ['ruleparse-eval-v1.log', 'ruleparse.log']
@@ -9,19 +9,20 @@ import random
 import csv
 import pathlib
 import numpy as np
-import pandas as pd
-import seaborn as sn
-import matplotlib.pyplot as plt
 import torch
 import torch.nn.functional as F
 import torch.nn as nn
-from tqdm import tqdm
+import torch.distributed as dist
+from contextlib import nullcontext
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data.distributed import DistributedSampler
 from glob import glob
 from torch.cuda.amp import autocast, GradScaler
-from torch.utils.tensorboard import SummaryWriter
 from data import *
+from dataset import *
 from utils import *
 from model import *
+# pandas, seaborn, matplotlib, tensorboard & tqdm are imported where used, to keep "import train" fast
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = "2"  # print less verbose log
 SEED = 2020
@@ -34,9 +35,12 @@ if SEED >= 0:
     torch.cuda.manual_seed(SEED)
     torch.backends.cudnn.deterministic = True
     torch.backends.cudnn.benchmark = True
+rank, world_size = 0, 1  # DistributedDataParallel, set by --ddp
 
 
 def _show_param_distribution():
+    import matplotlib.pyplot as plt
+
     gradss = []
     for p in filter(lambda p: p.grad is not None, model.parameters()):
         # p.shape: [x, y], [x]
@@ -59,6 +63,8 @@ def _join_ljust(words, width=9):
 
 
 def plot_model_history(log_path, plot_loss=True):
+    import matplotlib.pyplot as plt
+
     train_loss, train_f1, val_loss, val_f1 = [], [], [], []
     with open(log_path) as f:
         f_csv = csv.reader(f)
@@ -94,6 +100,10 @@ def plot_model_history(log_path, plot_loss=True):
 
 
 def plot_confusion_matrix():
+    import pandas as pd
+    import seaborn as sn
+    import matplotlib.pyplot as plt
+
     model.eval()
     f2 = lambda n: int((n + 1) / 2)
     n2 = f2(n_label)
@@ -166,16 +176,13 @@ def log_predictions(inputs, labels, preds, comment='train', is_test=False, corpu
 
     # ===== import-friendly
     is_print = is_test or args.verbose >= 3
-    is_log = is_test or args.verbose >= 1
+    is_log = (is_test or args.verbose >= 1) and rank == 0  # --ddp: predictions of the val shard of rank 0
     if corpus_ is None:
         corpus_ = corpus
     # =====
 
-    for i in range(bs):
-        seq = inputs[i]
-        label = labels[i] if labels is not None else None
-        pred = preds[i]
-        label_str, pred_str, seq_str = corpus_.render_seq_labels(seq, label, pred)
+    lines, lines1 = [], []
+    for i, (label_str, pred_str, seq_str) in enumerate(corpus_.render_batch_labels(inputs, labels, preds)):
         label_str = label_str.replace('##','') if label_str else label_str
         pred_str = pred_str.replace('##','')
         seq_str = seq_str.replace('##','')
@@ -186,15 +193,18 @@ def log_predictions(inputs, labels, preds, comment='train', is_test=False, corpu
                 print(f'label: {label_str}')
             print(f'pred:  {pred_str}\n')
 
-        if is_log:
-            with open(f"./logs/predictions/predictions-{comment}.log", 'a+', encoding='utf8') as fp:
-                fp.write(f'seq:   {seq_str}\n')
-                if not is_test:
-                    fp.write(f'label: {label_str}\n')
-                fp.write(f'pred:  {pred_str}\n\n')
-            if is_test:
-                with open(f"./logs/predictions/predictions-{comment}1.log", 'a+', encoding='utf8') as fp:
-                    fp.write(f'{pred_str}\n')
+        lines.append(f'seq:   {seq_str}\n')
+        if not is_test:
+            lines.append(f'label: {label_str}\n')
+        lines.append(f'pred:  {pred_str}\n\n')
+        lines1.append(f'{pred_str}\n')
+
+    if is_log:
+        with open(f"./logs/predictions/predictions-{comment}.log", 'a+', encoding='utf8') as fp:
+            fp.write(''.join(lines))
+        if is_test:
+            with open(f"./logs/predictions/predictions-{comment}1.log", 'a+', encoding='utf8') as fp:
+                fp.write(''.join(lines1))
 
 
 def cross_entropy_loss_non_pad(outputs, labels):
@@ -216,9 +226,9 @@ def cross_entropy_loss_non_pad(outputs, labels):
     mask = (labels >= 0).float()  # bool -> float (0. or 1.)
 
     # pick the values corresponding to labels and multiply by mask
-    output_scores = outputs[range(outputs.shape[0]), labels] * mask
+    output_scores = outputs[torch.arange(outputs.shape[0], device=outputs.device), labels] * mask
 
-    n_tokens = int(torch.sum(mask).item())  # num of non-pad tokens
+    n_tokens = torch.sum(mask)  # num of non-pad tokens, kept on device (no host sync)
     return -torch.sum(output_scores) / n_tokens
 
 
@@ -243,16 +253,18 @@ def cross_entropy_loss_non_pad_focal(outputs, labels, gamma=2):
     mask = (labels >= 0).float()  # bool -> float (0. or 1.)
     output_scores = focal_loss * mask
 
-    n_tokens = int(torch.sum(mask).item())  # num of non-pad tokens
+    n_tokens = torch.sum(mask)  # num of non-pad tokens
     return -torch.sum(output_scores) / n_tokens
 
 
 def evaluate(log_preds=''):
     model.eval()
     with torch.no_grad():
-        history = NNFullHistory()
+        history = NNDeviceConfusionHistory(n_label, device)
+        if show_progressbar:
+            from tqdm import tqdm
         data_loader = tqdm(val_data_loader) if show_progressbar else val_data_loader
-        for inputs, att_mask, labels in data_loader:
+        for step, (inputs, att_mask, labels) in enumerate(data_loader, 1):
             # inputs: token_ids, labels: tag_ids
             inputs, att_mask, labels = inputs.to(device), att_mask.to(device), labels.to(device).view(-1)
 
@@ -265,39 +277,56 @@ def evaluate(log_preds=''):
             history.append(loss, predictions, labels, ignore_label=-1)
             if log_preds:
                 log_predictions(inputs, labels, predictions, log_preds)
-            if show_progressbar:
+            if show_progressbar and step % args.log_interval == 0:
                 p, r, f1 = history.avg_prf1_weight()
                 data_loader.set_postfix({'loss': history.avg_loss(), 'f1': f1})
 
+    if world_size > 1:
+        history.all_reduce()
     return history
 
 
 def train():
     """ train model in an epoch """
     model.train()
-    history = NNFullHistory()
+    history = NNDeviceConfusionHistory(n_label, device)
+    if show_progressbar:
+        from tqdm import tqdm
     data_loader = tqdm(train_data_loader) if show_progressbar else train_data_loader
-    for inputs, att_mask, labels in data_loader:
+    if world_size > 1:
+        train_sampler.set_epoch(epoch)
+    optimizer.zero_grad()
+    for step, (inputs, att_mask, labels) in enumerate(data_loader, 1):
         # inputs: token_ids, shape: [bs, sql]; labels: tag_ids, shape: [bs*sql]
         inputs, att_mask, labels = inputs.to(device), att_mask.to(device), labels.to(device).view(-1)
 
-        optimizer.zero_grad()
-        with autocast(enabled=args.fp16):
-            outputs = model(inputs, att_mask)  # shape: [bs, sql, n_tags]
-            outputs = outputs.view(-1, outputs.shape[-1])  # [bs*sql, n_tags]
-            loss = criterion(outputs, labels)
-        _, predictions = torch.max(outputs, 1)
+        # gradient accumulation: effective batch size = batch_size * accum_steps (* world_size)
+        is_update_step = step % args.accum_steps == 0 or step == len(train_data_loader)
+        # the last group of the epoch can be shorter, its loss is averaged over its real size
+        group_start = (step - 1) // args.accum_steps * args.accum_steps
+        group_size = min(args.accum_steps, len(train_data_loader) - group_start)
+        # --ddp: all-reduce the gradients only in the update step
+        with model_ddp.no_sync() if world_size > 1 and not is_update_step else nullcontext():
+            with autocast(enabled=args.fp16):
+                outputs = model_ddp(inputs, att_mask)  # shape: [bs, sql, n_tags]
+                outputs = outputs.view(-1, outputs.shape[-1])  # [bs*sql, n_tags]
+                loss = criterion(outputs, labels)
+            _, predictions = torch.max(outputs, 1)
 
-        scaler.scale(loss).backward()
-        scaler.step(optimizer)
-        scaler.update()
+            scaler.scale(loss / group_size).backward()
+        if is_update_step:
+            scaler.step(optimizer)
+            scaler.update()
+            optimizer.zero_grad()
 
         history.append(loss, predictions, labels, ignore_label=-1)
         # log_predictions(inputs, labels, predictions, 'train')
-        if show_progressbar:
+        if show_progressbar and step % args.log_interval == 0:  # sync the metrics on device
             p, r, f1 = history.avg_prf1_weight()
             data_loader.set_postfix({'loss': history.avg_loss(), 'f1': f1})
 
+    if world_size > 1:
+        history.all_reduce()
     return history
 
 
@@ -313,16 +342,22 @@ def log_and_save():
     log("train: \tloss={:.3f}, f1w={:.3f}".format(train_loss, train_f1))
     log(best_prefix + "val: \t  loss={:.3f}, f1w={:.3f}".format(val_loss, val_f1))
 
-    # ===Save
-    torch.save(model.state_dict(), f'./models/_BertZh{args.cuda}.pth')
     if best_prefix:
         best_val_loss = val_loss
         best_val_history = val_history
         best_epoch = epoch
-        os.replace(f'./models/_BertZh{args.cuda}.pth', f'./models/_BertZh{args.cuda}_best.pth')
-        torch.save(model.state_dict(), f'./models/{model_fullname}-f1w{val_f1:.3f}-ep{epoch:02d}.pth')
-        for path in sorted(glob(f'./models/{model_fullname}-f1w*.pth'))[:-1]:
-            os.remove(path)
+    if rank != 0:  # --ddp: the metrics are reduced, only rank 0 saves & writes
+        return
+
+    # ===Save (on the thread of checkpoint_writer)
+    paths = [f'./models/_BertZh{args.cuda}.pth']
+    remove_old_checkpoints = None
+    if best_prefix:
+        paths += [f'./models/_BertZh{args.cuda}_best.pth',
+                  f'./models/{model_fullname}-f1w{val_f1:.3f}-ep{epoch:02d}.pth']
+        pattern = f'./models/{model_fullname}-f1w*{checkpoint_writer.ext}'
+        remove_old_checkpoints = lambda: [os.remove(path) for path in sorted(glob(pattern))[:-1]]
+    checkpoint_writer.save(model.state_dict(), paths, remove_old_checkpoints)
 
     # ===Writer
     if epoch == 1:
@@ -385,27 +420,32 @@ def report_model(history_path=None, val_history=None, log_all_preds=False, plot_
     if history_path is not None:
         plot_model_history(history_path)
 
-    if plot_cm:
+    if plot_cm and world_size == 1:  # --ddp: val_data_loader is a shard
         plot_confusion_matrix()
 
 
 def load_last_best(model_):
-    path = f'./models/_BertZh{args.cuda}_best.pth'
-    model_.load_state_dict(torch.load(path))
+    if 'checkpoint_writer' in globals():  # wait for the checkpoints being written
+        checkpoint_writer.join()
+    if world_size > 1:  # --ddp: the other ranks wait for rank 0 (checkpoint_writer)
+        dist.barrier()
+    ext = '.safetensors' if args.safetensors else '.pth'
+    path = f'./models/_BertZh{args.cuda}_best{ext}'
+    model_.load_state_dict(load_state_dict_file(path, device))
     print(f'Load model successfully in {path}')
 
 
 def log(msg, end='\n'):
+    if rank != 0:
+        return
     c = args.cuda if 'args' in globals() else ''  # import-friendly
     c = '' if c == '0' else c
 
     print(msg, end=end)
-    with open(f'./logs/train{c}.log', 'a+') as f_:
-        f_.write(msg)
-        f_.write(end)
+    BufferedLogWriter.get(f'./logs/train{c}.log').write(f'{msg}{end}')
 
 
-def get_args():
+def get_arg_parser():
     parser = argparse.ArgumentParser(description='NLP NER Project')
 
     # === default args
@@ -423,8 +463,24 @@ def get_args():
     parser.add_argument('--sql', type=int, default=125, help='sequence length')
     parser.add_argument('--report', action='store_true', help='report model and exit')
     parser.add_argument('--fp16', type=int, default=1, help="FP16 acceleration, use 0/1 for false/true")
+    parser.add_argument('--bucket', action='store_true', help='length-bucketed batches padded to the longest one')
+    parser.add_argument('--log_interval', type=int, default=20, help='steps between syncs of the progress bar metrics')
+    parser.add_argument('--accum_steps', type=int, default=1, help='gradient accumulation steps per optimizer step')
+    parser.add_argument('--grad_checkpoint', action='store_true', help='activation checkpointing in the bert encoder')
+    parser.add_argument('--safetensors', action='store_true', help='save & load checkpoints in .safetensors')
+    parser.add_argument('--ddp', action='store_true',
+                        help='DistributedDataParallel, run by: torchrun --nproc_per_node=N train.py --ddp')
+    parser.add_argument('--ddp_backend', type=str, default='gloo', help='gloo (also for CPU) or nccl')
+    parser.add_argument('--local_rank', type=int, default=int(os.environ.get('LOCAL_RANK', 0)),
+                        help='set by torch.distributed.launch / torchrun')
     # Requires pytorch>=1.6 to use fp 16 acceleration (https://pytorch.org/docs/stable/notes/amp_examples.html)
+    return parser
+
 
+def get_args(parser=None):
+    """parser: get_arg_parser() with more args added, e.g., by inference.py"""
+    if parser is None:
+        parser = get_arg_parser()
     args_ = parser.parse_args()
     args_.fp16 = bool(args_.fp16)
     return args_
@@ -436,6 +492,12 @@ if __name__ == '__main__':
     args = get_args()
     os.environ["CUDA_VISIBLE_DEVICES"] = args.cuda
     device = torch.device('cuda' if args.cuda else 'cpu')
+    if args.ddp:
+        dist.init_process_group(backend=args.ddp_backend)
+        rank, world_size = dist.get_rank(), dist.get_world_size()
+        if args.cuda:
+            device = torch.device('cuda', args.local_rank)
+            torch.cuda.set_device(device)
     n_epoch = args.epochs
     batch_size = args.batch_size
     sql = args.sql
@@ -445,13 +507,37 @@ if __name__ == '__main__':
     full_finetuning = True  # must be true, left for compatibility
     show_progressbar = False
     log(f'\n-[{datetime.now().isoformat()}]==================== \n-Args {str(args)[9:]}')
-    train_data_loader, val_data_loader, corpus = get_data_loader('../data/xiaofang', batch_size, sql)
+    train_data_loader, val_data_loader, corpus = get_data_loader('../data/xiaofang', batch_size, sql,
+                                                                 bucket=args.bucket)
+    if world_size > 1:
+        # train: shuffled shards (DistributedSampler/BucketBatchSampler);
+        # val: strided shards without padding, for exact reduced metrics
+        num_workers = train_data_loader.num_workers
+        val_dataset = data.Subset(corpus.val_dataset, range(rank, len(corpus.val_dataset), world_size))
+        if args.bucket:
+            train_sampler = BucketBatchSampler(corpus.train_dataset.lengths(), batch_size, num_replicas=world_size,
+                                               rank=rank)
+            train_data_loader = data.DataLoader(dataset=corpus.train_dataset, batch_sampler=train_sampler,
+                                                collate_fn=collate_trim_pad, num_workers=num_workers)
+            val_sampler = BucketBatchSampler(corpus.val_dataset.lengths()[rank::world_size], batch_size, shuffle=False)
+            val_data_loader = data.DataLoader(dataset=val_dataset, batch_sampler=val_sampler,
+                                              collate_fn=collate_trim_pad, num_workers=num_workers)
+        else:
+            train_sampler = DistributedSampler(corpus.train_dataset, world_size, rank)
+            train_data_loader = data.DataLoader(dataset=corpus.train_dataset, batch_size=batch_size,
+                                                sampler=train_sampler, num_workers=num_workers, drop_last=False)
+            val_data_loader = data.DataLoader(dataset=val_dataset, batch_size=batch_size, shuffle=False,
+                                              num_workers=num_workers)
 
     model: nn.Module
     model = BertZhTokenClassifier_(n_label, p_drop=0.1, bert_name=args.model)  # bert_name=args.bert_name
     model.to(device)
     if args.resume:
         load_last_best(model)
+    if args.grad_checkpoint:
+        model.enable_grad_checkpoint()
+    model_ddp = DistributedDataParallel(model, device_ids=[device] if device.type == 'cuda' else None) \
+        if world_size > 1 else model  # used in train(); model (the module) for evaluating, saving & loading
     # ========================================================================================== Train
     if full_finetuning:
         param_optimizer = list(model.named_parameters())
@@ -476,26 +562,47 @@ if __name__ == '__main__':
         exit()
 
     s = 's' if args.step else ''
-    model_fullname = f"BertZh-bs{batch_size:02d}-lr{s}{lr}".replace('e-0', 'e-')
+    a = f'x{args.accum_steps}' if args.accum_steps > 1 else ''
+    model_fullname = f"BertZh-bs{batch_size:02d}{a}-lr{s}{lr}".replace('e-0', 'e-')
     dt_now = datetime.now().strftime('%m%d-%H%M')
-    pathlib.Path('./logs/csv').mkdir(parents=True, exist_ok=True)
-    pathlib.Path('./logs/runs').mkdir(exist_ok=True)
-    pathlib.Path('./models').mkdir(exist_ok=True)
-    log_dir = f'./logs/runs/{dt_now} {model_fullname}'
-    assert not os.path.exists(log_dir), f"runs folder '{log_dir}' already exists"
-    swriter = SummaryWriter(log_dir=log_dir)
-    fwriter = open(f'./logs/csv/{dt_now} {model_fullname}.csv', 'a+')
-    print(f'\n(Initializing time: {time.time() - start_time:.1f}s)')
+    if world_size > 1:
+        model_fullname += f'-ddp{world_size}'
+    if rank == 0:
+        pathlib.Path('./logs/csv').mkdir(parents=True, exist_ok=True)
+        pathlib.Path('./logs/runs').mkdir(exist_ok=True)
+        pathlib.Path('./models').mkdir(exist_ok=True)
+        log_dir = f'./logs/runs/{dt_now} {model_fullname}'
+        assert not os.path.exists(log_dir), f"runs folder '{log_dir}' already exists"
+        from torch.utils.tensorboard import SummaryWriter
+
+        swriter = SummaryWriter(log_dir=log_dir)
+        fwriter = open(f'./logs/csv/{dt_now} {model_fullname}.csv', 'a+')
+        print(f'\n(Initializing time: {time.time() - start_time:.1f}s)')
 
     log(f'[{model_fullname}]')
-    clear_prediction_logs()
+    if rank == 0:
+        clear_prediction_logs()
+        checkpoint_writer = CheckpointWriter(use_safetensors=args.safetensors)
     start_time = time.time()
     best_val_loss, best_val_history, best_epoch = 1e6, None, -1
     try:
         for epoch in range(1, n_epoch + 1):
             log(f"\n=== Epoch: {epoch}/{n_epoch} (lr: {optimizer.param_groups[0]['lr']})")
+            epoch_time = time.time()
+            if device.type == 'cuda':
+                torch.cuda.reset_peak_memory_stats()
             train_history = train()
+            train_time = time.time() - epoch_time
             val_history = evaluate()
+            val_time = time.time() - epoch_time - train_time
+            peak_memory = f', peak memory {torch.cuda.max_memory_allocated() / 2 ** 30:.2f} GiB' \
+                if device.type == 'cuda' else ''
+            # --ddp: per rank, i.e., the sentences of its shard
+            n_train = train_sampler.num_samples if world_size > 1 else len(train_data_loader.dataset)
+            per_rank = ' per rank' if world_size > 1 else ''
+            log(f'(throughput{per_rank}: train {n_train / train_time:.1f} seq/s, '
+                f'val {len(val_data_loader.dataset) / val_time:.1f} seq/s{peak_memory}; '
+                f'bs {batch_size}x{args.accum_steps}, grad_checkpoint {args.grad_checkpoint})')
             if args.step:
                 scheduler.step()
             log_and_save()
@@ -509,3 +616,7 @@ if __name__ == '__main__':
 
     log(f'\n(Time cost: {get_elapsed_time(start_time)})')
     report_model(val_history=best_val_history)
+    if rank == 0:
+        checkpoint_writer.close()
+    if world_size > 1:
+        dist.destroy_process_group()
@@ -2,13 +2,12 @@
 # coding=utf-8
 
 import os
+import json
 import time
-import torch
 import numpy as np
 import logging
 import hashlib
 from datetime import datetime
-from sklearn.metrics import precision_recall_fscore_support, classification_report
 
 
 class NNHistory:
@@ -24,6 +23,8 @@ class NNHistory:
         self.data['n_iter'].append(n_iter)
 
     def append_for_NER(self, loss, preds, labels):
+        import torch
+
         if isinstance(loss, torch.Tensor):
             loss = loss.item()
 
@@ -74,6 +75,8 @@ class NNFullHistory:
         return np.array(_all_labels)
 
     def append(self, loss, preds, labels, ignore_label=-1):
+        import torch
+
         if isinstance(loss, torch.Tensor):
             loss = loss.item()
         if isinstance(preds, torch.Tensor):
@@ -110,6 +113,8 @@ class NNFullHistory:
         """preds和labels中int的种类为分类的类数，通常大于2；
         可以指定其中一种类别为negative，其他全部算positive，从而得到precision_recall_f1
         ref: https://scikit-learn.org/stable/modules/generated/sklearn.metrics.precision_recall_fscore_support.html"""
+        from sklearn.metrics import precision_recall_fscore_support
+
         all_preds = self.all_preds()
         all_labels = self.all_labels()
 
@@ -122,6 +127,8 @@ class NNFullHistory:
 
     def avg_prf1_all(self, output_dict=True, label_tags=None):
         """ref: https://scikit-learn.org/stable/modules/generated/sklearn.metrics.classification_report.html"""
+        from sklearn.metrics import classification_report
+
         all_preds = self.all_preds()
         all_labels = self.all_labels()
         return classification_report(all_labels, all_preds, target_names=label_tags, output_dict=output_dict, digits=3)
@@ -153,6 +160,192 @@ class NNFullHistory:
             return dw['precision'], dw['recall'], dw['f1-score']
 
 
+class NNConfusionHistory:
+    def __init__(self, n_labels=15):
+        """与NNFullHistory接口相同，但只累计confusion matrix (cm[label][pred])，不储存所有pred & label；
+        precision/recall/f1由cm计算，每次O(n_labels^2)，可在每个batch后调用；
+        avg_loss与NNFullHistory相同，按batch的non-pad token数加权 (loss * count)，即token平均而非batch平均"""
+        self.n_labels = n_labels
+        self.cm = np.zeros((n_labels, n_labels), dtype=np.int64)
+
+        self.loss_sum = 0.
+        self.count = 0  # num of non-pad tokens
+
+    def _resize(self, n_labels):
+        cm = np.zeros((n_labels, n_labels), dtype=np.int64)
+        cm[:self.n_labels, :self.n_labels] = self.cm
+        self.cm, self.n_labels = cm, n_labels
+
+    def append(self, loss, preds, labels, ignore_label=-1):
+        import torch
+
+        if isinstance(loss, torch.Tensor):
+            loss = loss.item()
+        if isinstance(preds, torch.Tensor):
+            preds = preds.view(-1).detach().cpu().numpy()
+        if isinstance(labels, torch.Tensor):
+            labels = labels.view(-1).detach().cpu().numpy()
+
+        if ignore_label is not None:
+            mask = labels != ignore_label
+            preds = preds[mask]
+            labels = labels[mask]
+        count = len(labels)
+
+        if count:
+            n = max(labels.max(), preds.max()) + 1
+            if n > self.n_labels:
+                self._resize(n)
+            self.cm += np.bincount(labels * self.n_labels + preds,
+                                   minlength=self.n_labels ** 2).reshape(self.n_labels, self.n_labels)
+
+        self.loss_sum += loss * count
+        self.count += count
+
+    def avg_accuracy(self):
+        return np.trace(self.cm) / self.cm.sum()
+
+    def avg_loss(self):
+        return self.loss_sum / self.count
+
+    def prf1_support(self, labels=None):
+        """ :return: np.array of precision, recall, f1, support of each label (0 if zero division, as sklearn) """
+        cm = self.cm if labels is None else self.cm[np.ix_(labels, labels)]
+        tp = np.diag(cm).astype(np.float64)
+        n_true, n_pred = self.cm.sum(axis=1), self.cm.sum(axis=0)
+        if labels is not None:
+            n_true, n_pred = n_true[labels], n_pred[labels]
+        p = np.divide(tp, n_pred, out=np.zeros_like(tp), where=n_pred > 0)
+        r = np.divide(tp, n_true, out=np.zeros_like(tp), where=n_true > 0)
+        f1 = np.divide(2 * p * r, p + r, out=np.zeros_like(tp), where=(p + r) > 0)
+        return p, r, f1, n_true
+
+    def avg_prf1_binary(self, neg_label):
+        """指定其中一种类别为negative，其他全部算positive"""
+        tp = self.cm.sum() - self.cm[neg_label, :].sum() - self.cm[:, neg_label].sum() + self.cm[neg_label, neg_label]
+        n_pred = self.cm.sum() - self.cm[:, neg_label].sum()
+        n_true = self.cm.sum() - self.cm[neg_label, :].sum()
+        p = tp / n_pred if n_pred else 0.
+        r = tp / n_true if n_true else 0.
+        f1 = 2 * p * r / (p + r) if p + r else 0.
+        return p, r, f1
+
+    def avg_prf1_all(self, output_dict=True, label_tags=None, digits=3):
+        """same as sklearn classification_report (labels: those in either labels or preds)"""
+        labels = np.flatnonzero(self.cm.sum(axis=1) + self.cm.sum(axis=0))
+        p, r, f1, s = self.prf1_support(labels)
+        names = [label_tags[i] if label_tags is not None else str(i) for i in labels]
+        n = s.sum()
+
+        d = {name: {'precision': p[k], 'recall': r[k], 'f1-score': f1[k], 'support': int(s[k])}
+             for k, name in enumerate(names)}
+        d['accuracy'] = self.avg_accuracy()
+        d['macro avg'] = {'precision': p.mean(), 'recall': r.mean(), 'f1-score': f1.mean(), 'support': int(n)}
+        d['weighted avg'] = {'precision': (p * s).sum() / n, 'recall': (r * s).sum() / n,
+                             'f1-score': (f1 * s).sum() / n, 'support': int(n)}
+        if output_dict:
+            return d
+
+        headers = ['precision', 'recall', 'f1-score', 'support']
+        width = max(max(len(name) for name in names), len('weighted avg'), digits)
+        row_fmt = '{:>{width}s} ' + ' {:>9.{digits}f}' * 3 + ' {:>9}\n'
+        report = ('{:>{width}s} ' + ' {:>9}' * len(headers)).format('', *headers, width=width) + '\n\n'
+        for name in names:
+            report += row_fmt.format(name, *[d[name][h] for h in headers], width=width, digits=digits)
+        report += '\n'
+        report += ('{:>{width}s} ' + ' {:>9.{digits}}' * 2 + ' {:>9.{digits}f} {:>9}\n').format(
+            'accuracy', '', '', d['accuracy'], int(n), width=width, digits=digits)
+        for avg in ('macro avg', 'weighted avg'):
+            report += row_fmt.format(avg, *[d[avg][h] for h in headers], width=width, digits=digits)
+        return report
+
+    def avg_prf1_weight(self, remove_first=False):
+        if remove_first:
+            labels = np.arange(1, self.n_labels)
+            p, r, f1, s = self.prf1_support()
+            s = s[labels]
+            n = s.sum()
+            if n == 0:  # only the first label (e.g., 'O') is seen
+                return 0., 0., 0.
+            return (p[labels] * s).sum() / n, (r[labels] * s).sum() / n, (f1[labels] * s).sum() / n
+        else:
+            dw = self.avg_prf1_all(output_dict=True)['weighted avg']
+            return dw['precision'], dw['recall'], dw['f1-score']
+
+
+class NNDeviceConfusionHistory(NNConfusionHistory):
+    def __init__(self, n_labels=15, device='cpu'):
+        """confusion matrix & loss sum保留在device(如GPU)上，append时不做host同步；
+        仅在计算指标(avg_*)或sync()时拷贝到CPU。
+        用scatter_add_累计bincount (ignore_label计入最后一个多余的bin)，避免masked_select/bincount引起的同步"""
+        import torch
+
+        super().__init__(n_labels)
+        self.device = device
+        self._cm = torch.zeros(n_labels * n_labels + 1, dtype=torch.long, device=device)
+        self._loss_sum = torch.zeros((), dtype=torch.float, device=device)
+        self._count = torch.zeros((), dtype=torch.long, device=device)
+
+    def append(self, loss, preds, labels, ignore_label=-1):
+        import torch
+
+        preds, labels = preds.detach().view(-1), labels.detach().view(-1)
+        idxs = labels * self.n_labels + preds
+        count = labels.numel()
+        if ignore_label is not None:
+            mask = labels != ignore_label
+            idxs = torch.where(mask, idxs, torch.full_like(idxs, self.n_labels ** 2))
+            count = mask.sum()
+
+        self._cm.scatter_add_(0, idxs, torch.ones_like(idxs))
+        self._loss_sum += loss.detach().float() * count
+        self._count += count
+
+    def sync(self):
+        """ move the accumulated cm & loss on device to the host """
+        self.cm += self._cm[:-1].view(self.n_labels, self.n_labels).cpu().numpy()
+        self.loss_sum += self._loss_sum.item()
+        self.count += self._count.item()
+        self._cm.zero_()
+        self._loss_sum.zero_()
+        self._count.zero_()
+
+    def all_reduce(self):
+        """ sum the cm & loss of all ranks (torch.distributed), all ranks get the same metrics """
+        import torch
+        import torch.distributed as dist
+
+        self.sync()
+        cm_count = torch.tensor(np.append(self.cm.reshape(-1), self.count), dtype=torch.long, device=self.device)
+        loss_sum = torch.tensor(self.loss_sum, dtype=torch.float64, device=self.device)
+        dist.all_reduce(cm_count)
+        dist.all_reduce(loss_sum)
+        cm_count = cm_count.cpu().numpy()
+        self.cm = cm_count[:-1].reshape(self.n_labels, self.n_labels)
+        self.count = int(cm_count[-1])
+        self.loss_sum = loss_sum.item()
+
+    def avg_accuracy(self):
+        self.sync()
+        return super().avg_accuracy()
+
+    def avg_loss(self):
+        self.sync()
+        return super().avg_loss()
+
+    def prf1_support(self, labels=None):
+        self.sync()
+        return super().prf1_support(labels)
+
+    def avg_prf1_binary(self, neg_label):
+        self.sync()
+        return super().avg_prf1_binary(neg_label)
+
+    def avg_prf1_all(self, output_dict=True, label_tags=None, digits=3):
+        self.sync()
+        return super().avg_prf1_all(output_dict, label_tags, digits)
+
+
 class _VerboseLogger:
     # print_level_threshold
     VeryVerbose = -1
@@ -185,17 +378,173 @@ class _VerboseLogger:
         self.log(msg, level=self.print_level_threshold - 1)
 
 
+class BufferedLogWriter:
+    _writers = {}  # abs file path: writer, see get()
+    _flusher = None  # the timer thread of all the writers, and the atexit hook, set up by get()
+
+    def __init__(self, file_path, buffer_size=1 << 16, flush_interval=1., async_write=False, encoding=None):
+        """append text to a log file by batches, instead of open/write/close for every msg.
+        flushed when buffer_size chars are buffered, within flush_interval seconds (by a timer thread, also when no new
+        msg comes), and at exit. Create it by get(), which sets up the timer and the atexit hook.
+        buffer_size=0: write every msg at once (unbuffered).
+        async_write: write on a background thread"""
+        import queue
+        import threading
+
+        self.file_path = file_path
+        self.encoding = encoding
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.buffer, self.n_buffered = [], 0
+        self.last_flush_time = time.time()
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.queue = None
+        if async_write:
+            self.queue = queue.Queue()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    @classmethod
+    def get(cls, file_path, **kwargs):
+        """ the writer of the file (one per file, so that msgs are written in order) """
+        if BufferedLogWriter._flusher is None:
+            import atexit
+            import threading
+
+            atexit.register(BufferedLogWriter.close_all)
+            BufferedLogWriter._flusher = threading.Thread(target=BufferedLogWriter._flush_all_by_time, daemon=True)
+            BufferedLogWriter._flusher.start()
+
+        key = os.path.abspath(file_path)
+        if key not in cls._writers or cls._writers[key].closed:
+            cls._writers[key] = cls(file_path, **kwargs)
+        return cls._writers[key]
+
+    @staticmethod
+    def _flush_all_by_time(interval=0.2):
+        """ flush the msgs buffered longer than flush_interval, e.g., the last lines before an idle period """
+        while True:
+            time.sleep(interval)
+            for writer in list(BufferedLogWriter._writers.values()):
+                if writer.n_buffered and time.time() - writer.last_flush_time >= writer.flush_interval:
+                    writer.flush()
+
+    @staticmethod
+    def close_all():
+        """ flush & close all the writers, registered to atexit once """
+        for file_path in list(BufferedLogWriter._writers):
+            BufferedLogWriter.close_file(file_path)
+
+    @classmethod
+    def close_file(cls, file_path):
+        """ flush & close the writer of the file if any, e.g., before the file is truncated or read """
+        writer = cls._writers.pop(os.path.abspath(file_path), None)
+        if writer is not None:
+            writer.close()
+
+    def write(self, msg):
+        if not self.buffer_size or self.closed:
+            self._write(msg)
+            return
+
+        with self.lock:
+            self.buffer.append(msg)
+            self.n_buffered += len(msg)
+            is_flush = self.n_buffered >= self.buffer_size or time.time() - self.last_flush_time >= self.flush_interval
+        if is_flush:
+            self.flush()
+
+    def flush(self, wait=False):
+        """ wait: also wait for the background writer, e.g., before reading the file """
+        with self.lock:
+            text = ''.join(self.buffer)
+            self.buffer, self.n_buffered = [], 0
+            self.last_flush_time = time.time()
+            if text:
+                if self.queue is not None:
+                    self.queue.put(text)
+                else:
+                    self._write(text)
+        if wait and self.queue is not None and not self.closed:
+            self.queue.join()
+
+    def _write(self, text):
+        with open(self.file_path, 'a+', encoding=self.encoding) as f:
+            f.write(text)
+
+    def _run(self):
+        import queue
+
+        while True:
+            try:
+                text = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self.flush()
+                continue
+            if text is not None:
+                self._write(text)
+            self.queue.task_done()
+            if text is None:
+                break
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        if self.queue is not None:
+            self.queue.put(None)
+            self.thread.join()
+
+
+class JsonlLogWriter:
+    def __init__(self, file_dir='./logs/', file_name='log.jsonl', init_mode='a+', **kwargs):
+        """
+        one json record per line, can be appended and read by read_jsonl() as a stream
+        kwargs: buffer_size, flush_interval, async_write, see BufferedLogWriter
+        """
+        self.file_path = os.path.join(file_dir, file_name)
+        BufferedLogWriter.close_file(self.file_path)
+        if 'w' in init_mode:
+            open(self.file_path, 'w', encoding='utf8').close()
+        self.writer = BufferedLogWriter.get(self.file_path, encoding='utf8', **kwargs)
+
+    def write(self, record: dict):
+        self.writer.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def flush(self):
+        self.writer.flush(wait=True)
+
+
+def read_jsonl(file_path):
+    """ yield the records (dict) of a jsonl file one by one """
+    BufferedLogWriter.close_file(file_path)  # pending records of this process
+    with open(file_path, 'r', encoding='utf8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
 class Logger:
-    def __init__(self, file_dir='./logs/', file_name=None, init_mode='a+', print_log_level=1):
+    def __init__(self, file_dir='./logs/', file_name=None, init_mode='a+', print_log_level=1, buffer_size=1 << 16,
+                 flush_interval=1., async_write=False):
+        """
+        buffer_size, flush_interval, async_write: see BufferedLogWriter, use flush() before reading the log file
+        """
         if not file_name:
             file_name = f"log_{datetime.now().strftime('%m-%d')}.log"
         self.file_path = os.path.join(file_dir, file_name)
         self.print_log_level = print_log_level
 
+        BufferedLogWriter.close_file(self.file_path)  # msgs of the previous logger of the file are written first
         with open(self.file_path, init_mode) as f:
             if 'a' in init_mode:
                 f.write('\n')
             f.write('[{}]\n'.format(datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        self.writer = BufferedLogWriter.get(self.file_path, buffer_size=buffer_size, flush_interval=flush_interval,
+                                            async_write=async_write)
 
     def log(self, msg, end='\n', level=1, print_log=None, warning=False):
         """
@@ -222,8 +571,96 @@ class Logger:
         self._write_log(f'{msg}{end}')  # log file
 
     def _write_log(self, msg):
-        with open(self.file_path, 'a+') as f:
-            f.write(msg)
+        self.writer.write(msg)
+
+    def flush(self):
+        self.writer.flush(wait=True)
+
+
+class CheckpointWriter:
+    def __init__(self, use_safetensors=False):
+        """save state dicts on a background thread: save() snapshots the tensors to CPU memory and returns at once,
+        the worker writes each file to a .tmp and renames it (atomic, a reader never sees a partial file).
+        use_safetensors: write .safetensors (mmap-able, faster loading, no pickle) instead of .pth"""
+        import queue
+        import threading
+
+        self.use_safetensors = use_safetensors
+        self.ext = '.safetensors' if use_safetensors else '.pth'
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def save(self, state_dict, paths, after_fn=None):
+        """
+        :param paths: list of file paths (the same state dict), the ext is replaced by self.ext
+        :param after_fn: called on the worker after the files are written, e.g., removing old checkpoints
+        """
+        self._raise_error()
+        snapshot = {k: v.detach().to('cpu', copy=True).contiguous() for k, v in state_dict.items()}
+        self.queue.put((snapshot, [os.path.splitext(p)[0] + self.ext for p in paths], after_fn))
+
+    def _write(self, state_dict, path):
+        tmp_path = path + '.tmp'
+        if self.use_safetensors:
+            from safetensors.torch import save_file
+            save_file(state_dict, tmp_path)
+        else:
+            import torch
+            torch.save(state_dict, tmp_path)
+        os.replace(tmp_path, path)
+
+    def _run(self):
+        import shutil
+
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    break
+                snapshot, paths, after_fn = job
+                self._write(snapshot, paths[0])
+                for path in paths[1:]:
+                    shutil.copyfile(paths[0], path + '.tmp')
+                    os.replace(path + '.tmp', path)
+                if after_fn is not None:
+                    after_fn()
+            except Exception as ex:
+                self.error = ex
+            finally:
+                self.queue.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def join(self):
+        """ wait until all the saved state dicts are written """
+        self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self._raise_error()
+
+
+def load_state_dict_file(path, device='cpu'):
+    """ load .pth (torch.save) or .safetensors; for a path without the file, try the other ext """
+    if not os.path.exists(path):
+        root, ext = os.path.splitext(path)
+        other = root + ('.pth' if ext == '.safetensors' else '.safetensors')
+        if os.path.exists(other):
+            path = other
+
+    if path.endswith('.safetensors'):
+        from safetensors.torch import load_file
+        return load_file(path, device=str(device))
+
+    import torch
+    return torch.load(path, map_location=device)
 
 
 def get_elapsed_time(start_time):